@@ -7,6 +7,11 @@ from .models.database import Database
 from .routes.auth import init_auth_routes
 from .routes.chat import init_chat_routes
 from .routes.admin import init_admin_routes
+from .utils.metrics import register_metrics
+from .utils import http_cache
+from .utils.compression import ResponseCompressor
+from .utils.request_ids import init_request_ids, current_context
+from .utils.streams import stream_slots
 
 # Load environment variables
 load_dotenv()
@@ -38,10 +43,18 @@ def create_app():
     CORS(app, 
          origins=allowed_origins,
          supports_credentials=True,
-         allow_headers=["Content-Type", "Authorization"],
+         allow_headers=["Content-Type", "Authorization", "Idempotency-Key", "X-Request-ID"],
+         expose_headers=["Idempotent-Replayed", "X-Request-ID"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     )
     
+    # Compress JSON responses for clients that accept it
+    compressor = ResponseCompressor()
+    compressor.init_app(app)
+    
+    # Request ids, echoed to the client and attached to slow Mongo operations
+    init_request_ids(app)
+    
     # Initialize JWT
     jwt = JWTManager(app)
     
@@ -55,6 +68,29 @@ def create_app():
         print(f"❌ Failed to connect to MongoDB: {e}")
         raise e
     
+    # Expose the database to gunicorn worker hooks (see gunicorn.conf.py)
+    app.extensions['database'] = db
+    app.extensions['stream_slots'] = stream_slots
+    db.slow_log.context = current_context
+    register_metrics('mongo_pool', db.connection.stats)
+    register_metrics('session_cache', db.session_cache.stats)
+    register_metrics('admin_feed', db.change_feed.stats)
+    register_metrics('session_events', db.events.stats)
+    register_metrics('lifecycle', db.lifecycle.stats)
+    register_metrics('search_index', db.search.stats)
+    register_metrics('token_usage', db.usage.stats)
+    register_metrics('touches', db.touches.stats)
+    register_metrics('streams', stream_slots.stats)
+    register_metrics('slow_ops', db.slow_log.stats)
+    register_metrics('conditional_get', http_cache.stats)
+    register_metrics('compression', compressor.stats)
+    
+    # Under gunicorn the post_worker_init hook starts background tasks;
+    # this covers the development server and any other WSGI runner
+    @app.before_request
+    def ensure_background_workers():
+        db.start_workers()
+    
     # JWT Error Handlers
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -117,6 +153,11 @@ def create_app():
                     'create_session': 'POST /api/chat/sessions',
                     'messages': 'GET /api/chat/sessions/<id>/messages',
                     'send_message': 'POST /api/chat/sessions/<id>/messages',
+                    'session_events': 'GET /api/chat/sessions/<id>/events',
+                    'search': 'GET /api/chat/search?q=<text>&cursor=<cursor>',
+                    'sync': 'GET /api/chat/sync?since=<token>',
+                    'export_session': 'GET /api/chat/sessions/<id>/export?gzip=1',
+                    'export_all': 'GET /api/chat/export?gzip=1',
                     'delete_session': 'DELETE /api/chat/sessions/<id>'
                 }
             }
@@ -0,0 +1,184 @@
+from pymongo.errors import DuplicateKeyError
+from bson import Binary, ObjectId, decode, encode
+from collections import Counter
+from datetime import datetime
+import zlib
+import os
+from .message_store import past_key
+
+
+class MessageArchiveModel:
+    """Cold message history, stored as compressed chunks outside ``messages``.
+
+    Each document of ``messages_archive`` holds up to ``chunk_size``
+    consecutive messages of one session as zlib-compressed BSON. A chunk's
+    ``_id`` is the id of its first message, so re-archiving the same batch
+    after an interruption cannot store it twice, and a session's
+    ``archived_count`` is recomputed from its chunks rather than incremented.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.chunk_size = int(os.getenv('MESSAGE_ARCHIVE_CHUNK_SIZE', 200))
+        self.level = int(os.getenv('MESSAGE_ARCHIVE_ZLIB_LEVEL', 6))
+
+    def create_indexes(self):
+        self.db.messages_archive.create_index([("chat_session_id", 1), ("first_timestamp", 1)])
+
+    def _decode(self, chunk):
+        return decode(zlib.decompress(chunk["payload"]))["messages"]
+
+    def archive_session(self, store, session_id, cutoff):
+        """Move the session's messages older than ``cutoff`` out of ``store``; returns how many moved"""
+        session_id = ObjectId(session_id)
+        moved = 0
+        while True:
+            batch = store.cold_batch(session_id, cutoff, self.chunk_size)
+            if not batch:
+                return moved
+
+            chunk = {
+                "_id": batch[0]["_id"],
+                "chat_session_id": session_id,
+                "first_timestamp": batch[0]["timestamp"],
+                "last_timestamp": batch[-1]["timestamp"],
+                "count": len(batch),
+                "senders": dict(Counter(m["sender_type"] for m in batch)),
+                "payload": Binary(zlib.compress(encode({"messages": batch}), self.level)),
+                "archived_at": datetime.utcnow()
+            }
+            # Archived by an earlier, interrupted run, possibly with another chunk
+            # size: finish moving exactly what that chunk holds
+            archived = self._chunk_holding(session_id, batch[0])
+            if archived is None:
+                try:
+                    self.db.messages_archive.insert_one(chunk)
+                except DuplicateKeyError:
+                    archived = self._decode(self.db.messages_archive.find_one({"_id": chunk["_id"]}))
+            if archived is not None:
+                batch = archived
+            # Readers consult the archive only once the session says it has one
+            self._recount(session_id)
+
+            store.remove(session_id, batch)
+            moved += len(batch)
+
+    def _chunk_holding(self, session_id, message):
+        """Messages of the archived chunk that already holds ``message``, or None"""
+        chunks = self.db.messages_archive.find({
+            "chat_session_id": session_id,
+            "first_timestamp": {"$lte": message["timestamp"]},
+            "last_timestamp": {"$gte": message["timestamp"]}
+        })
+        for chunk in chunks:
+            messages = self._decode(chunk)
+            if any(m["_id"] == message["_id"] for m in messages):
+                return messages
+        return None
+
+    def _recount(self, session_id):
+        """Set the session's ``archived_count`` from its chunks, so a crash or retry cannot skew it"""
+        totals = list(self.db.messages_archive.aggregate([
+            {"$match": {"chat_session_id": session_id}},
+            {"$group": {"_id": None, "count": {"$sum": "$count"}}}
+        ]))
+        self.db.chat_sessions.update_one(
+            {"_id": session_id},
+            {"$set": {"archived_count": totals[0]["count"] if totals else 0}}
+        )
+
+    def oldest(self, session_id, limit=None):
+        """First ``limit`` archived messages of a session (all if None), oldest first"""
+        messages = []
+        chunks = self.db.messages_archive.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("first_timestamp", 1)
+        for chunk in chunks:
+            messages.extend(self._decode(chunk))
+            if limit is not None and len(messages) >= limit:
+                break
+        return messages if limit is None else messages[:limit]
+
+    def newest(self, session_id, limit):
+        """Last ``limit`` archived messages of a session, oldest first"""
+        messages = []
+        if limit <= 0:
+            return messages
+        chunks = self.db.messages_archive.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("first_timestamp", -1)
+        for chunk in chunks:
+            messages = self._decode(chunk) + messages
+            if len(messages) >= limit:
+                break
+        return messages[-limit:]
+
+    def iterate(self, session_id, window=None):
+        """Stream a session's archived messages chunk by chunk"""
+        query = {"chat_session_id": ObjectId(session_id)}
+        if window:
+            query["first_timestamp"] = {"$lt": window["$lt"]}
+            query["last_timestamp"] = {"$gte": window["$gte"]}
+        for chunk in self.db.messages_archive.find(query).sort("first_timestamp", 1).batch_size(4):
+            for message in self._decode(chunk):
+                if window is None or window["$gte"] <= message["timestamp"] < window["$lt"]:
+                    yield message
+
+    def window(self, session_id, limit, before=None, after=None):
+        """Up to ``limit`` archived messages next to a (timestamp, _id) key, oldest first"""
+        older = after is None
+        key = before if older else after
+        query = {"chat_session_id": ObjectId(session_id)}
+        if key is not None:
+            query["first_timestamp" if older else "last_timestamp"] = {"$lte" if older else "$gte": key[0]}
+        messages = []
+        # Chunks hold consecutive runs, so whole chunks fill the window in order
+        for chunk in self.db.messages_archive.find(query).sort("first_timestamp", -1 if older else 1):
+            decoded = self._decode(chunk)
+            if key is not None:
+                decoded = [m for m in decoded if past_key(m, key, older)]
+            messages = decoded + messages if older else messages + decoded
+            if len(messages) >= limit:
+                break
+        return messages[-limit:] if older else messages[:limit]
+
+    def find(self, session_id, message_ids):
+        """The given archived messages of a session"""
+        wanted = set(message_ids)
+        found = []
+        # Search hits are mostly recent, so start with the newest chunks
+        chunks = self.db.messages_archive.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("first_timestamp", -1)
+        for chunk in chunks:
+            for message in self._decode(chunk):
+                if message["_id"] in wanted:
+                    found.append(message)
+                    wanted.discard(message["_id"])
+            if not wanted:
+                break
+        return found
+
+    def session_senders(self, session_id):
+        """Archived message counts per sender type of one session, without decompressing"""
+        totals = Counter()
+        for chunk in self.db.messages_archive.find({"chat_session_id": ObjectId(session_id)}, {"senders": 1}):
+            totals.update(chunk.get("senders", {}))
+        return dict(totals)
+
+    def sender_totals(self, senders):
+        """Archived message counts per sender type, for the stats reconciler"""
+        pipeline = [{"$group": {
+            "_id": None,
+            **{sender: {"$sum": f"$senders.{sender}"} for sender in senders}
+        }}]
+        rows = list(self.db.messages_archive.aggregate(pipeline))
+        return {sender: rows[0][sender] for sender in senders if rows[0][sender]} if rows else {}
+
+    def delete_session(self, session_id):
+        return self.db.messages_archive.delete_many({"chat_session_id": ObjectId(session_id)}).deleted_count
+
+    def stats(self):
+        return {
+            "chunks": self.db.messages_archive.estimated_document_count()
+        }
@@ -0,0 +1,411 @@
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+import threading
+import time
+import os
+from ..utils.background import PeriodicWorker
+
+# Change streams need a replica set; standalone mongod answers with this code
+CHANGE_STREAM_UNSUPPORTED = (40573, 40324)
+PREVIEW_LENGTH = 200
+
+
+class AdminChangeFeed:
+    """Per-worker feed of new messages and session changes for the admin dashboard.
+
+    One background thread per worker tails the message stores and ``chat_sessions``
+    (through a change stream, or by polling ``_id`` ranges on a standalone
+    mongod) into a bounded ring buffer. Dashboard requests only filter that
+    buffer, so monitoring costs one tail per worker regardless of how many
+    dashboards are open or how often they refresh.
+
+    Every event carries a cursor. In change stream mode it is the resume token,
+    which is identical on every worker; in poll mode it encodes the message and
+    session ``_id`` watermarks. A cursor that fell out of the buffer (or came
+    from another worker) is resumed from the database.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.mode_setting = os.getenv('ADMIN_FEED_MODE', 'auto')  # auto | change_stream | poll
+        self.buffer_size = int(os.getenv('ADMIN_FEED_BUFFER', 1000))
+        self.poll_interval = float(os.getenv('ADMIN_FEED_POLL_SECONDS', 1))
+        # ObjectIds from different processes are only roughly ordered, so
+        # polling re-reads a short window and skips what it already emitted
+        self.poll_lag = timedelta(seconds=float(os.getenv('ADMIN_FEED_POLL_LAG_SECONDS', 2)))
+
+        self.mode = None
+        self.worker = PeriodicWorker('admin-feed', 0, self._tail_once, autostart=False)
+
+        self._events = deque(maxlen=self.buffer_size)
+        self._positions = {}
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self._stream = None
+        self._stream_token = None
+        self._watermark = None
+        self._recent_ids = deque(maxlen=5000)
+
+    # ---- Tailing --------------------------------------------------------
+
+    def ensure_started(self):
+        if self.worker.running:
+            return
+        with self._condition:
+            self._events.clear()
+            self._positions.clear()
+            self._stream = None
+            self._stream_token = None
+            self._watermark = None
+            self.mode = None
+        self.worker.start()
+
+    def latest_cursor(self):
+        with self._condition:
+            if self._events:
+                return self._events[-1][1]['cursor']
+        if self.mode == 'change_stream' and self._stream_token:
+            return self._stream_token
+        if self.mode == 'poll':
+            return self._encode_poll_cursor(*(self._watermark or self._poll_start()))
+        return None
+
+    def _tail_once(self):
+        try:
+            if self.mode is None:
+                self._select_mode()
+            if self.mode == 'change_stream':
+                self._tail_change_stream()
+            else:
+                self._tail_poll()
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            # The worker has no interval of its own, so every failure backs
+            # off here; an unexpected change document must not spin the thread
+            print(f"⚠️ Admin feed tail error: {e}")
+            self._stream = None
+            time.sleep(self.poll_interval)
+
+    def _select_mode(self):
+        if self.mode_setting == 'poll':
+            self.mode = 'poll'
+            return
+        try:
+            self._stream = self._open_stream()
+            self.mode = 'change_stream'
+        except OperationFailure as e:
+            if self.mode_setting == 'change_stream' or e.code not in CHANGE_STREAM_UNSUPPORTED:
+                raise
+            print("ℹ️ Change streams unavailable (standalone mongod), admin feed polls instead")
+            self.mode = 'poll'
+
+    def _open_stream(self, resume_after=None):
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': ['messages', 'message_buckets', 'chat_sessions']},
+            'operationType': {'$in': ['insert', 'update']}
+        }}]
+        return self.db.db.watch(pipeline, resume_after=resume_after, max_await_time_ms=1000)
+
+    def _tail_change_stream(self):
+        if self._stream is None:
+            resume_after = None
+            with self._condition:
+                if self._events:
+                    resume_after = {'_data': self._events[-1][1]['cursor']}
+            self._stream = self._open_stream(resume_after)
+
+        change = self._stream.try_next()
+        while change is not None:
+            event = self._event_from_change(change)
+            if event is not None:
+                self._publish(event)
+            change = self._stream.try_next()
+
+        # Post-batch token lets an idle dashboard resume from "now"
+        token = self._stream.resume_token
+        if token:
+            self._stream_token = token['_data']
+
+    def _poll_start(self):
+        start = ObjectId.from_datetime(datetime.utcnow() - self.poll_lag)
+        return start, start
+
+    def _tail_poll(self):
+        if self._watermark is None:
+            self._watermark = self._poll_start()
+
+        for event in self._poll_since(*self._watermark, limit=self.buffer_size, skip_ids=self._recent_ids):
+            self._recent_ids.append(event['_source_id'])
+            self._watermark = self._decode_poll_cursor(event['cursor'])
+            self._publish(event)
+
+    # ---- Event construction ---------------------------------------------
+
+    def _session_info(self, session_id):
+        """user_id and character_id of a session; both never change"""
+        key = str(session_id)
+        with self._sessions_lock:
+            info = self._sessions.get(key)
+            if info is not None:
+                self._sessions.move_to_end(key)
+                return info
+
+        session = self.db.chat_sessions.find_one(
+            {'_id': ObjectId(key)}, {'user_id': 1, 'character_id': 1}
+        ) or {}
+        info = (
+            str(session['user_id']) if session.get('user_id') else None,
+            str(session['character_id']) if session.get('character_id') else None
+        )
+        self._remember_session(key, info)
+        return info
+
+    def _remember_session(self, session_id, info):
+        with self._sessions_lock:
+            self._sessions[session_id] = info
+            if len(self._sessions) > 10000:
+                self._sessions.popitem(last=False)
+
+    def _message_event(self, message, cursor):
+        user_id, character_id = self._session_info(message['chat_session_id'])
+        return {
+            'cursor': cursor,
+            'type': 'message',
+            'message_id': str(message['_id']),
+            'session_id': str(message['chat_session_id']),
+            'user_id': user_id,
+            'character_id': character_id,
+            'sender_type': message.get('sender_type'),
+            'content': message.get('content', '')[:PREVIEW_LENGTH],
+            'timestamp': message['timestamp'].isoformat() if message.get('timestamp') else None
+        }
+
+    def _session_event(self, event_type, session, cursor):
+        self._remember_session(str(session['_id']), (
+            str(session['user_id']) if session.get('user_id') else None,
+            str(session['character_id']) if session.get('character_id') else None
+        ))
+        return {
+            'cursor': cursor,
+            'type': event_type,
+            'session_id': str(session['_id']),
+            'user_id': str(session['user_id']) if session.get('user_id') else None,
+            'character_id': str(session['character_id']) if session.get('character_id') else None,
+            'title': session.get('title'),
+            'is_active': session.get('is_active'),
+            'timestamp': (session.get('updated_at') or session.get('created_at') or datetime.utcnow()).isoformat()
+        }
+
+    def _event_from_change(self, change):
+        cursor = change['_id']['_data']
+        collection = change['ns']['coll']
+
+        if collection == 'messages' and change['operationType'] == 'insert':
+            return self._message_event(change['fullDocument'], cursor)
+
+        if collection == 'message_buckets':
+            # Every append pushes exactly one message into a bucket
+            if change['operationType'] == 'insert':
+                return self._message_event(change['fullDocument']['messages'][0], cursor)
+            updated = change.get('updateDescription', {}).get('updatedFields', {})
+            for field, value in updated.items():
+                if field.startswith('messages.'):
+                    return self._message_event(value, cursor)
+            return None
+
+        if collection == 'chat_sessions':
+            if change['operationType'] == 'insert':
+                return self._session_event('session_created', change['fullDocument'], cursor)
+
+            updated = change.get('updateDescription', {}).get('updatedFields', {})
+            # updated_at and message_count move on every message; only
+            # title changes and deletions are interesting on their own
+            if 'title' in updated or 'is_active' in updated:
+                session_id = change['documentKey']['_id']
+                user_id, character_id = self._session_info(session_id)
+                return {
+                    'cursor': cursor,
+                    'type': 'session_updated',
+                    'session_id': str(session_id),
+                    'user_id': user_id,
+                    'character_id': character_id,
+                    'title': updated.get('title'),
+                    'is_active': updated.get('is_active'),
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+        return None
+
+    @staticmethod
+    def _encode_poll_cursor(message_id, session_id):
+        return f"p.{message_id}.{session_id}"
+
+    @staticmethod
+    def _decode_poll_cursor(cursor):
+        parts = cursor.split('.')
+        if len(parts) != 3 or not all(ObjectId.is_valid(part) for part in parts[1:]):
+            raise ValueError(f"Invalid feed cursor: {cursor}")
+        return ObjectId(parts[1]), ObjectId(parts[2])
+
+    def _poll_since(self, message_after, session_after, limit, skip_ids=()):
+        """New messages and sessions after the given ``_id`` watermarks, oldest first"""
+        skip = set(skip_ids)
+        # Re-read a short window before each watermark to catch ids that were
+        # generated slightly out of order by other processes
+        message_from = ObjectId.from_datetime(message_after.generation_time - self.poll_lag)
+        session_from = ObjectId.from_datetime(session_after.generation_time - self.poll_lag)
+
+        messages = []
+        for store in self.db.message_stores.values():
+            messages.extend(store.after(message_from, limit))
+        sessions = self.db.chat_sessions.find({'_id': {'$gt': session_from}}).sort('_id', 1).limit(limit)
+
+        documents = [('message', m) for m in messages if m['_id'] not in skip and m['_id'] > message_after]
+        documents += [('session', s) for s in sessions if s['_id'] not in skip and s['_id'] > session_after]
+        documents.sort(key=lambda item: item[1]['_id'])
+
+        events = []
+        for kind, document in documents[:limit]:
+            if kind == 'message':
+                message_after = max(message_after, document['_id'])
+                cursor = self._encode_poll_cursor(message_after, session_after)
+                event = self._message_event(document, cursor)
+            else:
+                session_after = max(session_after, document['_id'])
+                cursor = self._encode_poll_cursor(message_after, session_after)
+                event = self._session_event('session_created', document, cursor)
+            event['_source_id'] = document['_id']
+            events.append(event)
+        return events
+
+    def _publish(self, event):
+        event.pop('_source_id', None)
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                _, oldest = self._events[0]
+                self._positions.pop(oldest['cursor'], None)
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._positions[event['cursor']] = self._seq
+            self._condition.notify_all()
+
+    # ---- Reading --------------------------------------------------------
+
+    @staticmethod
+    def matches(event, filters):
+        if filters.get('user_id') and event.get('user_id') != filters['user_id']:
+            return False
+        if filters.get('character_id') and event.get('character_id') != filters['character_id']:
+            return False
+        if filters.get('sender_type') and event.get('sender_type') != filters['sender_type']:
+            return False
+        return True
+
+    def _from_buffer(self, position, filters, limit, seen=None):
+        events = []
+        for seq, event in self._events:
+            if seq <= position or (seen and seen(event)):
+                continue
+            if self.matches(event, filters):
+                events.append(event)
+                if len(events) >= limit:
+                    break
+        return events
+
+    def _poll_seen(self, cursor):
+        """Predicate for buffered events already covered by a poll cursor's watermarks"""
+        message_after, session_after = self._decode_poll_cursor(cursor)
+
+        def seen(event):
+            if event['type'] == 'message':
+                return ObjectId(event['message_id']) <= message_after
+            return ObjectId(event['session_id']) <= session_after
+        return seen
+
+    def _catch_up(self, cursor, filters, limit):
+        """Events after a cursor that is no longer (or never was) in our buffer"""
+        if cursor.startswith('p.'):
+            events = self._poll_since(*self._decode_poll_cursor(cursor), limit=limit)
+        else:
+            events = []
+            with self._open_stream(resume_after={'_data': cursor}) as stream:
+                while len(events) < limit:
+                    change = stream.try_next()
+                    if change is None:
+                        break
+                    event = self._event_from_change(change)
+                    if event is not None:
+                        events.append(event)
+
+        for event in events:
+            event.pop('_source_id', None)
+        next_cursor = events[-1]['cursor'] if events else cursor
+        return [e for e in events if self.matches(e, filters)], next_cursor
+
+    def read(self, cursor, filters, limit=100, timeout=0):
+        """Events after ``cursor`` matching ``filters``, waiting up to ``timeout`` seconds.
+
+        Returns (events, next_cursor, reset); ``reset`` is True when the cursor
+        could not be resumed and the client should reload its snapshot.
+        """
+        self.ensure_started()
+        deadline = time.monotonic() + timeout
+        seen = None
+
+        with self._condition:
+            position = self._positions.get(cursor) if cursor else self._seq
+
+        if position is None:
+            try:
+                events, cursor = self._catch_up(cursor, filters, limit)
+            except (OperationFailure, ValueError):
+                # Resume token fell off the oplog or the cursor is malformed
+                return [], self.latest_cursor(), True
+            if events or timeout <= 0:
+                return events, cursor, False
+
+            with self._condition:
+                position = self._positions.get(cursor)
+            if position is None and cursor.startswith('p.'):
+                # Poll cursors from another worker never match ours exactly;
+                # compare the buffered events against its watermarks instead
+                position, seen = 0, self._poll_seen(cursor)
+
+        with self._condition:
+            while True:
+                if position is None:
+                    # A resume token our tail has not reached yet: wait for it
+                    # so events already returned by the catch-up are not repeated
+                    position = self._positions.get(cursor)
+                    events = []
+                else:
+                    events = self._from_buffer(position, filters, limit, seen)
+
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            if position is None:
+                next_cursor = cursor
+            elif len(events) >= limit:
+                next_cursor = events[-1]['cursor']
+            elif self._events:
+                # Everything buffered was scanned, matching or not
+                next_cursor = self._events[-1][1]['cursor']
+            else:
+                next_cursor = cursor or self.latest_cursor()
+
+        return events, next_cursor, False
+
+    def stats(self):
+        with self._condition:
+            return {
+                'mode': self.mode,
+                'running': self.worker.running,
+                'buffered_events': len(self._events),
+                'published_events': self._seq
+            }
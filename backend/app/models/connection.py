@@ -0,0 +1,231 @@
+from pymongo import MongoClient, monitoring
+from collections import defaultdict
+import threading
+import time
+import os
+
+
+def available_compressors():
+    """Return the wire compressors usable with the installed extras, best first"""
+    compressors = []
+
+    try:
+        import zstandard  # noqa: F401
+        compressors.append('zstd')
+    except ImportError:
+        pass
+
+    try:
+        import snappy  # noqa: F401
+        compressors.append('snappy')
+    except ImportError:
+        pass
+
+    # zlib ships with Python, so it is always available
+    compressors.append('zlib')
+    return compressors
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects per-server connection pool counters from pymongo pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._servers = defaultdict(self._empty_counters)
+
+    @staticmethod
+    def _empty_counters():
+        return {
+            'open': 0,
+            'checked_out': 0,
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'cleared': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0
+        }
+
+    def _bump(self, address, **changes):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            counters = self._servers[key]
+            for field, delta in changes.items():
+                counters[field] += delta
+
+    def pool_created(self, event):
+        self._bump(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        # Check-out start and finish are reported on the requesting thread
+        self._local.started_at = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        started_at = getattr(self._local, 'started_at', None)
+        wait_ms = (time.perf_counter() - started_at) * 1000 if started_at else 0.0
+        key = f"{event.address[0]}:{event.address[1]}"
+        with self._lock:
+            counters = self._servers[key]
+            counters['checked_out'] += 1
+            counters['checkouts'] += 1
+            counters['wait_ms_total'] += wait_ms
+            counters['wait_ms_max'] = max(counters['wait_ms_max'], wait_ms)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, checked_out=-1)
+
+    def reset(self):
+        with self._lock:
+            self._servers.clear()
+
+    def snapshot(self):
+        with self._lock:
+            servers = {}
+            for address, counters in self._servers.items():
+                stats = dict(counters)
+                wait_total = stats.pop('wait_ms_total')
+                stats['wait_ms_avg'] = round(wait_total / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+                stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+                servers[address] = stats
+            return servers
+
+
+class ConnectionManager:
+    """Owns the MongoClient of the current process.
+
+    The client is opened lazily and re-opened whenever the process id changes,
+    so an app preloaded in the gunicorn master never shares sockets or monitor
+    threads with its forked workers.
+    """
+
+    def __init__(self, uri, db_name, threads=None):
+        self.uri = uri
+        self.db_name = db_name
+        self.threads = threads or int(os.getenv('GUNICORN_THREADS', 8))
+        self.pool_stats = PoolStatsListener()
+        self.event_listeners = [self.pool_stats]
+
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Register a pymongo event listener for clients opened from now on"""
+        self.event_listeners.append(listener)
+
+    def client_options(self):
+        """Pool, compression and timeout settings for this worker"""
+        headroom = int(os.getenv('MONGO_POOL_HEADROOM', 2))
+        max_pool_size = int(os.getenv('MONGO_MAX_POOL_SIZE', self.threads + headroom))
+        min_pool_size = int(os.getenv('MONGO_MIN_POOL_SIZE', self.threads))
+
+        compressors = os.getenv('MONGO_COMPRESSORS')
+        if compressors is None:
+            compressors = ','.join(available_compressors())
+
+        options = {
+            'maxPoolSize': max_pool_size,
+            'minPoolSize': min(min_pool_size, max_pool_size),
+            'maxIdleTimeMS': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+            'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+            'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+            'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+            'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+            'appname': os.getenv('APP_NAME', 'Aku Kesepian')
+        }
+
+        if compressors:
+            options['compressors'] = compressors
+            if 'zlib' in compressors:
+                options['zlibCompressionLevel'] = int(os.getenv('MONGO_ZLIB_LEVEL', 6))
+
+        return options
+
+    @property
+    def client(self):
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    if self._pid != pid:
+                        # Counters inherited from the parent describe its pool, not ours
+                        self.pool_stats.reset()
+                    self._client = MongoClient(
+                        self.uri,
+                        event_listeners=list(self.event_listeners),
+                        **self.client_options()
+                    )
+                    self._pid = pid
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    def configure(self, threads=None):
+        """Resize the pool for a worker; takes effect on the next client open"""
+        if threads and threads != self.threads:
+            self.threads = threads
+            if self._pid == os.getpid():
+                self.close()
+
+    def warm_up(self):
+        """Open minPoolSize connections up front instead of on the first requests"""
+        client = self.client
+        client.admin.command('ping')
+
+        connections = client.options.pool_options.min_pool_size
+        if connections > 1:
+            # Concurrent pings force the pool to hold that many sockets at once
+            pingers = [
+                threading.Thread(target=client.admin.command, args=('ping',), daemon=True)
+                for _ in range(connections)
+            ]
+            for pinger in pingers:
+                pinger.start()
+            for pinger in pingers:
+                pinger.join(timeout=5)
+
+        print(f"✅ MongoDB pool warmed for worker {os.getpid()} ({connections} connections)")
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+    def stats(self):
+        options = self.client_options()
+        return {
+            'pid': os.getpid(),
+            'connected': self._client is not None and self._pid == os.getpid(),
+            'threads': self.threads,
+            'max_pool_size': options['maxPoolSize'],
+            'min_pool_size': options['minPoolSize'],
+            'compressors': options.get('compressors', ''),
+            'servers': self.pool_stats.snapshot()
+        }
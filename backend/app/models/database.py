@@ -1,25 +1,175 @@
-from pymongo import MongoClient
+from pymongo import UpdateOne
 from datetime import datetime, timedelta
+from collections import Counter
 import bcrypt
 import secrets
+import time
 import os
 from bson import ObjectId
+from .connection import ConnectionManager
+from .session_cache import SessionTailCache
+from .rollups import StatsRollupModel
+from .change_feed import AdminChangeFeed
+from .deletion_jobs import DeletionJobModel
+from .archive import MessageArchiveModel
+from .lifecycle import LifecycleManager
+from .message_store import create_message_stores
+from .search import MessageSearchModel
+from .idempotency import IdempotencyModel
+from .usage import TokenUsageModel
+from .touches import TouchCoalescer
+from .slow_ops import SlowOpLog
+from ..utils.background import PeriodicWorker
+from ..utils.event_broker import create_broker, session_channel
+
+def user_name_keys(user):
+    """Lowercased username, email, full name and name words, for admin prefix search"""
+    full_name = (user.get("full_name") or "").lower()
+    keys = {(user.get("username") or "").lower(), (user.get("email") or "").lower(), full_name}
+    keys.update(full_name.split())
+    return sorted(key for key in keys if key)
 
 class Database:
     def __init__(self, uri, db_name):
-        self.client = MongoClient(uri)
-        self.db = self.client[db_name]
-        self.users = self.db.users
-        self.chat_sessions = self.db.chat_sessions
-        self.messages = self.db.messages
-        self.characters = self.db.characters
-        self.reset_tokens = self.db.reset_tokens
+        self.connection = ConnectionManager(uri, db_name)
+        # Registered before the first client opens so every command is seen
+        self.slow_log = SlowOpLog(self)
+        self.connection.add_listener(self.slow_log.listener)
+        self.session_cache = SessionTailCache()
+        # Layout for new sessions, and every layout existing sessions may use
+        self.message_storage, self.message_stores = create_message_stores(self)
+        self.rollups = StatsRollupModel(self)
+        self.change_feed = AdminChangeFeed(self)
+        self.events = create_broker(self)
+        self.deletions = DeletionJobModel(self)
+        self.archive = MessageArchiveModel(self)
+        self.lifecycle = LifecycleManager(self)
+        self.search = MessageSearchModel(self)
+        self.idempotency = IdempotencyModel(self)
+        self.usage = TokenUsageModel(self)
+        self.touches = TouchCoalescer(self)
+        
+        # Background tasks, started in each worker process after fork
+        self.workers = [
+            PeriodicWorker('stats-flush', self.rollups.flush_interval, self.rollups.flush, run_on_stop=True),
+            PeriodicWorker('stats-reconcile', self.rollups.reconcile_interval, self.rollups.reconcile_if_leader),
+            self.change_feed.worker,
+            self.deletions.worker,
+            PeriodicWorker('lifecycle', self.lifecycle.interval, self.lifecycle.run_if_leader),
+            self.search.worker,
+            self.usage.worker,
+            self.touches.worker,
+            self.slow_log.worker
+        ]
+        if hasattr(self.events, 'worker'):
+            self.workers.append(self.events.worker)
         
         # Create indexes
         self.create_indexes()
         
         # Initialize default characters
         self.initialize_characters()
+        self.backfill_user_name_keys()
+        
+        # Release the bootstrap client so a preloaded gunicorn master
+        # holds no sockets; each worker opens its own pool after fork
+        self.connection.close()
+    
+    # Collections resolve through the connection manager on every access,
+    # so they always belong to the current process's client
+    @property
+    def client(self):
+        return self.connection.client
+    
+    @property
+    def db(self):
+        return self.connection.db
+    
+    @property
+    def users(self):
+        return self.db.users
+    
+    @property
+    def chat_sessions(self):
+        return self.db.chat_sessions
+    
+    @property
+    def messages(self):
+        return self.db.messages
+    
+    @property
+    def message_buckets(self):
+        return self.db.message_buckets
+    
+    @property
+    def characters(self):
+        return self.db.characters
+    
+    @property
+    def reset_tokens(self):
+        return self.db.reset_tokens
+    
+    @property
+    def leases(self):
+        return self.db.leases
+    
+    @property
+    def stats_global(self):
+        return self.db.stats_global
+    
+    @property
+    def stats_daily(self):
+        return self.db.stats_daily
+    
+    @property
+    def stats_active_users(self):
+        return self.db.stats_active_users
+    
+    @property
+    def session_events(self):
+        return self.db.session_events
+    
+    @property
+    def deletion_jobs(self):
+        return self.db.deletion_jobs
+    
+    @property
+    def messages_archive(self):
+        return self.db.messages_archive
+    
+    @property
+    def message_search(self):
+        return self.db.message_search
+    
+    @property
+    def idempotency_keys(self):
+        return self.db.idempotency_keys
+    
+    @property
+    def token_usage_daily(self):
+        return self.db.token_usage_daily
+    
+    @property
+    def slow_ops(self):
+        return self.db.slow_ops
+    
+    def start_workers(self):
+        """Start background tasks in this process; cheap to call repeatedly"""
+        for worker in self.workers:
+            if worker.autostart:
+                worker.start()
+    
+    def on_worker_start(self, threads=None):
+        """Called once per worker process after fork"""
+        self.connection.configure(threads=threads)
+        self.connection.warm_up()
+        self.start_workers()
+    
+    def on_worker_exit(self):
+        """Called when a worker process shuts down"""
+        for worker in self.workers:
+            worker.stop()
+        self.connection.close()
     
     def create_indexes(self):
         try:
@@ -35,19 +185,71 @@ class Database:
         except Exception as e:
             print(f"Username index already exists or error: {e}")
         
+        # Admin prefix search over username, email and full name
+        self.users.create_index([("name_keys", 1), ("_id", 1)])
+        # Admin user list (newest first) and daily sign-up counts
+        self.users.create_index([("created_at", -1)])
+        
         try:
             # Chat session indexes
             self.chat_sessions.create_index([("user_id", 1), ("created_at", -1)])
+            # Session list and its validator, newest activity first
+            self.chat_sessions.create_index([("user_id", 1), ("is_active", 1), ("updated_at", -1)])
+            # Admin session search by character and/or creation date
+            self.chat_sessions.create_index([("character_id", 1), ("created_at", -1)])
+            self.chat_sessions.create_index([("created_at", -1)])
+            # Admin list of recently active sessions; closed ones are left out
+            self.chat_sessions.create_index(
+                [("updated_at", -1)],
+                partialFilterExpression={"is_active": True}
+            )
             print("✅ Created chat session indexes")
         except Exception as e:
             print(f"Chat session index already exists or error: {e}")
         
-        # Message indexes
-        self.messages.create_index([("chat_session_id", 1), ("timestamp", 1)])
+        # Message indexes, for every storage layout
+        for store in self.message_stores.values():
+            store.create_indexes()
         
         # Reset token indexes
         self.reset_tokens.create_index("expires_at", expireAfterSeconds=0)
         self.reset_tokens.create_index("token", unique=True)
+        
+        # Statistics rollup indexes
+        self.rollups.create_indexes()
+        
+        # Session event broker storage
+        self.events.create_indexes()
+        
+        # Background deletion job indexes
+        self.deletions.create_indexes()
+        
+        # Data lifecycle: purge lookups, archived chunks
+        self.lifecycle.create_indexes()
+        self.archive.create_indexes()
+        
+        # Message search index
+        self.search.create_indexes()
+        
+        # Stored responses of idempotent requests (TTL)
+        self.idempotency.create_indexes()
+        
+        # LLM token usage per user and day
+        self.usage.create_indexes()
+        
+        # Slow Mongo operations (capped)
+        self.slow_log.create_indexes()
+    
+    def backfill_user_name_keys(self):
+        """Give users created before admin search their search keys"""
+        missing = self.users.find(
+            {"name_keys": {"$exists": False}},
+            {"username": 1, "email": 1, "full_name": 1}
+        )
+        operations = [UpdateOne({"_id": user["_id"]}, {"$set": {"name_keys": user_name_keys(user)}}) for user in missing]
+        if operations:
+            self.users.bulk_write(operations, ordered=False)
+            print(f"✅ Added search keys to {len(operations)} users")
     
     def initialize_characters(self):
         """Initialize default AI characters if they don't exist"""
@@ -181,7 +383,10 @@ class UserModel:
             }
         }
         
+        user_data["name_keys"] = user_name_keys(user_data)
+        
         result = self.db.users.insert_one(user_data)
+        self.db.rollups.record_user_created()
         if is_admin:
             print(f"✅ Created admin user: {email}")
         return result.inserted_id
@@ -196,11 +401,19 @@ class UserModel:
         return bcrypt.checkpw(password.encode('utf-8'), password_hash)
     
     def update_user(self, user_id, update_data):
+        if {"username", "email", "full_name"} & set(update_data):
+            # Keep the admin search keys in step with the names
+            user = self.get_user_by_id(user_id) or {}
+            update_data = dict(update_data, name_keys=user_name_keys({**user, **update_data}))
         return self.db.users.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
     
+    def record_login(self, user_id):
+        """Note a login; written behind with other touches instead of right away"""
+        self.db.touches.touch("users", ObjectId(user_id), latest={"last_login": datetime.utcnow()})
+    
     def verify_user_email(self, user_id):
         return self.db.users.update_one(
             {"_id": ObjectId(user_id)},
@@ -210,6 +423,7 @@ class UserModel:
 class ChatModel:
     def __init__(self, db):
         self.db = db
+        self.cache = db.session_cache
     
     def create_chat_session(self, user_id, character_id, title="New Chat"):
         session_data = {
@@ -218,10 +432,16 @@ class ChatModel:
             "title": title,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
+            "message_count": 0,
+            "storage": self.db.message_storage,
             "is_active": True
         }
         
         result = self.db.chat_sessions.insert_one(session_data)
+        self.db.rollups.record_session_created(character_id)
+        
+        # A new session is fully known, so cache its (empty) tail right away
+        self.cache.load(result.inserted_id, [], complete=True, version=0)
         return result.inserted_id
     
     def get_user_chat_sessions(self, user_id):
@@ -229,39 +449,226 @@ class ChatModel:
             {"user_id": ObjectId(user_id), "is_active": True}
         ).sort("updated_at", -1))
     
+    def get_changed_sessions(self, user_id, since, after_id=None, limit=100):
+        """Sessions (deleted ones included) changed after ``(since, after_id)``, oldest change first"""
+        query = {"user_id": ObjectId(user_id), "is_active": {"$in": [True, False]}}
+        if after_id is None:
+            query["updated_at"] = {"$gt": since}
+        else:
+            query["$or"] = [
+                {"updated_at": {"$gt": since}},
+                {"updated_at": since, "_id": {"$gt": after_id}}
+            ]
+        return list(self.db.chat_sessions.find(query).sort([("updated_at", 1), ("_id", 1)]).limit(limit))
+    
+    def get_messages_since(self, session, after, limit):
+        """Up to ``limit`` messages of a session newer than ``after``"""
+        return self._store(session["_id"], session).since(session["_id"], after, limit)
+    
+    def sessions_version(self, user_id):
+        """Count and latest activity of a user's session list, from the index alone"""
+        rows = list(self.db.chat_sessions.aggregate([
+            {"$match": {"user_id": ObjectId(user_id), "is_active": True}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "updated_at": {"$max": "$updated_at"}}}
+        ]))
+        if not rows:
+            return 0, None
+        return rows[0]["count"], rows[0]["updated_at"]
+    
     def get_chat_session(self, session_id, user_id):
+        # Sessions pending deletion are already gone as far as users are concerned
         return self.db.chat_sessions.find_one({
             "_id": ObjectId(session_id),
-            "user_id": ObjectId(user_id)
+            "user_id": ObjectId(user_id),
+            "deleted_at": {"$exists": False}
         })
     
-    def add_message(self, session_id, sender_type, content, character_id=None):
+    def _store(self, session_id, session=None):
+        """Message store holding the session's messages"""
+        if session is None:
+            session = self.db.chat_sessions.find_one({"_id": ObjectId(session_id)}, {"storage": 1}) or {}
+        # Sessions that predate the storage field use the original layout
+        return self.db.message_stores[session.get("storage", "documents")]
+    
+    def add_message(self, session_id, sender_type, content, character_id=None, timestamp=None, session=None):
         message_data = {
             "chat_session_id": ObjectId(session_id),
-            "sender_type": sender_type,  # "user" or "ai"
+            "sender_type": sender_type,  # "user", "ai" or "admin"
             "content": content,
             "character_id": ObjectId(character_id) if character_id else None,
-            "timestamp": datetime.utcnow()
+            "timestamp": timestamp or datetime.utcnow()
         }
         
-        result = self.db.messages.insert_one(message_data)
+        store = self._store(session_id, session)
+        message_id = store.insert(message_data)
+        
+        # Update session timestamp; message_count doubles as the cache version
+        updated = self.db.chat_sessions.find_one_and_update(
+            {"_id": ObjectId(session_id)},
+            {
+                "$set": {"updated_at": datetime.utcnow(), "last_message_id": message_id},
+                "$inc": {"message_count": 1}
+            },
+            projection={"storage": 1, "user_id": 1, "character_id": 1}
+        )
+        current = self._store(session_id, updated or {})
+        if current is not store:
+            # The session was migrated to another layout meanwhile; follow it
+            current.insert(dict(message_data))
+            store.remove(session_id, [message_data])
+        if updated:
+            self.db.search.index_message(message_data, updated)
         
-        # Update session timestamp
+        self.cache.append(session_id, message_data)
+        self.db.rollups.record_message(sender_type)
+        self.db.events.publish(session_channel(session_id), {
+            "type": "message",
+            "message": {
+                "id": str(message_id),
+                "sender_type": sender_type,
+                "content": content,
+                "timestamp": message_data["timestamp"].isoformat()
+            }
+        })
+        return message_id
+    
+    def update_session_title(self, session_id, title):
+        # updated_at doubles as the validator of session listings
         self.db.chat_sessions.update_one(
             {"_id": ObjectId(session_id)},
-            {"$set": {"updated_at": datetime.utcnow()}}
+            {"$set": {"title": title, "updated_at": datetime.utcnow()}}
         )
+        self.db.events.publish(session_channel(session_id), {"type": "title", "title": title})
+    
+    @staticmethod
+    def _join(archived, hot):
+        """Archived and hot messages in order, minus any caught mid-move"""
+        if not archived:
+            return hot
+        seen = {message["_id"] for message in hot}
+        merged = [message for message in archived if message["_id"] not in seen] + hot
+        return sorted(merged, key=lambda message: (message["timestamp"], message["_id"]))
+    
+    def _get_tail(self, session_id, session):
+        """Cached tail of a session, loaded from Mongo on a miss"""
+        version = session.get("message_count", 0)
+        tail = self.cache.get(session_id, version)
+        if tail is not None:
+            return tail
         
-        return result.inserted_id
+        # One extra message tells whether the tail covers the whole session
+        size = self.cache.tail_size + 1
+        newest = self._store(session_id, session).newest(session_id, size)
+        
+        archived = session.get("archived_count", 0)
+        complete = len(newest) + archived < size
+        if archived and len(newest) < size:
+            # Top the tail up from the archive when the hot history runs short
+            newest = self._join(self.db.archive.newest(session_id, size), newest)[-size:]
+        return self.cache.load(session_id, newest, complete, version)
+    
+    def get_chat_messages(self, session_id, limit=50, session=None):
+        """Oldest ``limit`` messages of a session (all if None), reading through the archive"""
+        if session is None:
+            session = self.db.chat_sessions.find_one(
+                {"_id": ObjectId(session_id)},
+                {"message_count": 1, "archived_count": 1, "storage": 1}
+            ) or {}
+        else:
+            tail = self._get_tail(session_id, session)
+            if tail.complete:
+                return tail.messages[:limit]
+        
+        messages = self._store(session_id, session).oldest(session_id, limit)
+        if session.get("archived_count"):
+            messages = self._join(self.db.archive.oldest(session_id, limit), messages)
+        return messages if limit is None else messages[:limit]
     
-    def get_chat_messages(self, session_id, limit=50):
-        return list(self.db.messages.find(
-            {"chat_session_id": ObjectId(session_id)}
-        ).sort("timestamp", 1).limit(limit))
+    def get_recent_messages(self, session_id, limit=10, session=None):
+        """Newest ``limit`` messages of a session, oldest first"""
+        if session is not None and limit <= self.cache.tail_size:
+            tail = self._get_tail(session_id, session)
+            return tail.messages[-limit:] if limit else []
+        
+        newest = self._store(session_id, session).newest(session_id, limit)
+        if len(newest) < limit and (session is None or session.get("archived_count")):
+            newest = self._join(self.db.archive.newest(session_id, limit), newest)[-limit:]
+        return newest
+    
+    def get_messages_window(self, session, limit, before=None, after=None, projection=None):
+        """Up to ``limit`` messages next to a (timestamp, _id) key, oldest first.
+
+        ``after`` pages forward from the key; otherwise the window ends at
+        ``before``, or at the newest message when that is not set either.
+        Archived history is read only when the hot store runs out.
+        """
+        session_id = session["_id"]
+        store = self._store(session_id, session)
+        archived = session.get("archived_count")
+        if after is not None:
+            # The archive holds everything older than the hot store
+            messages = self.db.archive.window(session_id, limit, after=after) if archived else []
+            if len(messages) < limit:
+                messages = self._join(messages, store.window(session_id, limit, after=after, projection=projection))
+            return messages[:limit]
+        
+        messages = store.window(session_id, limit, before=before, projection=projection)
+        if len(messages) < limit and archived:
+            messages = self._join(self.db.archive.window(session_id, limit, before=before), messages)
+        return messages[-limit:]
+    
+    def get_sender_counts(self, session):
+        """Message counts per sender type of one session, archived ones included"""
+        counts = Counter(self._store(session["_id"], session).session_senders(session["_id"]))
+        if session.get("archived_count"):
+            counts.update(self.db.archive.session_senders(session["_id"]))
+        return dict(counts)
+    
+    def get_messages_by_ids(self, session, message_ids):
+        """The given messages of one session, wherever they are stored"""
+        wanted = set(message_ids)
+        found = self._store(session["_id"], session).find(session["_id"], wanted)
+        missing = wanted - {message["_id"] for message in found}
+        if missing and session.get("archived_count"):
+            found += self.db.archive.find(session["_id"], missing)
+        return found
+    
+    def count_messages(self, sessions):
+        """Total messages of the given session documents, archived ones included"""
+        total = sum(session.get("archived_count", 0) for session in sessions)
+        for name, store in self.db.message_stores.items():
+            session_ids = [s["_id"] for s in sessions if s.get("storage", "documents") == name]
+            if session_ids:
+                total += store.count(session_ids)
+        return total
+    
+    def invalidate_session(self, session_id):
+        self.cache.invalidate(session_id)
 
 class CharacterModel:
     def __init__(self, db):
         self.db = db
+        self.catalog_ttl = float(os.getenv('CHARACTER_CATALOG_TTL_SECONDS', 60))
+        self._catalog = (0, None)
+    
+    def catalog_version(self):
+        """Changes whenever a character is added, edited or retired; cached briefly"""
+        checked_at, version = self._catalog
+        if version is not None and time.monotonic() - checked_at < self.catalog_ttl:
+            return version
+        rows = list(self.db.characters.aggregate([
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "active": {"$sum": {"$cond": ["$is_active", 1, 0]}},
+                "changed": {"$max": {"$ifNull": ["$updated_at", "$created_at"]}}
+            }}
+        ]))
+        row = rows[0] if rows else {}
+        changed = row.get("changed")
+        version = f"{row.get('count', 0)}.{row.get('active', 0)}.{changed.timestamp() if changed else 0}"
+        self._catalog = (time.monotonic(), version)
+        return version
     
     def get_all_characters(self):
         return list(self.db.characters.find({"is_active": True}))
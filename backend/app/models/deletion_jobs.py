@@ -0,0 +1,212 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from datetime import datetime, timedelta
+import time
+import os
+from .leases import worker_identity
+from ..utils.background import PeriodicWorker
+
+
+class DeletionJobModel:
+    """Cascade deletions of users and chat sessions, executed in the background.
+
+    The target is marked deleted right away so it disappears from the app;
+    its messages and sessions are then removed in bounded batches by a worker
+    that holds a renewable lease on the job. If that worker dies, the lease
+    expires and another worker resumes the job from where it stopped (every
+    batch only deletes what is still there, so re-running is harmless).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.batch_size = int(os.getenv('DELETION_BATCH_SIZE', 500))
+        # Pause between batches so the cascade never starves foreground queries
+        self.batch_pause = int(os.getenv('DELETION_BATCH_PAUSE_MS', 50)) / 1000
+        self.lease_seconds = int(os.getenv('DELETION_LEASE_SECONDS', 60))
+        self.poll_interval = float(os.getenv('DELETION_POLL_SECONDS', 2))
+        self.worker = PeriodicWorker('deletion-jobs', self.poll_interval, self.run_pending)
+
+    def create_indexes(self):
+        # At most one unfinished job per target
+        self.db.deletion_jobs.create_index(
+            [("kind", 1), ("target_id", 1)],
+            unique=True,
+            partialFilterExpression={"active": True}
+        )
+        self.db.deletion_jobs.create_index([("active", 1), ("created_at", 1)])
+        self.db.deletion_jobs.create_index("created_at")
+
+    # ---- Enqueueing -------------------------------------------------------
+
+    def _enqueue(self, kind, target_id, requested_by):
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "target_id": ObjectId(target_id),
+            "status": "pending",
+            "active": True,
+            "requested_by": ObjectId(requested_by) if requested_by else None,
+            "progress": {"messages_deleted": 0, "sessions_deleted": 0},
+            "attempts": 0,
+            "lease_until": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            self.db.deletion_jobs.insert_one(job)
+            # Start on it now rather than at the next poll
+            self.worker.trigger()
+            return job
+        except DuplicateKeyError:
+            # Already being deleted; report the existing job
+            return self.db.deletion_jobs.find_one({
+                "kind": kind, "target_id": ObjectId(target_id), "active": True
+            })
+
+    def enqueue_user_deletion(self, user_id, requested_by=None):
+        """Hide the user and their sessions now; delete everything in the background"""
+        now = datetime.utcnow()
+        result = self.db.users.update_one(
+            {"_id": ObjectId(user_id), "deleted_at": {"$exists": False}},
+            {"$set": {"is_active": False, "deleted_at": now}}
+        )
+        if result.matched_count:
+            closed = self.db.chat_sessions.update_many(
+                {"user_id": ObjectId(user_id), "is_active": True},
+                {"$set": {"is_active": False, "deleted_at": now, "updated_at": now}}
+            )
+            self.db.rollups.record_user_deleted(sessions=closed.modified_count)
+        elif not self.db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1}):
+            return None
+
+        return self._enqueue("user", user_id, requested_by)
+
+    def enqueue_session_deletion(self, session_id, requested_by=None):
+        """Hide the session now; delete its messages in the background"""
+        now = datetime.utcnow()
+        session = self.db.chat_sessions.find_one_and_update(
+            {"_id": ObjectId(session_id)},
+            {"$set": {"is_active": False, "deleted_at": now, "updated_at": now}},
+            projection={"is_active": 1, "character_id": 1, "deleted_at": 1}
+        )
+        if session is None:
+            return None
+        if session.get("is_active"):
+            self.db.rollups.record_session_closed(session.get("character_id"))
+
+        return self._enqueue("session", session_id, requested_by)
+
+    # ---- Reads ------------------------------------------------------------
+
+    def get_job(self, job_id):
+        return self.db.deletion_jobs.find_one({"_id": ObjectId(job_id)})
+
+    def list_jobs(self, status=None, limit=50):
+        query = {"status": status} if status else {}
+        return list(self.db.deletion_jobs.find(query).sort("created_at", -1).limit(limit))
+
+    # ---- Execution --------------------------------------------------------
+
+    def _claim(self):
+        now = datetime.utcnow()
+        return self.db.deletion_jobs.find_one_and_update(
+            {
+                "active": True,
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "holder": worker_identity(),
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _checkpoint(self, job, messages=0, sessions=0):
+        """Record progress and renew the lease; False if the lease was lost"""
+        now = datetime.utcnow()
+        result = self.db.deletion_jobs.update_one(
+            {"_id": job["_id"], "holder": worker_identity()},
+            {
+                "$inc": {
+                    "progress.messages_deleted": messages,
+                    "progress.sessions_deleted": sessions
+                },
+                "$set": {
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                }
+            }
+        )
+        return result.matched_count == 1
+
+    def _delete_session_messages(self, job, session_id):
+        """Delete one session's messages batch by batch; False if interrupted"""
+        for store in self.db.message_stores.values():
+            while True:
+                deleted = store.delete_batch(session_id, self.batch_size)
+                if not deleted:
+                    break
+                self.db.rollups.record_messages_deleted(deleted)
+                if not self._checkpoint(job, messages=deleted):
+                    return False
+                time.sleep(self.batch_pause)
+        return True
+
+    def _delete_session(self, job, session_id):
+        if not self._delete_session_messages(job, session_id):
+            return False
+        while self.db.search.delete_batch(session_id, self.batch_size):
+            time.sleep(self.batch_pause)
+        self.db.archive.delete_session(session_id)
+        self.db.chat_sessions.delete_one({"_id": session_id})
+        self.db.session_cache.invalidate(session_id)
+        return self._checkpoint(job, sessions=1)
+
+    def _run_job(self, job):
+        target_id = job["target_id"]
+
+        if job["kind"] == "session":
+            if not self._delete_session(job, target_id):
+                return
+        elif job["kind"] == "user":
+            while True:
+                session = self.db.chat_sessions.find_one({"user_id": target_id}, {"_id": 1})
+                if session is None:
+                    break
+                if not self._delete_session(job, session["_id"]):
+                    return
+            self.db.users.delete_one({"_id": target_id})
+
+        self.db.deletion_jobs.update_one(
+            {"_id": job["_id"], "holder": worker_identity()},
+            {
+                "$set": {"status": "done", "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()},
+                "$unset": {"active": "", "lease_until": ""}
+            }
+        )
+        print(f"✅ Deletion job {job['_id']} ({job['kind']} {target_id}) finished")
+
+    def run_pending(self):
+        """Process claimable jobs one at a time until none are left"""
+        while True:
+            job = self._claim()
+            if job is None:
+                return
+            try:
+                self._run_job(job)
+            except Exception as e:
+                print(f"❌ Deletion job {job['_id']} failed: {e}")
+                # Leave it active; the lease expires and the job is retried
+                self.db.deletion_jobs.update_one(
+                    {"_id": job["_id"]},
+                    {"$set": {"error": str(e), "updated_at": datetime.utcnow()}}
+                )
+                return
+
@@ -0,0 +1,112 @@
+from bson import ObjectId
+import os
+
+
+def _iso(moment):
+    return moment.isoformat() if moment else None
+
+
+class ConversationExporter:
+    """Yields export records one at a time straight from Mongo cursors.
+
+    Records are plain dicts with a ``type`` of ``user``, ``session`` or
+    ``message``; a session's messages always follow its session record,
+    oldest first, archived history included. The same records are what
+    ``import_conversations.py`` reads back.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.batch_size = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+
+    @staticmethod
+    def user_record(user):
+        return {
+            "type": "user",
+            "id": str(user["_id"]),
+            "username": user.get("username"),
+            "email": user.get("email"),
+            "full_name": user.get("full_name"),
+            "created_at": _iso(user.get("created_at"))
+        }
+
+    @staticmethod
+    def session_record(session):
+        return {
+            "type": "session",
+            "id": str(session["_id"]),
+            "user_id": str(session["user_id"]),
+            "character_id": str(session["character_id"]),
+            "title": session.get("title"),
+            "is_active": session.get("is_active", True),
+            "created_at": _iso(session.get("created_at")),
+            "updated_at": _iso(session.get("updated_at"))
+        }
+
+    @staticmethod
+    def message_record(message):
+        return {
+            "type": "message",
+            "id": str(message["_id"]),
+            "session_id": str(message["chat_session_id"]),
+            "sender_type": message["sender_type"],
+            "content": message["content"],
+            "character_id": str(message["character_id"]) if message.get("character_id") else None,
+            "timestamp": _iso(message["timestamp"])
+        }
+
+    def _messages(self, session, batch_size, window=None):
+        if session.get("archived_count"):
+            yield from self.db.archive.iterate(session["_id"], window)
+        store = self.db.message_stores[session.get("storage", "documents")]
+        yield from store.iterate(session["_id"], batch_size, window)
+
+    def session_records(self, session, batch_size=None, window=None):
+        """A session and its messages; with a ``window``, nothing unless a message falls in it"""
+        batch_size = batch_size or self.batch_size
+        header = self.session_record(session)
+        if window is None:
+            yield header
+            header = None
+        for message in self._messages(session, batch_size, window):
+            if header:
+                yield header
+                header = None
+            yield self.message_record(message)
+
+    def user_records(self, user_id, batch_size=None, include_deleted=False):
+        """Every session of one user, oldest session first"""
+        query = {"user_id": ObjectId(user_id)}
+        if not include_deleted:
+            query["deleted_at"] = {"$exists": False}
+        sessions = self.db.chat_sessions.find(query).sort("created_at", 1).batch_size(100)
+        for session in sessions:
+            yield from self.session_records(session, batch_size)
+
+    def range_records(self, start, end, batch_size=None):
+        """Messages sent in [start, end) across all users, grouped by session.
+
+        Sessions (and users) without a message in the range are left out.
+        """
+        window = {"$gte": start, "$lt": end}
+        # Sessions created before the end and still active after the start
+        sessions = self.db.chat_sessions.find(
+            {"created_at": {"$lt": end}, "updated_at": {"$gte": start}}
+        ).sort("created_at", 1).batch_size(100)
+
+        seen_users = set()
+        for session in sessions:
+            records = self.session_records(session, batch_size, window)
+            first = next(records, None)
+            if first is None:
+                continue
+            if session["user_id"] not in seen_users:
+                user = self.db.users.find_one(
+                    {"_id": session["user_id"]},
+                    {"username": 1, "email": 1, "full_name": 1, "created_at": 1}
+                )
+                if user:
+                    yield self.user_record(user)
+                seen_users.add(session["user_id"])
+            yield first
+            yield from records
@@ -0,0 +1,126 @@
+from pymongo.errors import DuplicateKeyError
+from collections import namedtuple
+from datetime import datetime, timedelta
+from uuid import uuid4
+import hashlib
+import time
+import os
+
+PENDING, DONE = 'pending', 'done'
+
+# A request's hold on a key; ``progress`` holds what earlier attempts stored
+Claim = namedtuple('Claim', ['record_id', 'token', 'progress'])
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+class IdempotencyLost(Exception):
+    """Another request took the claim over after its lease ran out"""
+
+
+class IdempotencyModel:
+    """Stored outcomes of requests sent with an ``Idempotency-Key``.
+
+    The first request with a key claims it with an insert on the unique
+    ``_id``; retries get the stored response back, and retries arriving
+    while the first is still running wait for its result. A claim whose
+    owner died is taken over once its lease runs out; each claim carries
+    its own token, and only the current holder can record progress or the
+    outcome. Steps already done (a stored message) are kept as progress
+    on the record, so a retry after a failure resumes instead of redoing
+    them. Records expire through a TTL index after ``IDEMPOTENCY_TTL_HOURS``.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.ttl = timedelta(hours=int(os.getenv('IDEMPOTENCY_TTL_HOURS', 24)))
+        # Longer than a slow completion, so a live request is never taken over
+        self.lease = timedelta(seconds=int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 120)))
+        self.wait_seconds = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 60))
+        self.poll_seconds = 0.25
+
+    def create_indexes(self):
+        self.db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def fingerprint(*parts):
+        return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def begin(self, record_id, fingerprint):
+        """Claim ``record_id``; returns ``(claim, None)`` when the caller should
+        do the work, else ``(None, (status, body))`` of the original request.
+
+        Raises ``IdempotencyConflict`` for a reused key and ``TimeoutError``
+        if the original is still running after ``IDEMPOTENCY_WAIT_SECONDS``.
+        """
+        now = datetime.utcnow()
+        token = uuid4().hex
+        try:
+            self.db.idempotency_keys.insert_one({
+                "_id": record_id,
+                "fingerprint": fingerprint,
+                "state": PENDING,
+                "token": token,
+                "progress": {},
+                "lease_until": now + self.lease,
+                "created_at": now,
+                "expires_at": now + self.ttl
+            })
+            return Claim(record_id, token, {}), None
+        except DuplicateKeyError:
+            pass
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            record = self.db.idempotency_keys.find_one({"_id": record_id})
+            if record is None:
+                # Expired or abandoned between our insert and read; claim again
+                return self.begin(record_id, fingerprint)
+            if record["fingerprint"] != fingerprint:
+                raise IdempotencyConflict(record_id)
+            if record["state"] == DONE:
+                return None, (record["status"], record["body"])
+
+            now = datetime.utcnow()
+            if record["lease_until"] < now:
+                taken = self.db.idempotency_keys.update_one(
+                    {"_id": record_id, "state": PENDING, "lease_until": record["lease_until"]},
+                    {"$set": {"lease_until": now + self.lease, "token": token}}
+                )
+                if taken.modified_count:
+                    return Claim(record_id, token, record.get("progress", {})), None
+            if time.monotonic() >= deadline:
+                raise TimeoutError(record_id)
+            time.sleep(self.poll_seconds)
+
+    def _holder(self, claim):
+        return {"_id": claim.record_id, "state": PENDING, "token": claim.token}
+
+    def record_progress(self, claim, **steps):
+        """Keep finished steps for a retry and renew the lease; raises
+        ``IdempotencyLost`` if another request holds the claim now"""
+        update = {f"progress.{name}": value for name, value in steps.items()}
+        update["lease_until"] = datetime.utcnow() + self.lease
+        result = self.db.idempotency_keys.update_one(self._holder(claim), {"$set": update})
+        if not result.matched_count:
+            raise IdempotencyLost(claim.record_id)
+        claim.progress.update(steps)
+
+    def complete(self, claim, status, body):
+        """Store the outcome; False if the claim was taken over meanwhile"""
+        result = self.db.idempotency_keys.update_one(
+            self._holder(claim),
+            {"$set": {"state": DONE, "status": status, "body": body, "completed_at": datetime.utcnow()},
+             "$unset": {"token": ""}}
+        )
+        return result.matched_count == 1
+
+    def abandon(self, claim):
+        """Release a claim whose request failed; a retry takes it over at once
+        and resumes from its progress"""
+        self.db.idempotency_keys.update_one(
+            self._holder(claim),
+            {"$set": {"lease_until": datetime.utcnow()}, "$unset": {"token": ""}}
+        )
@@ -0,0 +1,36 @@
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+import socket
+import os
+
+
+def worker_identity():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseModel:
+    """Time-bounded named locks so only one worker runs a periodic job"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def try_acquire(self, name, seconds):
+        """Take or renew the lease ``name``; False if another worker holds it"""
+        now = datetime.utcnow()
+        holder = worker_identity()
+        try:
+            self.db.leases.update_one(
+                {
+                    "_id": name,
+                    "$or": [{"expires_at": {"$lt": now}}, {"holder": holder}]
+                },
+                {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease exists and is held by someone else
+            return False
+
+    def release(self, name):
+        self.db.leases.delete_one({"_id": name, "holder": worker_identity()})
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+import os
+from .leases import LeaseModel
+
+
+class LifecycleManager:
+    """Keeps the hot collections bounded.
+
+    Soft-deleted sessions are handed to the deletion jobs once their grace
+    period has passed, and messages older than the archive age are moved
+    into ``messages_archive``. Every worker runs the timer; a lease lets
+    only one of them do the work.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.interval = int(os.getenv('LIFECYCLE_INTERVAL_SECONDS', 3600))
+        self.purge_grace_days = int(os.getenv('SESSION_PURGE_GRACE_DAYS', 30))
+        self.archive_after_days = int(os.getenv('MESSAGE_ARCHIVE_AFTER_DAYS', 90))
+        # Work done per run; whatever is left waits for the next run
+        self.max_sessions = int(os.getenv('LIFECYCLE_MAX_SESSIONS', 200))
+        self.leases = LeaseModel(db)
+        self.last_run = None
+
+    def create_indexes(self):
+        # Soft deletes set is_active false and stamp updated_at
+        self.db.chat_sessions.create_index([("is_active", 1), ("updated_at", 1)])
+
+    def purge_deleted_sessions(self):
+        cutoff = datetime.utcnow() - timedelta(days=self.purge_grace_days)
+        sessions = self.db.chat_sessions.find(
+            {"is_active": False, "updated_at": {"$lt": cutoff}},
+            {"_id": 1}
+        ).limit(self.max_sessions)
+
+        purged = 0
+        for session in sessions:
+            if self.db.deletions.enqueue_session_deletion(session["_id"]):
+                purged += 1
+        return purged
+
+    def archive_cold_messages(self):
+        cutoff = datetime.utcnow() - timedelta(days=self.archive_after_days)
+        archived = 0
+        for store in self.db.message_stores.values():
+            for _ in range(self.max_sessions):
+                session_id = store.oldest_cold_session(cutoff)
+                if session_id is None:
+                    break
+                archived += self.db.archive.archive_session(store, session_id, cutoff)
+        return archived
+
+    def run(self):
+        started = datetime.utcnow()
+        purged = self.purge_deleted_sessions()
+        archived = self.archive_cold_messages()
+        self.last_run = {
+            "at": started.isoformat(),
+            "sessions_purged": purged,
+            "messages_archived": archived,
+            "seconds": round((datetime.utcnow() - started).total_seconds(), 3)
+        }
+        if purged or archived:
+            print(f"✅ Lifecycle: {purged} sessions queued for purge, {archived} messages archived")
+
+    def run_if_leader(self):
+        if self.leases.try_acquire("lifecycle", self.interval):
+            self.run()
+
+    def stats(self):
+        return {
+            "last_run": self.last_run,
+            "archive": self.db.archive.stats()
+        }
@@ -0,0 +1,403 @@
+from bson import ObjectId, encode
+import os
+
+LAYOUTS = ("documents", "buckets")
+
+
+def _ordered(messages):
+    """Sorted by time; a message copied twice during a migration shows once"""
+    unique = {message["_id"]: message for message in messages}
+    return sorted(unique.values(), key=lambda message: (message["timestamp"], message["_id"]))
+
+
+def _key_filter(key, older):
+    """Query for messages before (``older``) or after a (timestamp, _id) key"""
+    op = "$lt" if older else "$gt"
+    return {"$or": [
+        {"timestamp": {op: key[0]}},
+        {"timestamp": key[0], "_id": {op: key[1]}}
+    ]}
+
+
+def past_key(message, key, older):
+    position = (message["timestamp"], message["_id"])
+    return position < key if older else position > key
+
+
+class DocumentMessageStore:
+    """One document per message in ``messages`` (the original layout)"""
+
+    layout = "documents"
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db.messages
+
+    def create_indexes(self):
+        # _id breaks timestamp ties so transcript pages can seek on (timestamp, _id)
+        self.db.messages.create_index([("chat_session_id", 1), ("timestamp", 1), ("_id", 1)])
+        # Finds the oldest hot message; bounded because old messages get archived
+        self.db.messages.create_index("timestamp")
+
+    def insert(self, message):
+        return self.db.messages.insert_one(message).inserted_id
+
+    def load(self, session_id, messages):
+        """Bulk-write existing messages (which carry their ``_id``)"""
+        if messages:
+            self.db.messages.insert_many(messages, ordered=False)
+
+    def oldest(self, session_id, limit=None):
+        cursor = self.db.messages.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("timestamp", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def newest(self, session_id, limit):
+        """Last ``limit`` messages, oldest first"""
+        if limit <= 0:
+            return []
+        return list(self.db.messages.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("timestamp", -1).limit(limit))[::-1]
+
+    def iterate(self, session_id, batch_size, window=None):
+        """Stream a session's messages in order from a cursor"""
+        query = {"chat_session_id": ObjectId(session_id)}
+        if window:
+            query["timestamp"] = window
+        return self.db.messages.find(query).sort("timestamp", 1).batch_size(batch_size)
+
+    def since(self, session_id, after, limit):
+        """Messages newer than ``after``, oldest first"""
+        return list(self.db.messages.find(
+            {"chat_session_id": ObjectId(session_id), "timestamp": {"$gt": after}}
+        ).sort("timestamp", 1).limit(limit))
+
+    def window(self, session_id, limit, before=None, after=None, projection=None):
+        """Up to ``limit`` messages next to a (timestamp, _id) key, oldest first.
+
+        ``after`` gives the messages right after the key; otherwise the
+        newest ones, before ``before`` when it is set.
+        """
+        older = after is None
+        query = {"chat_session_id": ObjectId(session_id)}
+        key = before if older else after
+        if key is not None:
+            query.update(_key_filter(key, older))
+        direction = -1 if older else 1
+        messages = list(self.db.messages.find(query, projection).sort(
+            [("timestamp", direction), ("_id", direction)]
+        ).limit(limit))
+        return messages[::-1] if older else messages
+
+    def find(self, session_id, message_ids):
+        return list(self.db.messages.find(
+            {"_id": {"$in": list(message_ids)}, "chat_session_id": ObjectId(session_id)}
+        ))
+
+    def count(self, session_ids):
+        return self.db.messages.count_documents({"chat_session_id": {"$in": list(session_ids)}})
+
+    def session_totals(self, session_ids):
+        """Message count and newest timestamp per session"""
+        rows = self.db.messages.aggregate([
+            {"$match": {"chat_session_id": {"$in": list(session_ids)}}},
+            {"$group": {"_id": "$chat_session_id", "count": {"$sum": 1}, "last": {"$max": "$timestamp"}}}
+        ])
+        return {row["_id"]: row for row in rows}
+
+    def after(self, message_id, limit):
+        """Messages of any session with ``_id`` greater than ``message_id``"""
+        return list(self.db.messages.find({"_id": {"$gt": message_id}}).sort("_id", 1).limit(limit))
+
+    def session_senders(self, session_id):
+        """Message counts per sender type of one session"""
+        pipeline = [
+            {"$match": {"chat_session_id": ObjectId(session_id)}},
+            {"$group": {"_id": "$sender_type", "count": {"$sum": 1}}}
+        ]
+        return {row["_id"]: row["count"] for row in self.db.messages.aggregate(pipeline) if row["_id"]}
+
+    def sender_counts(self, window=None):
+        match = {"timestamp": window} if window else {}
+        pipeline = [{"$match": match}, {"$group": {"_id": "$sender_type", "count": {"$sum": 1}}}]
+        return {row["_id"]: row["count"] for row in self.db.messages.aggregate(pipeline) if row["_id"]}
+
+    def delete_batch(self, session_id, limit):
+        """Delete up to ``limit`` messages of a session; returns how many went"""
+        batch = [m["_id"] for m in self.db.messages.find(
+            {"chat_session_id": ObjectId(session_id)}, {"_id": 1}
+        ).limit(limit)]
+        if not batch:
+            return 0
+        return self.db.messages.delete_many({"_id": {"$in": batch}}).deleted_count
+
+    def oldest_cold_session(self, cutoff):
+        oldest = self.db.messages.find_one(
+            {"timestamp": {"$lt": cutoff}},
+            {"chat_session_id": 1},
+            sort=[("timestamp", 1)]
+        )
+        return oldest["chat_session_id"] if oldest else None
+
+    def cold_batch(self, session_id, cutoff, limit):
+        return list(self.db.messages.find(
+            {"chat_session_id": ObjectId(session_id), "timestamp": {"$lt": cutoff}}
+        ).sort("timestamp", 1).limit(limit))
+
+    def remove(self, session_id, messages):
+        self.db.messages.delete_many({"_id": {"$in": [m["_id"] for m in messages]}})
+
+
+class BucketMessageStore:
+    """Messages packed into per-session bucket documents in ``message_buckets``.
+
+    A bucket holds up to ``bucket_size`` messages or ``bucket_bytes`` of
+    BSON. Appending is one upsert that pushes into any bucket of the session
+    with room left, or starts a new one, so a conversation costs one index
+    entry per bucket instead of one per message. Buckets are not strictly
+    ordered among themselves, so reads merge by timestamp and stop only once
+    no further bucket can hold a message inside the requested range.
+    """
+
+    layout = "buckets"
+
+    def __init__(self, db):
+        self.db = db
+        self.bucket_size = int(os.getenv('MESSAGE_BUCKET_SIZE', 100))
+        self.bucket_bytes = int(os.getenv('MESSAGE_BUCKET_BYTES', 256 * 1024))
+
+    @property
+    def collection(self):
+        return self.db.message_buckets
+
+    def create_indexes(self):
+        self.db.message_buckets.create_index([("chat_session_id", 1), ("first_timestamp", 1)])
+        self.db.message_buckets.create_index([("chat_session_id", 1), ("last_timestamp", -1)])
+        # Admin feed polling and cold-history lookups across all sessions
+        self.db.message_buckets.create_index("last_id")
+        self.db.message_buckets.create_index("last_timestamp")
+
+    def insert(self, message):
+        message.setdefault("_id", ObjectId())
+        size = len(encode(message))
+        self.db.message_buckets.update_one(
+            {
+                "chat_session_id": message["chat_session_id"],
+                "count": {"$lt": self.bucket_size},
+                "bytes": {"$lte": self.bucket_bytes - size}
+            },
+            {
+                "$push": {"messages": message},
+                "$inc": {"count": 1, "bytes": size},
+                "$min": {"first_timestamp": message["timestamp"]},
+                "$max": {"last_timestamp": message["timestamp"], "last_id": message["_id"]}
+            },
+            upsert=True
+        )
+        return message["_id"]
+
+    def load(self, session_id, messages):
+        """Bulk-write existing messages as full buckets"""
+        buckets, current, size = [], [], 0
+        for message in _ordered(messages):
+            message_size = len(encode(message))
+            if current and (len(current) >= self.bucket_size or size + message_size > self.bucket_bytes):
+                buckets.append(self._bucket(session_id, current, size))
+                current, size = [], 0
+            current.append(message)
+            size += message_size
+        if current:
+            buckets.append(self._bucket(session_id, current, size))
+        if buckets:
+            self.db.message_buckets.insert_many(buckets, ordered=False)
+
+    @staticmethod
+    def _bucket(session_id, messages, size):
+        return {
+            "chat_session_id": ObjectId(session_id),
+            "count": len(messages),
+            "bytes": size,
+            "first_timestamp": messages[0]["timestamp"],
+            "last_timestamp": messages[-1]["timestamp"],
+            "last_id": max(message["_id"] for message in messages),
+            "messages": messages
+        }
+
+    def _collect(self, buckets, limit, newest):
+        """Merge buckets until the next one can no longer change the result"""
+        messages = []
+        edge_field = "last_timestamp" if newest else "first_timestamp"
+        for bucket in buckets:
+            if limit is not None and len(messages) >= limit:
+                edge = messages[-limit]["timestamp"] if newest else messages[limit - 1]["timestamp"]
+                if (bucket[edge_field] < edge) if newest else (bucket[edge_field] > edge):
+                    break
+            messages = _ordered(messages + bucket["messages"])
+        if limit is None:
+            return messages
+        return messages[-limit:] if newest else messages[:limit]
+
+    def oldest(self, session_id, limit=None):
+        buckets = self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("first_timestamp", 1)
+        return self._collect(buckets, limit, newest=False)
+
+    def newest(self, session_id, limit):
+        if limit <= 0:
+            return []
+        buckets = self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("last_timestamp", -1)
+        return self._collect(buckets, limit, newest=True)
+
+    def iterate(self, session_id, batch_size, window=None):
+        """Stream a session's messages bucket by bucket"""
+        buckets = self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id)}
+        ).sort("first_timestamp", 1).batch_size(max(1, batch_size // self.bucket_size))
+        for bucket in buckets:
+            for message in _ordered(bucket["messages"]):
+                if window is None or window["$gte"] <= message["timestamp"] < window["$lt"]:
+                    yield message
+
+    def since(self, session_id, after, limit):
+        # Only the last few buckets can hold anything newer
+        buckets = self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id), "last_timestamp": {"$gt": after}}
+        )
+        messages = [message for bucket in buckets for message in bucket["messages"] if message["timestamp"] > after]
+        return _ordered(messages)[:limit]
+
+    def window(self, session_id, limit, before=None, after=None, projection=None):
+        # Whole buckets are read either way, so ``projection`` does not apply
+        older = after is None
+        key = before if older else after
+        query = {"chat_session_id": ObjectId(session_id)}
+        if key is not None:
+            if older:
+                query["first_timestamp"] = {"$lte": key[0]}
+            else:
+                query["last_timestamp"] = {"$gte": key[0]}
+        buckets = self.db.message_buckets.find(query).sort(
+            "last_timestamp" if older else "first_timestamp", -1 if older else 1
+        )
+        if key is not None:
+            buckets = (
+                dict(bucket, messages=[m for m in bucket["messages"] if past_key(m, key, older)])
+                for bucket in buckets
+            )
+        return self._collect(buckets, limit, newest=older)
+
+    def find(self, session_id, message_ids):
+        return list(self.db.message_buckets.aggregate([
+            {"$match": {"chat_session_id": ObjectId(session_id), "messages._id": {"$in": list(message_ids)}}},
+            {"$unwind": "$messages"},
+            {"$match": {"messages._id": {"$in": list(message_ids)}}},
+            {"$replaceRoot": {"newRoot": "$messages"}}
+        ]))
+
+    def count(self, session_ids):
+        rows = list(self.db.message_buckets.aggregate([
+            {"$match": {"chat_session_id": {"$in": list(session_ids)}}},
+            {"$group": {"_id": None, "count": {"$sum": "$count"}}}
+        ]))
+        return rows[0]["count"] if rows else 0
+
+    def session_totals(self, session_ids):
+        rows = self.db.message_buckets.aggregate([
+            {"$match": {"chat_session_id": {"$in": list(session_ids)}}},
+            {"$group": {"_id": "$chat_session_id", "count": {"$sum": "$count"}, "last": {"$max": "$last_timestamp"}}}
+        ])
+        return {row["_id"]: row for row in rows}
+
+    def after(self, message_id, limit):
+        # Only buckets written since the watermark qualify: about one per active session
+        return list(self.db.message_buckets.aggregate([
+            {"$match": {"last_id": {"$gt": message_id}}},
+            {"$unwind": "$messages"},
+            {"$match": {"messages._id": {"$gt": message_id}}},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit}
+        ]))
+
+    def session_senders(self, session_id):
+        pipeline = [
+            {"$match": {"chat_session_id": ObjectId(session_id)}},
+            {"$unwind": "$messages"},
+            {"$group": {"_id": "$messages.sender_type", "count": {"$sum": 1}}}
+        ]
+        return {row["_id"]: row["count"] for row in self.db.message_buckets.aggregate(pipeline) if row["_id"]}
+
+    def sender_counts(self, window=None):
+        pipeline = []
+        if window:
+            # Coarse match on the bucket range, then exact on each message
+            pipeline.append({"$match": {
+                "first_timestamp": {"$lt": window["$lt"]},
+                "last_timestamp": {"$gte": window["$gte"]}
+            }})
+        pipeline.append({"$unwind": "$messages"})
+        if window:
+            pipeline.append({"$match": {"messages.timestamp": window}})
+        pipeline.append({"$group": {"_id": "$messages.sender_type", "count": {"$sum": 1}}})
+        return {row["_id"]: row["count"] for row in self.db.message_buckets.aggregate(pipeline) if row["_id"]}
+
+    def delete_batch(self, session_id, limit):
+        buckets = list(self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id)}, {"count": 1}
+        ).limit(max(1, limit // self.bucket_size)))
+        if not buckets:
+            return 0
+        self.db.message_buckets.delete_many({"_id": {"$in": [b["_id"] for b in buckets]}})
+        return sum(b["count"] for b in buckets)
+
+    def oldest_cold_session(self, cutoff):
+        oldest = self.db.message_buckets.find_one(
+            {"last_timestamp": {"$lt": cutoff}},
+            {"chat_session_id": 1},
+            sort=[("last_timestamp", 1)]
+        )
+        return oldest["chat_session_id"] if oldest else None
+
+    def cold_batch(self, session_id, cutoff, limit):
+        # Whole buckets only; ``limit`` is implied by the bucket size
+        bucket = self.db.message_buckets.find_one(
+            {"chat_session_id": ObjectId(session_id), "last_timestamp": {"$lt": cutoff}},
+            sort=[("first_timestamp", 1)]
+        )
+        return _ordered(bucket["messages"]) if bucket else []
+
+    def remove(self, session_id, messages):
+        ids = {m["_id"] for m in messages}
+        buckets = self.db.message_buckets.find(
+            {"chat_session_id": ObjectId(session_id), "messages._id": {"$in": list(ids)}},
+            {"messages._id": 1}
+        )
+        for bucket in buckets:
+            pulled = [m["_id"] for m in bucket["messages"] if m["_id"] in ids]
+            # Pull rather than delete so a message pushed meanwhile survives
+            self.db.message_buckets.update_one(
+                {"_id": bucket["_id"]},
+                {"$pull": {"messages": {"_id": {"$in": pulled}}}, "$inc": {"count": -len(pulled)}}
+            )
+        self.db.message_buckets.delete_many({"chat_session_id": ObjectId(session_id), "count": {"$lte": 0}})
+
+
+def create_message_stores(db):
+    """Both layouts, keyed by name; sessions record which one holds their messages"""
+    default = os.getenv('MESSAGE_STORAGE', 'documents')
+    if default not in LAYOUTS:
+        raise ValueError(f"Unknown MESSAGE_STORAGE: {default}")
+    return default, {
+        "documents": DocumentMessageStore(db),
+        "buckets": BucketMessageStore(db)
+    }
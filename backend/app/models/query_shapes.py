@@ -0,0 +1,146 @@
+"""Every query shape the models and routes send to Mongo, for ``index_advisor.py``.
+
+A shape is the filter, sort and limit of one query with representative
+values; the values only have to be of the right type, since the planner
+picks an index from the shape. Aggregations are listed by their leading
+``$match`` (and sort), which is the part an index can serve. Add a shape
+here whenever a new query is written, with ``source`` pointing at it.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+QueryShape = namedtuple('QueryShape', ['name', 'collection', 'kind', 'filter', 'sort', 'limit', 'source'])
+
+_shapes = []
+
+
+def register_shape(name, collection, filter, sort=None, limit=None, kind='find', source=''):
+    """Declare a query; ``kind`` is ``find`` (find, find_one, updates) or ``count``"""
+    _shapes.append(QueryShape(name, collection, kind, filter, sort or [], limit, source))
+
+
+def query_shapes(collection=None):
+    return [shape for shape in _shapes if collection is None or shape.collection == collection]
+
+
+def plan_stages(plan):
+    """Every stage dict of an explain plan, whatever its nesting"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+_id = ObjectId()
+_now = datetime.utcnow()
+_day = _now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+# ---- users -------------------------------------------------------------------
+
+register_shape('users.by_email', 'users', {'email': 'user@example.com'}, limit=1,
+               source='UserModel.get_user_by_email')
+register_shape('users.by_username', 'users', {'username': 'user'}, limit=1,
+               source='auth.register')
+register_shape('users.admin_list', 'users', {'deleted_at': {'$exists': False}}, sort=[('created_at', -1)],
+               source='admin.get_all_users')
+register_shape('users.prefix_search', 'users', {'name_keys': {'$elemMatch': {'$regex': '^us', '$gte': 'user'}}},
+               source='admin.search_users')
+register_shape('users.missing_name_keys', 'users', {'name_keys': {'$exists': False}},
+               source='Database.backfill_user_name_keys')
+register_shape('users.count_live', 'users', {'deleted_at': {'$exists': False}}, kind='count',
+               source='StatsRollupModel.reconcile')
+register_shape('users.count_new', 'users', {'created_at': {'$gte': _day, '$lt': _day + timedelta(days=1)}},
+               kind='count', source='StatsRollupModel.reconcile')
+
+# ---- chat_sessions -----------------------------------------------------------
+
+register_shape('sessions.user_list', 'chat_sessions', {'user_id': _id, 'is_active': True},
+               sort=[('updated_at', -1)], source='ChatModel.get_user_chat_sessions, ChatModel.sessions_version')
+register_shape('sessions.user_count', 'chat_sessions', {'user_id': _id, 'is_active': True}, kind='count',
+               source='admin.get_all_users')
+register_shape('sessions.user_all', 'chat_sessions', {'user_id': _id},
+               source='admin.get_all_users, DeletionJobModel')
+register_shape('sessions.changed', 'chat_sessions',
+               {'user_id': _id, 'is_active': {'$in': [True, False]}, 'updated_at': {'$gt': _day}},
+               sort=[('updated_at', 1), ('_id', 1)], limit=100, source='ChatModel.get_changed_sessions')
+register_shape('sessions.admin_recent', 'chat_sessions', {'is_active': True}, sort=[('updated_at', -1)], limit=100,
+               source='admin.get_all_sessions')
+register_shape('sessions.admin_search', 'chat_sessions',
+               {'character_id': _id, 'created_at': {'$gte': _day - timedelta(days=30), '$lt': _day}},
+               sort=[('created_at', -1), ('_id', -1)], limit=20, source='admin.search_sessions')
+register_shape('sessions.admin_search_all', 'chat_sessions', {'created_at': {'$lt': _day}},
+               sort=[('created_at', -1), ('_id', -1)], limit=20, source='admin.search_sessions')
+register_shape('sessions.purge_candidates', 'chat_sessions', {'is_active': False, 'updated_at': {'$lt': _day}},
+               limit=100, source='LifecycleManager.purge_deleted_sessions')
+register_shape('sessions.export_user', 'chat_sessions', {'user_id': _id, 'deleted_at': {'$exists': False}},
+               sort=[('created_at', 1)], source='ConversationExporter.user_records')
+register_shape('sessions.export_range', 'chat_sessions', {'created_at': {'$lt': _day}, 'updated_at': {'$gte': _day}},
+               sort=[('created_at', 1)], source='ConversationExporter.range_records')
+register_shape('sessions.feed_poll', 'chat_sessions', {'_id': {'$gt': _id}}, sort=[('_id', 1)], limit=100,
+               source='AdminChangeFeed._poll_since')
+
+# ---- messages (documents layout) ---------------------------------------------
+
+register_shape('messages.session_oldest', 'messages', {'chat_session_id': _id}, sort=[('timestamp', 1)], limit=50,
+               source='DocumentMessageStore.oldest')
+register_shape('messages.session_window', 'messages', {'chat_session_id': _id},
+               sort=[('timestamp', -1), ('_id', -1)], limit=101, source='DocumentMessageStore.window')
+register_shape('messages.session_since', 'messages', {'chat_session_id': _id, 'timestamp': {'$gt': _day}},
+               sort=[('timestamp', 1)], limit=200, source='DocumentMessageStore.since')
+register_shape('messages.session_count', 'messages', {'chat_session_id': {'$in': [_id]}}, kind='count',
+               source='DocumentMessageStore.count')
+register_shape('messages.oldest_cold', 'messages', {'timestamp': {'$lt': _day}}, sort=[('timestamp', 1)], limit=1,
+               source='DocumentMessageStore.oldest_cold_session')
+register_shape('messages.feed_after', 'messages', {'_id': {'$gt': _id}}, sort=[('_id', 1)], limit=100,
+               source='DocumentMessageStore.after')
+
+# ---- message_buckets (buckets layout) ----------------------------------------
+
+register_shape('buckets.session_oldest', 'message_buckets', {'chat_session_id': _id}, sort=[('first_timestamp', 1)],
+               source='BucketMessageStore.oldest')
+register_shape('buckets.session_newest', 'message_buckets', {'chat_session_id': _id}, sort=[('last_timestamp', -1)],
+               source='BucketMessageStore.newest, BucketMessageStore.window')
+register_shape('buckets.session_since', 'message_buckets',
+               {'chat_session_id': _id, 'last_timestamp': {'$gt': _day}}, source='BucketMessageStore.since')
+register_shape('buckets.feed_after', 'message_buckets', {'last_id': {'$gt': _id}},
+               source='BucketMessageStore.after')
+register_shape('buckets.oldest_cold', 'message_buckets', {'last_timestamp': {'$lt': _day}},
+               sort=[('last_timestamp', 1)], limit=1, source='BucketMessageStore.oldest_cold_session')
+
+# ---- messages_archive ----------------------------------------------------------
+
+register_shape('archive.session_chunks', 'messages_archive', {'chat_session_id': _id},
+               sort=[('first_timestamp', -1)], source='MessageArchiveModel.newest, MessageArchiveModel.window')
+
+# ---- message_search ------------------------------------------------------------
+
+register_shape('search.user_terms', 'message_search', {'user_id': _id, 'terms': 'halo'}, sort=[('_id', -1)], limit=40,
+               source='MessageSearchModel.search (user scope)')
+register_shape('search.all_terms', 'message_search', {'terms': 'halo'}, sort=[('_id', -1)], limit=40,
+               source='MessageSearchModel.search (admin scope)')
+register_shape('search.session', 'message_search', {'chat_session_id': _id}, limit=500,
+               source='MessageSearchModel.delete_batch')
+
+# ---- background jobs and rollups -----------------------------------------------
+
+register_shape('jobs.active_target', 'deletion_jobs', {'kind': 'user', 'target_id': _id, 'active': True}, limit=1,
+               source='DeletionJobModel._enqueue')
+register_shape('jobs.list', 'deletion_jobs', {'status': 'pending'}, sort=[('created_at', -1)], limit=50,
+               source='DeletionJobModel.list_jobs')
+register_shape('stats.daily_range', 'stats_daily', {'date': {'$gte': _day - timedelta(days=29), '$lte': _day}},
+               sort=[('date', 1)], source='StatsRollupModel.get_daily')
+register_shape('stats.active_users', 'stats_active_users', {'date': _day}, kind='count',
+               source='StatsRollupModel.reconcile')
+register_shape('usage.range', 'token_usage_daily', {'date': {'$gte': _day - timedelta(days=29), '$lt': _day}},
+               source='TokenUsageModel.report')
+register_shape('usage.user_range', 'token_usage_daily',
+               {'date': {'$gte': _day - timedelta(days=29), '$lt': _day}, 'user_id': _id},
+               source='TokenUsageModel.report')
+register_shape('reset_tokens.valid', 'reset_tokens', {'token': 'abc', 'used': False, 'expires_at': {'$gt': _now}},
+               limit=1, source='UserModel.get_reset_token')
+register_shape('characters.active', 'characters', {'is_active': True}, source='CharacterModel.get_all_characters')
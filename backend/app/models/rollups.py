@@ -0,0 +1,241 @@
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from collections import defaultdict
+from datetime import datetime, timedelta
+import threading
+import time
+import os
+from .leases import LeaseModel
+
+GLOBAL_ID = "global"
+SENDER_TYPES = ("user", "ai", "admin")
+
+
+def day_key(moment=None):
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+class StatsRollupModel:
+    """Incrementally maintained counters behind the admin statistics.
+
+    ``stats_global`` holds one document of running totals and ``stats_daily``
+    one document per UTC day. Increments are buffered in memory and flushed
+    as a single bulk write, and a lease-protected reconciler periodically
+    recomputes the totals from the source collections to correct any drift.
+
+    A reconcile stamps the documents it rewrites with ``reconciled_at``.
+    Buffered increments are kept per second they were recorded in, and a
+    flush skips those recorded before the stamp, since the recomputed
+    totals already include them - whichever worker buffered them. Events
+    written while the reconcile reads its sources can still be counted
+    twice or not at all; the next reconcile corrects that.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.flush_interval = float(os.getenv('STATS_FLUSH_SECONDS', 5))
+        self.reconcile_interval = int(os.getenv('STATS_RECONCILE_SECONDS', 3600))
+        self.reconcile_days = int(os.getenv('STATS_RECONCILE_DAYS', 2))
+        self.leases = LeaseModel(db)
+
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._active_seen = set()
+        self._lock = threading.Lock()
+
+    def create_indexes(self):
+        self.db.stats_daily.create_index("date")
+        # Activity markers only matter while their day can still be reconciled
+        self.db.stats_active_users.create_index("date", expireAfterSeconds=40 * 86400)
+
+    # ---- Incremental updates -------------------------------------------
+
+    def _add(self, increments, moment=None):
+        day = day_key(moment)
+        # When the event was recorded, compared with reconciled_at on flush
+        second = int(time.time())
+        with self._lock:
+            for field, delta in increments.get("global", {}).items():
+                self._pending[("stats_global", GLOBAL_ID, second)][field] += delta
+            for field, delta in increments.get("daily", {}).items():
+                self._pending[("stats_daily", day, second)][field] += delta
+
+    def record_user_created(self):
+        self._add({"global": {"users": 1}, "daily": {"new_users": 1}})
+
+    def record_user_deleted(self, sessions=0, messages=0):
+        self._add({"global": {"users": -1, "sessions": -sessions, "messages": -messages}})
+
+    def record_session_created(self, character_id):
+        character = str(character_id)
+        self._add({
+            "global": {"sessions": 1, f"sessions_by_character.{character}": 1},
+            "daily": {"sessions": 1, f"sessions_by_character.{character}": 1}
+        })
+
+    def record_session_closed(self, character_id=None, messages=0):
+        increments = {"sessions": -1, "messages": -messages}
+        if character_id:
+            increments[f"sessions_by_character.{character_id}"] = -1
+        self._add({"global": increments})
+
+    def record_message(self, sender_type):
+        self._add({
+            "global": {"messages": 1, f"messages_by_sender.{sender_type}": 1},
+            "daily": {"messages": 1, f"messages_by_sender.{sender_type}": 1}
+        })
+
+    def record_messages_deleted(self, count):
+        if count:
+            self._add({"global": {"messages": -count}})
+
+    def record_activity(self, user_id):
+        """Count a user once per day as active"""
+        day = day_key()
+        marker = f"{day}:{user_id}"
+        if marker in self._active_seen:
+            return
+
+        try:
+            self.db.stats_active_users.insert_one({
+                "_id": marker,
+                "date": datetime.strptime(day, "%Y-%m-%d")
+            })
+            self._add({"daily": {"active_users": 1}})
+        except DuplicateKeyError:
+            # Already counted today, possibly by another worker
+            pass
+
+        with self._lock:
+            if len(self._active_seen) > 100000:
+                self._active_seen.clear()
+            self._active_seen.add(marker)
+
+    def flush(self):
+        """Apply buffered increments as one unordered bulk write"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+
+        operations = defaultdict(list)
+        for (collection, doc_id, second), increments in pending.items():
+            increments = {field: delta for field, delta in increments.items() if delta}
+            if not increments:
+                continue
+            update = {"$inc": increments}
+            if collection == "stats_daily":
+                update["$setOnInsert"] = {"date": datetime.strptime(doc_id, "%Y-%m-%d")}
+            # No match once a reconcile after this second rewrote the document
+            query = {"_id": doc_id, "reconciled_at": {"$not": {"$gte": datetime.utcfromtimestamp(second + 1)}}}
+            operations[collection].append(UpdateOne(query, update, upsert=True))
+
+        for collection, ops in operations.items():
+            try:
+                self.db.db[collection].bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Skipped increments upsert into the existing _id; the rest were applied
+                if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+    # ---- Reads ------------------------------------------------------------
+
+    def snapshot(self):
+        """Current totals; a constant number of point reads"""
+        totals = self.db.stats_global.find_one({"_id": GLOBAL_ID})
+        if totals is None:
+            # First run on an existing database: build the rollups once
+            self.reconcile()
+            totals = self.db.stats_global.find_one({"_id": GLOBAL_ID}) or {}
+
+        today = self.db.stats_daily.find_one({"_id": day_key()}) or {}
+
+        return {
+            "total_users": totals.get("users", 0),
+            "total_sessions": totals.get("sessions", 0),
+            "total_messages": totals.get("messages", 0),
+            "active_users_today": today.get("active_users", 0),
+            "messages_by_sender": totals.get("messages_by_sender", {}),
+            "sessions_by_character": totals.get("sessions_by_character", {}),
+            "reconciled_at": totals["reconciled_at"].isoformat() if totals.get("reconciled_at") else None
+        }
+
+    def get_daily(self, start, end):
+        """Per-day buckets for ``start`` <= day <= ``end`` (datetimes at midnight UTC)"""
+        buckets = self.db.stats_daily.find(
+            {"date": {"$gte": start, "$lte": end}}
+        ).sort("date", 1)
+
+        return [{
+            "day": bucket["_id"],
+            "new_users": bucket.get("new_users", 0),
+            "active_users": bucket.get("active_users", 0),
+            "messages": bucket.get("messages", 0),
+            "messages_by_sender": bucket.get("messages_by_sender", {}),
+            "sessions": bucket.get("sessions", 0),
+            "sessions_by_character": bucket.get("sessions_by_character", {})
+        } for bucket in buckets]
+
+    # ---- Reconciliation -------------------------------------------------
+
+    def _group_counts(self, collection, match, field):
+        pipeline = [{"$match": match}, {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+        return {
+            str(row["_id"]): row["count"]
+            for row in self.db.db[collection].aggregate(pipeline)
+            if row["_id"] is not None
+        }
+
+    def _message_counts(self, window=None):
+        """Messages per sender type across every storage layout"""
+        counts = defaultdict(int)
+        for store in self.db.message_stores.values():
+            for sender, count in store.sender_counts(window).items():
+                counts[sender] += count
+        return dict(counts)
+
+    def reconcile(self):
+        """Recompute totals and the most recent daily buckets from source"""
+        # Buffered increments from before ``now`` are in the source counts;
+        # this worker's are applied first, any worker's are skipped afterwards
+        self.flush()
+        now = datetime.utcnow()
+        messages_by_sender = self._message_counts()
+        # Archived history still counts towards the totals
+        for sender, count in self.db.archive.sender_totals(SENDER_TYPES).items():
+            messages_by_sender[sender] = messages_by_sender.get(sender, 0) + count
+        sessions_by_character = self._group_counts("chat_sessions", {"is_active": True}, "character_id")
+
+        self.db.stats_global.replace_one({"_id": GLOBAL_ID}, {
+            "users": self.db.users.count_documents({"deleted_at": {"$exists": False}}),
+            "sessions": sum(sessions_by_character.values()),
+            "messages": sum(messages_by_sender.values()),
+            "messages_by_sender": messages_by_sender,
+            "sessions_by_character": sessions_by_character,
+            "reconciled_at": now
+        }, upsert=True)
+
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(self.reconcile_days):
+            start = today - timedelta(days=offset)
+            end = start + timedelta(days=1)
+            window = {"$gte": start, "$lt": end}
+            day = day_key(start)
+
+            by_sender = self._message_counts(window)
+            by_character = self._group_counts("chat_sessions", {"created_at": window}, "character_id")
+
+            self.db.stats_daily.replace_one({"_id": day}, {
+                "date": start,
+                "new_users": self.db.users.count_documents({"created_at": window}),
+                "active_users": self.db.stats_active_users.count_documents({"date": start}),
+                "messages": sum(by_sender.values()),
+                "messages_by_sender": by_sender,
+                "sessions": sum(by_character.values()),
+                "sessions_by_character": by_character,
+                "reconciled_at": now
+            }, upsert=True)
+
+        print(f"✅ Stats rollups reconciled ({self.reconcile_days} days)")
+
+    def reconcile_if_leader(self):
+        # Every worker runs this timer; the lease lets only one do the work
+        if self.leases.try_acquire("stats_reconcile", self.reconcile_interval):
+            self.reconcile()
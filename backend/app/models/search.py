@@ -0,0 +1,156 @@
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+import threading
+import os
+from ..utils.background import PeriodicWorker
+from ..utils.text_search import tokenize
+
+# Result tiers: messages containing every query term rank above the rest
+TIER_ALL, TIER_ANY = 0, 1
+
+
+class MessageSearchModel:
+    """Maintained inverted index over message content.
+
+    ``message_search`` holds one small document per message: its ``_id``
+    is the message id, ``terms`` the normalized Indonesian tokens of the
+    content, plus the owner and session context needed to scope and
+    present results. Content itself stays in the message store, so the
+    index works the same for every storage layout and for archived history.
+
+    Index entries are buffered and written in one unordered batch every
+    ``SEARCH_FLUSH_SECONDS``; ``reindex_search.py`` rebuilds them from the
+    message stores.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.flush_interval = float(os.getenv('SEARCH_FLUSH_SECONDS', 1))
+        self.worker = PeriodicWorker('search-index', self.flush_interval, self.flush, run_on_stop=True)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def create_indexes(self):
+        # Equality on scope and term, newest first: every page is an index range
+        self.db.message_search.create_index([("user_id", 1), ("terms", 1), ("_id", -1)])
+        # Admin search across all users, optionally narrowed by sender or character
+        self.db.message_search.create_index([("terms", 1), ("_id", -1)])
+        self.db.message_search.create_index([("sender_type", 1), ("terms", 1), ("_id", -1)])
+        self.db.message_search.create_index([("character_id", 1), ("terms", 1), ("_id", -1)])
+        self.db.message_search.create_index("chat_session_id")
+
+    def entry(self, message, session):
+        # The session's character, so user messages are found by character too
+        return {
+            "_id": message["_id"],
+            "user_id": session["user_id"],
+            "chat_session_id": message["chat_session_id"],
+            "character_id": session.get("character_id"),
+            "sender_type": message["sender_type"],
+            "timestamp": message["timestamp"],
+            "terms": tokenize(message["content"])
+        }
+
+    def index_message(self, message, session):
+        entry = self.entry(message, session)
+        if not entry["terms"]:
+            return
+        with self._lock:
+            self._pending.append(entry)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        self.write(pending)
+
+    def write(self, entries):
+        if not entries:
+            return
+        try:
+            self.db.message_search.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            # Already indexed (e.g. by a reindex run); anything else is real
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    def delete_batch(self, session_id, limit):
+        batch = [entry["_id"] for entry in self.db.message_search.find(
+            {"chat_session_id": ObjectId(session_id)}, {"_id": 1}
+        ).limit(limit)]
+        if not batch:
+            return 0
+        return self.db.message_search.delete_many({"_id": {"$in": batch}}).deleted_count
+
+    @staticmethod
+    def encode_cursor(tier, message_id):
+        return f"{tier}.{message_id}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        tier, _, message_id = (cursor or '').partition('.')
+        if tier not in (str(TIER_ALL), str(TIER_ANY)) or not ObjectId.is_valid(message_id):
+            raise ValueError(f"Invalid search cursor: {cursor}")
+        return int(tier), ObjectId(message_id)
+
+    def _tier_query(self, terms, tier, scope):
+        query = dict(scope)
+        if len(terms) == 1:
+            query["terms"] = terms[0]
+        elif tier == TIER_ALL:
+            query["terms"] = {"$all": terms}
+        else:
+            query["terms"] = {"$in": terms}
+            query["$nor"] = [{"terms": {"$all": terms}}]
+        return query
+
+    def search(self, terms, scope, limit=20, cursor=None, keep=None, since=None, until=None):
+        """One page of index entries, best tier first and newest first within a tier.
+
+        ``scope`` holds equality filters (``user_id``, ``sender_type`` or
+        ``character_id``), each led by one of the indexes. ``since`` and
+        ``until`` bound the message time through the ObjectId ``_id``, which
+        those same indexes order by. ``keep`` filters entries after the
+        index lookup (e.g. to drop deleted sessions); pages are refilled
+        until full or the results run out. Returns ``(entries, next_cursor)``.
+        """
+        tier, before = self.decode_cursor(cursor) if cursor else (TIER_ALL, None)
+        tiers = [TIER_ALL] if len(terms) == 1 else [TIER_ALL, TIER_ANY]
+        lower = ObjectId.from_datetime(since) if since else None
+        upper = ObjectId.from_datetime(until) if until else None
+
+        results = []
+        for current in tiers:
+            if current < tier:
+                continue
+            if current > tier:
+                before = None
+            while len(results) < limit:
+                query = self._tier_query(terms, current, scope)
+                bounds = {}
+                if lower is not None:
+                    bounds["$gte"] = lower
+                if before is not None or upper is not None:
+                    bounds["$lt"] = min(b for b in (before, upper) if b is not None)
+                if bounds:
+                    query["_id"] = bounds
+                batch = list(self.db.message_search.find(query).sort("_id", -1).limit(limit * 2))
+                if not batch:
+                    break
+                before = batch[-1]["_id"]
+                for entry in batch:
+                    if keep is None or keep(entry):
+                        entry["tier"] = current
+                        results.append(entry)
+                        if len(results) == limit:
+                            before = entry["_id"]
+                            break
+                if len(batch) < limit * 2:
+                    break
+            if len(results) == limit:
+                return results, self.encode_cursor(current, before)
+        return results, None
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending}
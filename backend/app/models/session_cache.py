@@ -0,0 +1,146 @@
+from collections import OrderedDict, deque, namedtuple
+import threading
+import time
+import os
+
+# Rough per-message overhead of the dict, ObjectIds and datetime on top of the text
+MESSAGE_OVERHEAD_BYTES = 240
+
+
+def _message_size(message):
+    return len(message.get('content', '').encode('utf-8')) + MESSAGE_OVERHEAD_BYTES
+
+
+# Snapshot handed to callers, safe to iterate while other threads append
+CachedTail = namedtuple('CachedTail', ['messages', 'complete'])
+
+
+class SessionTail:
+    """The most recent messages of one chat session, oldest first"""
+
+    def __init__(self, messages, complete, version, capacity):
+        self.messages = deque(messages, maxlen=capacity)
+        # True when the tail holds the whole history of the session
+        self.complete = complete
+        # Value of the session's message_count this tail corresponds to
+        self.version = version
+        self.size = sum(_message_size(m) for m in self.messages)
+        self.last_access = time.monotonic()
+
+
+class SessionTailCache:
+    """Per-worker LRU cache of the message tails of active chat sessions.
+
+    Entries are validated against the session's ``message_count``, which every
+    write increments, so a tail changed by another worker is reloaded instead
+    of served stale. Memory is capped by an estimated byte budget and entries
+    idle longer than the TTL are dropped.
+    """
+
+    def __init__(self, tail_size=None, max_bytes=None, idle_seconds=None):
+        self.tail_size = tail_size or int(os.getenv('SESSION_CACHE_TAIL', 50))
+        self.max_bytes = max_bytes or int(os.getenv('SESSION_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        self.idle_seconds = idle_seconds or int(os.getenv('SESSION_CACHE_IDLE_SECONDS', 900))
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def _check_process(self):
+        # A cache inherited through fork belongs to the parent; start empty
+        if self._pid != os.getpid():
+            self._entries.clear()
+            self._bytes = 0
+            self._pid = os.getpid()
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self):
+        now = time.monotonic()
+        # Oldest entries sit at the front, so expiry can stop at the first live one
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access > self.idle_seconds:
+                self._drop(session_id)
+                self._counters['expirations'] += 1
+            elif self._bytes > self.max_bytes:
+                self._drop(session_id)
+                self._counters['evictions'] += 1
+            else:
+                break
+
+    def get(self, session_id, version):
+        """Return a snapshot of the cached tail if it matches ``version``, else None"""
+        session_id = str(session_id)
+        with self._lock:
+            self._check_process()
+            entry = self._entries.get(session_id)
+
+            if entry is not None and (
+                entry.version != (version or 0)
+                or time.monotonic() - entry.last_access > self.idle_seconds
+            ):
+                self._drop(session_id)
+                entry = None
+
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(session_id)
+            self._counters['hits'] += 1
+            return CachedTail(list(entry.messages), entry.complete)
+
+    def load(self, session_id, messages, complete, version):
+        """Store a tail read from the database (messages oldest first)"""
+        session_id = str(session_id)
+        entry = SessionTail(messages[-self.tail_size:], complete, version or 0, self.tail_size)
+        with self._lock:
+            self._check_process()
+            self._drop(session_id)
+            self._entries[session_id] = entry
+            self._bytes += entry.size
+            self._evict()
+            return CachedTail(list(entry.messages), entry.complete)
+
+    def append(self, session_id, message):
+        """Write-through for a message just inserted into the session"""
+        session_id = str(session_id)
+        with self._lock:
+            self._check_process()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+
+            if len(entry.messages) == entry.messages.maxlen:
+                entry.size -= _message_size(entry.messages[0])
+                self._bytes -= _message_size(entry.messages[0])
+                entry.complete = False
+
+            entry.messages.append(message)
+            entry.size += _message_size(message)
+            entry.version += 1
+            self._bytes += _message_size(message)
+            self._entries.move_to_end(session_id)
+            self._evict()
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._drop(str(session_id))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'tail_size': self.tail_size,
+                **self._counters
+            }
@@ -0,0 +1,299 @@
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+from collections import deque
+from datetime import datetime
+import threading
+import json
+import time
+import os
+from .query_shapes import plan_stages
+from ..utils.background import PeriodicWorker
+
+# Commands whose first statement carries the filter, and where it sits
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'update': ('updates', 'q'),
+    'delete': ('deletes', 'q')
+}
+# Commands that can be explained again to learn how many documents they examine
+EXPLAINABLE = ('find', 'count', 'distinct', 'aggregate')
+# Driver and session fields that explain rejects or that are not part of the query
+DRIVER_FIELDS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+
+
+def redact(value):
+    """Keys and operators of a filter, with every value replaced by '?'"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Arrays of conditions ($or, $and) keep their shape; value lists collapse
+        if value and all(isinstance(item, dict) for item in value):
+            return [redact(item) for item in value]
+        return ['?'] if value else []
+    return '?'
+
+
+def command_filter(command_name, command):
+    """The filter a command applies (the first $match for pipelines), unredacted"""
+    if command_name == 'aggregate':
+        first = (command.get('pipeline') or [{}])[0]
+        return first.get('$match')
+    field = FILTER_FIELDS.get(command_name)
+    if isinstance(field, tuple):
+        statements = command.get(field[0]) or [{}]
+        return statements[0].get(field[1])
+    return command.get(field) if field else None
+
+
+def request_context():
+    """Where a command came from when no web request is around"""
+    return {'route': f"thread:{threading.current_thread().name}", 'request_id': None}
+
+
+class SlowCommandListener(monitoring.CommandListener):
+    """Hands commands slower than the threshold to ``SlowOpLog``.
+
+    ``started`` runs on the thread that issued the command, so it is where
+    the Flask route and request id are captured; fast commands only cost a
+    dict insert and pop.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if self.log.threshold_ms <= 0 or self.log.is_quiet():
+            return
+        with self._lock:
+            if len(self._pending) > 10000:
+                # Events lost by a dropped connection; start over
+                self._pending.clear()
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command, event.database_name, self.log.context()
+            )
+
+    def succeeded(self, event):
+        with self._lock:
+            started = self._pending.pop((event.connection_id, event.request_id), None)
+        if started is not None and event.duration_micros >= self.log.threshold_ms * 1000:
+            self.log.record(event.command_name, event.duration_micros, started, reply=event.reply)
+
+    def failed(self, event):
+        with self._lock:
+            started = self._pending.pop((event.connection_id, event.request_id), None)
+        if started is not None and event.duration_micros >= self.log.threshold_ms * 1000:
+            self.log.record(event.command_name, event.duration_micros, started, failure=event.failure)
+
+
+class SlowOpLog:
+    """Mongo operations slower than ``SLOW_OP_THRESHOLD_MS``, with their origin.
+
+    Each record holds the command, collection, filter shape (values
+    redacted), duration, and the route and request id that issued it.
+    Records are buffered and written by a background worker to the capped
+    ``slow_ops`` collection (``SLOW_OP_SINK=collection``) or printed
+    (``SLOW_OP_SINK=log``). Command replies do not say how many documents
+    were examined, so the worker explains a slow query shape again with
+    ``executionStats`` - at most ``SLOW_OP_EXPLAINS_PER_MINUTE`` times a
+    minute, and once per shape every ``SLOW_OP_EXPLAIN_TTL_SECONDS`` - and
+    attaches the result to every record of that shape.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.threshold_ms = float(os.getenv('SLOW_OP_THRESHOLD_MS', 100))
+        self.sink = os.getenv('SLOW_OP_SINK', 'collection')
+        self.capped_bytes = int(os.getenv('SLOW_OP_CAPPED_BYTES', 16 * 1024 * 1024))
+        self.explains_per_minute = int(os.getenv('SLOW_OP_EXPLAINS_PER_MINUTE', 6))
+        self.explain_ttl = float(os.getenv('SLOW_OP_EXPLAIN_TTL_SECONDS', 600))
+        self.max_buffer = int(os.getenv('SLOW_OP_BUFFER', 1000))
+        # Replaced by the app with one that reads the current Flask request
+        self.context = request_context
+        self.listener = SlowCommandListener(self)
+        self.worker = PeriodicWorker('slow-ops', float(os.getenv('SLOW_OP_FLUSH_SECONDS', 2)), self.flush,
+                                     run_on_stop=True)
+
+        self._buffer = deque()
+        self._explained = {}
+        self._explain_times = deque()
+        self._quiet = threading.local()
+        self._lock = threading.Lock()
+        # One flush at a time, so the explain budget and cache have one user
+        self._flush_lock = threading.Lock()
+        self._counters = {"recorded": 0, "dropped": 0, "explained": 0, "explain_failures": 0}
+
+    def create_indexes(self):
+        if self.sink != 'collection':
+            return
+        try:
+            self.db.db.create_collection('slow_ops', capped=True, size=self.capped_bytes)
+        except CollectionInvalid:
+            # Already exists
+            pass
+
+    def is_quiet(self):
+        """True on the thread writing slow ops, whose own commands are not recorded"""
+        return getattr(self._quiet, 'active', False)
+
+    def record(self, command_name, duration_micros, started, reply=None, failure=None):
+        command, database, context = started
+        name = command.get(command_name)
+        collection = name if isinstance(name, str) else command.get('collection')
+        raw_filter = command_filter(command_name, command)
+
+        record = {
+            "at": datetime.utcnow(),
+            "command": command_name,
+            "database": database,
+            "collection": collection,
+            # As JSON text: filters hold dotted and $-prefixed keys
+            "filter": json.dumps(redact(raw_filter)) if raw_filter is not None else None,
+            "duration_ms": round(duration_micros / 1000, 3),
+            "route": context.get('route'),
+            "request_id": context.get('request_id'),
+            "ok": failure is None
+        }
+        if command_name == 'find' and command.get('sort'):
+            record["sort"] = json.dumps(dict(command['sort']))
+        if command_name == 'aggregate':
+            record["pipeline"] = [next(iter(stage), '?') for stage in command.get('pipeline', [])]
+        if reply:
+            batch = (reply.get('cursor') or {}).get('firstBatch')
+            returned = len(batch) if batch is not None else reply.get('n')
+            if returned is not None:
+                record["returned"] = returned
+
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._counters["dropped"] += 1
+                return
+            # The raw command stays in memory only until it is explained
+            self._buffer.append((record, command if command_name in EXPLAINABLE and failure is None else None))
+            self._counters["recorded"] += 1
+
+    # ---- Writing ---------------------------------------------------------------
+
+    def _shape_key(self, record):
+        return (record["collection"], record["command"], record["filter"], record.get("sort"))
+
+    def _explain(self, record, command):
+        """Docs examined and plan of a slow shape, explained at most once per TTL"""
+        key = self._shape_key(record)
+        now = time.monotonic()
+        cached = self._explained.get(key)
+        if cached is not None and now - cached[0] < self.explain_ttl:
+            return cached[1]
+        if command is None:
+            return None
+        while self._explain_times and now - self._explain_times[0] > 60:
+            self._explain_times.popleft()
+        if len(self._explain_times) >= self.explains_per_minute:
+            return None
+        self._explain_times.append(now)
+
+        query = {field: value for field, value in command.items()
+                 if not field.startswith('$') and field not in DRIVER_FIELDS}
+        try:
+            explained = self.db.client[record["database"]].command('explain', query, verbosity='executionStats')
+        except Exception as e:
+            self._counters["explain_failures"] += 1
+            print(f"⚠️ Could not explain slow {record['command']} on {record['collection']}: {e}")
+            return None
+        self._counters["explained"] += 1
+
+        # The plan that ran; rejected plans would report stages that never did
+        stages = [stage['stage'] for stage in plan_stages(self._find(explained, 'winningPlan') or {})]
+        plan = {"docs_examined": self._find(explained, 'totalDocsExamined'),
+                "keys_examined": self._find(explained, 'totalKeysExamined'),
+                "plan": stages}
+        if len(self._explained) > 1000:
+            self._explained.clear()
+        self._explained[key] = (now, plan)
+        return plan
+
+    @classmethod
+    def _find(cls, document, field):
+        """First value of ``field`` anywhere in an explain document"""
+        if isinstance(document, dict):
+            if field in document:
+                return document[field]
+            values = document.values()
+        elif isinstance(document, list):
+            values = document
+        else:
+            return None
+        for value in values:
+            found = cls._find(value, field)
+            if found is not None:
+                return found
+        return None
+
+    def flush(self):
+        """Explain and write buffered records; runs on the worker (and at shutdown)
+        since explains are too slow for a request thread"""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            buffered, self._buffer = self._buffer, deque()
+        if not buffered:
+            return
+
+        self._quiet.active = True
+        try:
+            records = []
+            for record, command in buffered:
+                plan = self._explain(record, command)
+                if plan:
+                    record.update(plan)
+                records.append(record)
+
+            if self.sink == 'log':
+                for record in records:
+                    print(f"🐢 Slow {record['command']} on {record['collection']} {record['duration_ms']}ms "
+                          f"from {record['route']} [{record['request_id']}] filter={record['filter']}")
+            else:
+                self.db.slow_ops.insert_many(records, ordered=False)
+        finally:
+            self._quiet.active = False
+
+    # ---- Reading ---------------------------------------------------------------
+
+    def recent(self, limit=100, route=None, collection=None, since=None):
+        """Newest slow ops first, from the capped collection"""
+        query = {}
+        if route:
+            query["route"] = route
+        if collection:
+            query["collection"] = collection
+        if since:
+            query["at"] = {"$gte": since}
+        return list(self.db.slow_ops.find(query).sort("$natural", -1).limit(limit))
+
+    @staticmethod
+    def summarize(records):
+        """Count, total and worst duration per route, slowest total first"""
+        routes = {}
+        for record in records:
+            summary = routes.setdefault(record.get("route"), {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            summary["count"] += 1
+            summary["total_ms"] += record["duration_ms"]
+            summary["max_ms"] = max(summary["max_ms"], record["duration_ms"])
+        return sorted(
+            ({"route": route, **summary, "total_ms": round(summary["total_ms"], 3)} for route, summary in routes.items()),
+            key=lambda summary: summary["total_ms"],
+            reverse=True
+        )
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._counters, buffered=len(self._buffer))
+        snapshot["threshold_ms"] = self.threshold_ms
+        snapshot["sink"] = self.sink
+        return snapshot
@@ -0,0 +1,98 @@
+from pymongo import UpdateOne
+from collections import defaultdict
+import threading
+import time
+import os
+from ..utils.background import PeriodicWorker
+
+
+class TouchCoalescer:
+    """Write-behind for touch updates such as ``users.last_login``.
+
+    A touch only records when something last happened, so nothing reads it
+    back on the request path. Touches are merged per document in memory
+    (timestamps keep the newest value through ``$max``, other fields the
+    last one written) and sent as one unordered ``bulk_write`` per
+    collection every ``TOUCH_FLUSH_MS``, and on shutdown. A touch reaches
+    Mongo within ``TOUCH_MAX_STALENESS_MS``: once the oldest pending touch
+    is that old, or ``TOUCH_MAX_PENDING`` documents are waiting, the next
+    touch flushes right away instead of waiting for the worker.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.flush_interval = float(os.getenv('TOUCH_FLUSH_MS', 250)) / 1000
+        self.max_staleness = max(float(os.getenv('TOUCH_MAX_STALENESS_MS', 1000)) / 1000, self.flush_interval)
+        self.max_pending = int(os.getenv('TOUCH_MAX_PENDING', 5000))
+        self.worker = PeriodicWorker('touches', self.flush_interval, self.flush, run_on_stop=True)
+
+        # (collection, _id) -> {"$max": {...}, "$set": {...}}
+        self._pending = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {"touches": 0, "writes": 0, "flushes": 0, "failed_flushes": 0}
+
+    def touch(self, collection, document_id, latest=None, values=None):
+        """Queue ``$max`` of the ``latest`` fields and ``$set`` of ``values`` on one document"""
+        overdue = False
+        with self._lock:
+            update = self._pending.setdefault((collection, document_id), {"$max": {}, "$set": {}})
+            for field, value in (latest or {}).items():
+                current = update["$max"].get(field)
+                update["$max"][field] = value if current is None else max(current, value)
+            update["$set"].update(values or {})
+            self._counters["touches"] += 1
+            now = time.monotonic()
+            if self._oldest is None:
+                self._oldest = now
+            overdue = now - self._oldest >= self.max_staleness or len(self._pending) >= self.max_pending
+        if overdue:
+            # The worker is late or not running in this process
+            try:
+                self.flush()
+            except Exception as e:
+                # Kept for the next flush; the caller's request goes on
+                print(f"⚠️ Touch flush failed: {e}")
+
+    def _merge(self, pending):
+        """Put back touches of a failed flush without overwriting newer ones"""
+        with self._lock:
+            for key, update in pending.items():
+                current = self._pending.setdefault(key, {"$max": {}, "$set": {}})
+                for field, value in update["$max"].items():
+                    current["$max"][field] = max(current["$max"].get(field, value), value)
+                for field, value in update["$set"].items():
+                    current["$set"].setdefault(field, value)
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._oldest = None
+            if not pending:
+                return
+
+            operations = defaultdict(list)
+            for (collection, document_id), update in pending.items():
+                operations[collection].append(UpdateOne(
+                    {"_id": document_id},
+                    {operator: fields for operator, fields in update.items() if fields}
+                ))
+            try:
+                for collection, batch in operations.items():
+                    self.db.db[collection].bulk_write(batch, ordered=False)
+            except Exception:
+                self._counters["failed_flushes"] += 1
+                self._merge(pending)
+                raise
+            self._counters["flushes"] += 1
+            self._counters["writes"] += len(pending)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._counters, pending=len(self._pending))
+        snapshot["coalesced"] = snapshot["touches"] - snapshot["writes"] - snapshot["pending"]
+        return snapshot
@@ -0,0 +1,168 @@
+from pymongo import UpdateOne
+from collections import defaultdict
+from datetime import datetime
+from bson import ObjectId
+import threading
+import time
+import os
+from .rollups import day_key
+from ..utils.background import PeriodicWorker
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class TokenUsageModel:
+    """LLM token counters per user and UTC day, plus daily quotas.
+
+    ``token_usage_daily`` holds one document per user and day with totals
+    and breakdowns by character and endpoint (``reply``, ``title``).
+    Usage is buffered and flushed as one bulk write every
+    ``USAGE_FLUSH_SECONDS``. Quota checks read today's total from a
+    per-process cache, refreshed every ``USAGE_CACHE_SECONDS``, plus this
+    process's unflushed usage, so they cost no query on most requests.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.flush_interval = float(os.getenv('USAGE_FLUSH_SECONDS', 5))
+        self.cache_seconds = float(os.getenv('USAGE_CACHE_SECONDS', 60))
+        # 0 disables a quota
+        self.soft_daily_tokens = int(os.getenv('USAGE_SOFT_DAILY_TOKENS', 0))
+        self.hard_daily_tokens = int(os.getenv('USAGE_HARD_DAILY_TOKENS', 0))
+        self.worker = PeriodicWorker('token-usage', self.flush_interval, self.flush, run_on_stop=True)
+
+        self._pending = defaultdict(lambda: defaultdict(int))
+        # (user_id, day) -> (loaded_at, total_tokens stored in Mongo)
+        self._totals = {}
+        # (user_id, day) -> tokens recorded here since that load
+        self._local = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def create_indexes(self):
+        self.db.token_usage_daily.create_index([("date", 1), ("total_tokens", -1)])
+        self.db.token_usage_daily.create_index([("user_id", 1), ("date", 1)])
+
+    # ---- Recording -------------------------------------------------------
+
+    def record(self, user_id, character_id, endpoint, usage):
+        """Buffer one call's ``prompt_tokens``/``completion_tokens``"""
+        if not usage:
+            return
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        counts = {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+        if not counts["total_tokens"]:
+            return
+
+        day = day_key()
+        key = (str(user_id), day)
+        with self._lock:
+            pending = self._pending[key]
+            pending["calls"] += 1
+            pending[f"by_endpoint.{endpoint}.calls"] += 1
+            if character_id:
+                pending[f"by_character.{character_id}.calls"] += 1
+            for field, value in counts.items():
+                pending[field] += value
+                pending[f"by_endpoint.{endpoint}.{field}"] += value
+                if character_id:
+                    pending[f"by_character.{character_id}.{field}"] += value
+            self._local[key] += counts["total_tokens"]
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        if not pending:
+            return
+
+        operations = []
+        for (user_id, day), increments in pending.items():
+            operations.append(UpdateOne(
+                {"_id": f"{user_id}:{day}"},
+                {
+                    "$inc": dict(increments),
+                    "$setOnInsert": {"user_id": ObjectId(user_id), "date": datetime.strptime(day, "%Y-%m-%d")}
+                },
+                upsert=True
+            ))
+        self.db.token_usage_daily.bulk_write(operations, ordered=False)
+
+    # ---- Quotas ----------------------------------------------------------
+
+    def used_today(self, user_id):
+        day = day_key()
+        key = (str(user_id), day)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._totals.get(key)
+        if cached is None or now - cached[0] >= self.cache_seconds:
+            # Flush first so the stored total includes this process's usage
+            self.flush()
+            doc = self.db.token_usage_daily.find_one({"_id": f"{user_id}:{day}"}, {"total_tokens": 1})
+            with self._lock:
+                if len(self._totals) > 100000:
+                    self._totals.clear()
+                    self._local.clear()
+                self._totals[key] = (now, (doc or {}).get("total_tokens", 0))
+                # Only usage recorded since the flush is missing from Mongo
+                self._local[key] = self._pending[key]["total_tokens"] if key in self._pending else 0
+                cached = self._totals[key]
+        with self._lock:
+            return cached[1] + self._local.get(key, 0)
+
+    def check_quota(self, user_id):
+        """``(allowed, over_soft_limit, used)`` for today's usage of ``user_id``"""
+        if not self.soft_daily_tokens and not self.hard_daily_tokens:
+            return True, False, None
+        used = self.used_today(user_id)
+        allowed = not self.hard_daily_tokens or used < self.hard_daily_tokens
+        soft = bool(self.soft_daily_tokens) and used >= self.soft_daily_tokens
+        return allowed, soft, used
+
+    # ---- Reporting -------------------------------------------------------
+
+    def report(self, start, end, user_id=None, limit=20):
+        """Totals, per-day series, top users and breakdowns for [start, end)"""
+        match = {"date": {"$gte": start, "$lt": end}}
+        if user_id:
+            match["user_id"] = ObjectId(user_id)
+
+        totals = {field: 0 for field in TOKEN_FIELDS + ("calls",)}
+        by_character = defaultdict(lambda: defaultdict(int))
+        by_endpoint = defaultdict(lambda: defaultdict(int))
+        per_day = defaultdict(lambda: defaultdict(int))
+        per_user = defaultdict(lambda: defaultdict(int))
+
+        docs = self.db.token_usage_daily.find(match).batch_size(500)
+        for doc in docs:
+            day = doc["date"].strftime("%Y-%m-%d")
+            for field in totals:
+                value = doc.get(field, 0)
+                totals[field] += value
+                per_day[day][field] += value
+                per_user[doc["user_id"]][field] += value
+            for breakdown, target in ((doc.get("by_character", {}), by_character), (doc.get("by_endpoint", {}), by_endpoint)):
+                for name, counts in breakdown.items():
+                    for field, value in counts.items():
+                        target[name][field] += value
+
+        days = [dict(per_day[day], date=day) for day in sorted(per_day)]
+        top_users = sorted(per_user.items(), key=lambda item: item[1]["total_tokens"], reverse=True)[:limit]
+        return {
+            "totals": totals,
+            "days": days,
+            "top_users": [dict(counts, user_id=str(user)) for user, counts in top_users],
+            "by_character": {name: dict(counts) for name, counts in by_character.items()},
+            "by_endpoint": {name: dict(counts) for name, counts in by_endpoint.items()}
+        }
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+            cached = len(self._totals)
+        return {
+            "pending_users": pending,
+            "cached_users": cached,
+            "soft_daily_tokens": self.soft_daily_tokens,
+            "hard_daily_tokens": self.hard_daily_tokens
+        }
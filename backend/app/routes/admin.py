@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.database import UserModel, ChatModel
+from ..models.export import ConversationExporter
+from ..utils.metrics import collect_metrics
+from ..utils.event_broker import session_channel
+from ..utils.text_search import tokenize, snippet
+from ..utils.ndjson import ndjson_response
+from ..utils.streams import stream_slots
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
+import json
+import time
+import re
+import os
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -25,10 +35,94 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+def parse_feed_filters(args):
+    """Read feed filters from query args; returns (filters, error message)"""
+    filters = {
+        'user_id': args.get('user_id'),
+        'character_id': args.get('character_id'),
+        'sender_type': args.get('sender_type')
+    }
+    if filters['sender_type'] and filters['sender_type'] not in ('user', 'ai', 'admin'):
+        return None, 'sender_type harus user, ai, atau admin'
+    return filters, None
+
+def parse_search_args(args):
+    """Common admin search arguments; raises ValueError with a user-facing message"""
+    limit = min(max(args.get('limit', 20, type=int), 1), 100)
+    try:
+        start = datetime.strptime(args['from'], '%Y-%m-%d') if args.get('from') else None
+        # ``to`` is inclusive: up to the end of that day
+        end = datetime.strptime(args['to'], '%Y-%m-%d') + timedelta(days=1) if args.get('to') else None
+    except ValueError:
+        raise ValueError('Format tanggal harus YYYY-MM-DD')
+    
+    ids = {}
+    for name in ('user_id', 'character_id'):
+        if args.get(name):
+            if not ObjectId.is_valid(args[name]):
+                raise ValueError(f'{name} tidak valid')
+            ids[name] = ObjectId(args[name])
+    return limit, start, end, ids
+
+TRANSCRIPT_FIELDS = ('sender_type', 'content', 'timestamp', 'character_id')
+
+def parse_message_cursor(cursor):
+    """(timestamp, _id) from a transcript cursor; raises ValueError with a user-facing message"""
+    if not cursor:
+        return None
+    try:
+        timestamp, _, message_id = cursor.rpartition('.')
+        return datetime.fromisoformat(timestamp), ObjectId(message_id)
+    except Exception:
+        raise ValueError('Cursor tidak valid')
+
+def message_cursor(message):
+    return f"{message['timestamp'].isoformat()}.{message['_id']}"
+
+def parse_message_fields(fields):
+    """Requested message fields (all by default); raises ValueError with a user-facing message"""
+    if not fields:
+        return TRANSCRIPT_FIELDS
+    requested = tuple(field.strip() for field in fields.split(',') if field.strip())
+    unknown = [field for field in requested if field not in TRANSCRIPT_FIELDS]
+    if unknown:
+        raise ValueError(f"Field tidak dikenal: {', '.join(unknown)} (pilih dari {', '.join(TRANSCRIPT_FIELDS)})")
+    return requested
+
+def format_transcript_message(message, fields):
+    formatted = {'id': str(message['_id'])}
+    for field in fields:
+        value = message.get(field)
+        if field == 'timestamp':
+            value = value.isoformat()
+        elif field == 'character_id':
+            value = str(value) if value else None
+        formatted[field] = value
+    return formatted
+
+def format_job(job):
+    return {
+        'id': str(job['_id']),
+        'kind': job['kind'],
+        'target_id': str(job['target_id']),
+        'status': job['status'],
+        'progress': job.get('progress', {}),
+        'attempts': job.get('attempts', 0),
+        'error': job.get('error'),
+        'created_at': job['created_at'].isoformat(),
+        'updated_at': job['updated_at'].isoformat(),
+        'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+    }
+
 def init_admin_routes(db):
     admin_bp.db = db
     user_model = UserModel(db)
     chat_model = ChatModel(db)
+    exporter = ConversationExporter(db)
+    # Transcript pages are bounded so one request cannot format a whole long session
+    transcript_page_size = int(os.getenv('ADMIN_TRANSCRIPT_PAGE_SIZE', 100))
+    transcript_max_page_size = int(os.getenv('ADMIN_TRANSCRIPT_MAX_PAGE_SIZE', 500))
+    transcript_summary_size = int(os.getenv('ADMIN_TRANSCRIPT_SUMMARY_SIZE', 20))
     
     @admin_bp.route('/check', methods=['GET'])
     @jwt_required()
@@ -54,7 +148,7 @@ def init_admin_routes(db):
     def get_all_users():
         """Get all users with their stats"""
         try:
-            users = list(db.users.find({}, {
+            users = list(db.users.find({'deleted_at': {'$exists': False}}, {
                 'password_hash': 0  # Don't send password hash
             }).sort('created_at', -1))
             
@@ -69,14 +163,11 @@ def init_admin_routes(db):
                 })
                 
                 # Count total messages
-                user_sessions = db.chat_sessions.find({
+                user_sessions = list(db.chat_sessions.find({
                     'user_id': ObjectId(user['_id'])
-                }, {'_id': 1})
+                }, {'_id': 1, 'archived_count': 1, 'storage': 1}))
                 
-                session_ids = [s['_id'] for s in user_sessions]
-                user['total_messages'] = db.messages.count_documents({
-                    'chat_session_id': {'$in': session_ids}
-                })
+                user['total_messages'] = chat_model.count_messages(user_sessions)
                 
                 # Format dates
                 user['created_at'] = user['created_at'].isoformat() if user.get('created_at') else None
@@ -110,24 +201,18 @@ def init_admin_routes(db):
                     'message': 'Tidak bisa menghapus akun sendiri'
                 }), 400
             
-            # Get user's chat sessions
-            user_sessions = db.chat_sessions.find({'user_id': ObjectId(user_id)})
-            session_ids = [s['_id'] for s in user_sessions]
+            # Hide the user now; sessions and messages are removed in
+            # batches by a background deletion job
+            job = db.deletions.enqueue_user_deletion(user_id, requested_by=current_user_id)
             
-            # Delete user's messages
-            db.messages.delete_many({'chat_session_id': {'$in': session_ids}})
-            
-            # Delete user's chat sessions
-            db.chat_sessions.delete_many({'user_id': ObjectId(user_id)})
-            
-            # Delete user
-            result = db.users.delete_one({'_id': ObjectId(user_id)})
-            
-            if result.deleted_count > 0:
+            if job:
                 return jsonify({
                     'success': True,
-                    'message': 'User berhasil dihapus'
-                }), 200
+                    'message': 'User sedang dihapus',
+                    'data': {
+                        'job': format_job(job)
+                    }
+                }), 202
             else:
                 return jsonify({
                     'success': False,
@@ -163,14 +248,11 @@ def init_admin_routes(db):
                 })
                 
                 # Get message count
-                message_count = db.messages.count_documents({
-                    'chat_session_id': session['_id']
-                })
+                message_count = chat_model.count_messages([session])
                 
                 # Get last message
-                last_message = db.messages.find_one({
-                    'chat_session_id': session['_id']
-                }, sort=[('timestamp', -1)])
+                recent = chat_model.get_recent_messages(session['_id'], limit=1)
+                last_message = recent[-1] if recent else None
                 
                 formatted_sessions.append({
                     'session_id': str(session['_id']),
@@ -206,11 +288,118 @@ def init_admin_routes(db):
                 'message': 'Error fetching sessions'
             }), 500
     
+    @admin_bp.route('/feed', methods=['GET'])
+    @admin_required
+    def get_feed():
+        """Long-poll for new messages and session changes after a cursor"""
+        try:
+            filters, error = parse_feed_filters(request.args)
+            if error:
+                return jsonify({
+                    'success': False,
+                    'message': error
+                }), 400
+            
+            limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+            timeout = min(max(request.args.get('timeout', 25, type=float), 0), 55)
+            
+            events, cursor, reset = db.change_feed.read(
+                request.args.get('cursor'), filters, limit=limit, timeout=timeout
+            )
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'events': events,
+                    'cursor': cursor,
+                    'reset': reset
+                }
+            }), 200
+        except Exception as e:
+            print(f"Get feed error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching feed'
+            }), 500
+    
+    @admin_bp.route('/feed/stream', methods=['GET'])
+    @admin_required
+    def stream_feed():
+        """Server-Sent Events version of the feed; resumes from Last-Event-ID"""
+        filters, error = parse_feed_filters(request.args)
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        # Each stream holds a worker thread; past the per-worker cap the
+        # dashboard long-polls GET /api/admin/feed instead
+        if not stream_slots.acquire():
+            response = jsonify({
+                'success': False,
+                'message': 'Terlalu banyak koneksi live, gunakan /api/admin/feed'
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+        # Bound each stream so the thread is handed back regularly;
+        # EventSource reconnects on its own and resumes via Last-Event-ID
+        lifetime = int(os.getenv('ADMIN_FEED_STREAM_SECONDS', 300))
+        
+        def generate(cursor):
+            deadline = time.monotonic() + lifetime
+            yield 'retry: 2000\n\n'
+            while time.monotonic() < deadline:
+                events, cursor, reset = db.change_feed.read(cursor, filters, limit=100, timeout=15)
+                if reset:
+                    yield f"event: reset\ndata: {json.dumps({'cursor': cursor})}\n\n"
+                for event in events:
+                    yield f"id: {event['cursor']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if not events:
+                    yield ': keep-alive\n\n'
+        
+        response = Response(generate(cursor), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # Runs even when the client leaves before the first event
+        response.call_on_close(stream_slots.release)
+        return response
+    
     @admin_bp.route('/sessions/<session_id>/messages', methods=['GET'])
     @admin_required
     def get_session_messages(session_id):
-        """Get all messages from a specific session"""
+        """Get one page of a session's transcript.
+        
+        ?limit= page size (capped at ADMIN_TRANSCRIPT_MAX_PAGE_SIZE); the
+        newest page by default, ?before=<cursor> for older messages and
+        ?after=<cursor> for newer ones. ?fields=content,sender_type,...
+        trims each message. ?summary=1 returns message counts and the last
+        ?last= messages instead. User and character details come with the
+        first page only.
+        """
         try:
+            try:
+                before = parse_message_cursor(request.args.get('before'))
+                after = parse_message_cursor(request.args.get('after'))
+                fields = parse_message_fields(request.args.get('fields'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+            if before and after:
+                return jsonify({
+                    'success': False,
+                    'message': 'Gunakan before atau after, tidak keduanya'
+                }), 400
+            summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+            size = 'last' if summary else 'limit'
+            default = transcript_summary_size if summary else transcript_page_size
+            limit = min(max(request.args.get(size, default, type=int), 1), transcript_max_page_size)
+            
             # Get session info
             session = db.chat_sessions.find_one({'_id': ObjectId(session_id)})
             if not session:
@@ -219,51 +408,68 @@ def init_admin_routes(db):
                     'message': 'Session tidak ditemukan'
                 }), 404
             
-            # Get user info
-            user = db.users.find_one({'_id': session['user_id']}, {
-                'username': 1, 'email': 1, 'full_name': 1
-            })
+            # One extra message tells whether the page continues
+            projection = dict.fromkeys(('timestamp',) + fields, 1)
+            messages = chat_model.get_messages_window(
+                session, limit + 1, before=None if summary else before, after=None if summary else after,
+                projection=projection
+            )
+            if after:
+                has_older, has_newer = True, len(messages) > limit
+                messages = messages[:limit]
+            else:
+                has_older, has_newer = len(messages) > limit, before is not None and not summary
+                messages = messages[-limit:]
             
-            # Get character info
-            character = db.characters.find_one({'_id': session['character_id']}, {
-                'name': 1, 'avatar': 1, 'personality': 1
-            })
+            data = {
+                'session': {
+                    'id': str(session['_id']),
+                    'title': session.get('title', 'Untitled Chat'),
+                    'created_at': session['created_at'].isoformat(),
+                    'updated_at': session['updated_at'].isoformat()
+                },
+                'messages': [format_transcript_message(msg, fields) for msg in messages],
+                'page': {
+                    'limit': limit,
+                    'has_older': has_older,
+                    'has_newer': has_newer,
+                    'before': message_cursor(messages[0]) if messages and has_older else None,
+                    'after': message_cursor(messages[-1]) if messages else None
+                }
+            }
+            
+            if summary:
+                senders = chat_model.get_sender_counts(session)
+                data['summary'] = {
+                    'total_messages': sum(senders.values()),
+                    'archived_messages': session.get('archived_count', 0),
+                    'by_sender': senders
+                }
             
-            # Get all messages
-            messages = list(db.messages.find({
-                'chat_session_id': ObjectId(session_id)
-            }).sort('timestamp', 1))
-            
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    'id': str(msg['_id']),
-                    'sender_type': msg['sender_type'],
-                    'content': msg['content'],
-                    'timestamp': msg['timestamp'].isoformat()
+            if summary or not (before or after):
+                # Get user info
+                user = db.users.find_one({'_id': session['user_id']}, {
+                    'username': 1, 'email': 1, 'full_name': 1
+                })
+                
+                # Get character info
+                character = db.characters.find_one({'_id': session['character_id']}, {
+                    'name': 1, 'avatar': 1
                 })
+                data['user'] = {
+                    'id': str(user['_id']) if user else None,
+                    'username': user.get('username', 'Unknown') if user else 'Unknown',
+                    'email': user.get('email', '') if user else '',
+                    'full_name': user.get('full_name', '') if user else ''
+                }
+                data['character'] = {
+                    'name': character.get('name', 'Unknown') if character else 'Unknown',
+                    'avatar': character.get('avatar', '🤖') if character else '🤖'
+                }
             
             return jsonify({
                 'success': True,
-                'data': {
-                    'session': {
-                        'id': str(session['_id']),
-                        'title': session.get('title', 'Untitled Chat'),
-                        'created_at': session['created_at'].isoformat(),
-                        'updated_at': session['updated_at'].isoformat()
-                    },
-                    'user': {
-                        'id': str(user['_id']) if user else None,
-                        'username': user.get('username', 'Unknown') if user else 'Unknown',
-                        'email': user.get('email', '') if user else '',
-                        'full_name': user.get('full_name', '') if user else ''
-                    },
-                    'character': {
-                        'name': character.get('name', 'Unknown') if character else 'Unknown',
-                        'avatar': character.get('avatar', '🤖') if character else '🤖'
-                    },
-                    'messages': formatted_messages
-                }
+                'data': data
             }), 200
         except Exception as e:
             print(f"Get session messages error: {e}")
@@ -294,29 +500,18 @@ def init_admin_routes(db):
                     'message': 'Session tidak ditemukan'
                 }), 404
             
-            # Add admin message
-            admin_message = {
-                'chat_session_id': ObjectId(session_id),
-                'sender_type': 'admin',
-                'content': message,
-                'timestamp': datetime.utcnow()
-            }
-            
-            result = db.messages.insert_one(admin_message)
-            
-            # Update session timestamp
-            db.chat_sessions.update_one(
-                {'_id': ObjectId(session_id)},
-                {'$set': {'updated_at': datetime.utcnow()}}
-            )
+            # Add admin message; goes through the chat model so the
+            # session's cached tail and counters stay in sync
+            timestamp = datetime.utcnow()
+            message_id = chat_model.add_message(session_id, 'admin', message, timestamp=timestamp, session=session)
             
             return jsonify({
                 'success': True,
                 'data': {
-                    'message_id': str(result.inserted_id),
+                    'message_id': str(message_id),
                     'sender_type': 'admin',
                     'content': message,
-                    'timestamp': admin_message['timestamp'].isoformat()
+                    'timestamp': timestamp.isoformat()
                 }
             }), 201
         except Exception as e:
@@ -331,17 +526,20 @@ def init_admin_routes(db):
     def delete_session(session_id):
         """Delete a chat session"""
         try:
-            # Delete all messages in session
-            db.messages.delete_many({'chat_session_id': ObjectId(session_id)})
-            
-            # Delete session
-            result = db.chat_sessions.delete_one({'_id': ObjectId(session_id)})
+            # Hide the session now; its messages are removed in batches
+            # by a background deletion job
+            job = db.deletions.enqueue_session_deletion(session_id, requested_by=get_jwt_identity())
             
-            if result.deleted_count > 0:
+            if job:
+                chat_model.invalidate_session(session_id)
+                db.events.publish(session_channel(session_id), {'type': 'deleted'})
                 return jsonify({
                     'success': True,
-                    'message': 'Session berhasil dihapus'
-                }), 200
+                    'message': 'Session sedang dihapus',
+                    'data': {
+                        'job': format_job(job)
+                    }
+                }), 202
             else:
                 return jsonify({
                     'success': False,
@@ -354,6 +552,319 @@ def init_admin_routes(db):
                 'message': 'Error deleting session'
             }), 500
     
+    @admin_bp.route('/jobs', methods=['GET'])
+    @admin_required
+    def get_jobs():
+        """List background deletion jobs, newest first"""
+        try:
+            status = request.args.get('status')
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+            jobs = db.deletions.list_jobs(status=status, limit=limit)
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'jobs': [format_job(job) for job in jobs]
+                }
+            }), 200
+        except Exception as e:
+            print(f"Get jobs error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching jobs'
+            }), 500
+    
+    @admin_bp.route('/jobs/<job_id>', methods=['GET'])
+    @admin_required
+    def get_job(job_id):
+        """Get the progress of a background deletion job"""
+        try:
+            job = db.deletions.get_job(job_id)
+            if not job:
+                return jsonify({
+                    'success': False,
+                    'message': 'Job tidak ditemukan'
+                }), 404
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'job': format_job(job)
+                }
+            }), 200
+        except Exception as e:
+            print(f"Get job error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching job'
+            }), 500
+    
+    @admin_bp.route('/search/users', methods=['GET'])
+    @admin_required
+    def search_users():
+        """Prefix search on username, email and full name (?q=&cursor=&limit=)"""
+        try:
+            prefix = request.args.get('q', '').strip().lower()
+            if len(prefix) < 2:
+                return jsonify({
+                    'success': False,
+                    'message': 'Kata kunci minimal 2 karakter'
+                }), 400
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+            
+            # An anchored, case-sensitive regex on the lowercased keys is an index
+            # range. The index cannot sort on the multikey name_keys, so users
+            # come back unsorted in (name_keys, _id) index order, each at its
+            # smallest key in range, and the cursor is that index position.
+            match = {'$regex': '^' + re.escape(prefix)}
+            after = None
+            cursor = request.args.get('cursor')
+            if cursor:
+                key, _, user_id = cursor.rpartition('.')
+                if not key.startswith(prefix) or not ObjectId.is_valid(user_id):
+                    return jsonify({
+                        'success': False,
+                        'message': 'Cursor tidak valid'
+                    }), 400
+                after = (key, ObjectId(user_id))
+                match['$gte'] = key
+            
+            found = db.users.find({'name_keys': {'$elemMatch': match}}, {
+                'username': 1, 'email': 1, 'full_name': 1, 'is_admin': 1,
+                'is_active': 1, 'created_at': 1, 'deleted_at': 1, 'name_keys': 1
+            }).hint([('name_keys', 1), ('_id', 1)]).batch_size(limit + 1)
+            
+            users, positions = [], []
+            for user in found:
+                position = (min(k for k in user['name_keys'] if k.startswith(prefix)), user['_id'])
+                # Listed on an earlier page under a smaller key
+                if after and position <= after:
+                    continue
+                users.append(user)
+                positions.append(position)
+                if len(users) == limit:
+                    break
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'users': [{
+                        'id': str(user['_id']),
+                        'username': user.get('username'),
+                        'email': user.get('email'),
+                        'full_name': user.get('full_name'),
+                        'is_admin': user.get('is_admin', False),
+                        'is_active': user.get('is_active', True),
+                        'deleted': 'deleted_at' in user,
+                        'created_at': user['created_at'].isoformat() if user.get('created_at') else None
+                    } for user in users],
+                    'next_cursor': f"{positions[-1][0]}.{positions[-1][1]}" if len(users) == limit else None
+                }
+            }), 200
+        except Exception as e:
+            print(f"Search users error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error searching users'
+            }), 500
+    
+    @admin_bp.route('/search/sessions', methods=['GET'])
+    @admin_required
+    def search_sessions():
+        """Sessions by user, character and creation date, newest first"""
+        try:
+            try:
+                limit, start, end, ids = parse_search_args(request.args)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+            
+            # Served by (user_id, created_at), (character_id, created_at) or (created_at)
+            query = dict(ids)
+            created = {}
+            if start:
+                created['$gte'] = start
+            if end:
+                created['$lt'] = end
+            
+            cursor = request.args.get('cursor')
+            if cursor:
+                try:
+                    created_at, _, session_id = cursor.rpartition('.')
+                    created_at = datetime.fromisoformat(created_at)
+                    session_id = ObjectId(session_id)
+                except Exception:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Cursor tidak valid'
+                    }), 400
+                query['$or'] = [
+                    {'created_at': {'$lt': created_at}},
+                    {'created_at': created_at, '_id': {'$lt': session_id}}
+                ]
+            if created:
+                query['created_at'] = created
+            
+            sessions = list(db.chat_sessions.find(query).sort([('created_at', -1), ('_id', -1)]).limit(limit))
+            
+            users = {u['_id']: u for u in db.users.find(
+                {'_id': {'$in': list({s['user_id'] for s in sessions})}},
+                {'username': 1, 'email': 1}
+            )}
+            characters = {c['_id']: c for c in db.characters.find({}, {'name': 1, 'avatar': 1})}
+            
+            results = []
+            for session in sessions:
+                user = users.get(session['user_id'], {})
+                character = characters.get(session['character_id'], {})
+                results.append({
+                    'session_id': str(session['_id']),
+                    'title': session.get('title', 'Untitled Chat'),
+                    'user': {
+                        'id': str(session['user_id']),
+                        'username': user.get('username', 'Unknown'),
+                        'email': user.get('email', '')
+                    },
+                    'character': {
+                        'id': str(session['character_id']),
+                        'name': character.get('name', 'Unknown'),
+                        'avatar': character.get('avatar', '🤖')
+                    },
+                    'message_count': session.get('message_count'),
+                    'is_active': session.get('is_active', True),
+                    'created_at': session['created_at'].isoformat(),
+                    'updated_at': session['updated_at'].isoformat()
+                })
+            
+            next_cursor = None
+            if len(sessions) == limit:
+                last = sessions[-1]
+                next_cursor = f"{last['created_at'].isoformat()}.{last['_id']}"
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'sessions': results,
+                    'next_cursor': next_cursor
+                }
+            }), 200
+        except Exception as e:
+            print(f"Search sessions error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error searching sessions'
+            }), 500
+    
+    @admin_bp.route('/search/messages', methods=['GET'])
+    @admin_required
+    def search_transcripts():
+        """Text search over all transcripts (?q= plus user, character, sender and date filters)"""
+        try:
+            terms = tokenize(request.args.get('q', ''))
+            if not terms:
+                return jsonify({
+                    'success': False,
+                    'message': 'Kata kunci pencarian tidak boleh kosong'
+                }), 400
+            
+            try:
+                limit, start, end, ids = parse_search_args(request.args)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+            filters, error = parse_feed_filters(request.args)
+            if error:
+                return jsonify({
+                    'success': False,
+                    'message': error
+                }), 400
+            
+            # Every filter leads one of the message_search indexes
+            scope = dict(ids)
+            if filters['sender_type']:
+                scope['sender_type'] = filters['sender_type']
+            
+            try:
+                entries, next_cursor = db.search.search(
+                    terms, scope,
+                    limit=limit,
+                    cursor=request.args.get('cursor'),
+                    since=start,
+                    until=end
+                )
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Cursor tidak valid'
+                }), 400
+            
+            sessions = {s['_id']: s for s in db.chat_sessions.find(
+                {'_id': {'$in': list({e['chat_session_id'] for e in entries})}},
+                {'title': 1, 'user_id': 1, 'character_id': 1, 'storage': 1, 'archived_count': 1, 'is_active': 1}
+            )}
+            contents = {}
+            for session_id, session in sessions.items():
+                message_ids = [e['_id'] for e in entries if e['chat_session_id'] == session_id]
+                for message in chat_model.get_messages_by_ids(session, message_ids):
+                    contents[message['_id']] = message['content']
+            
+            users = {u['_id']: u for u in db.users.find(
+                {'_id': {'$in': list({e['user_id'] for e in entries})}},
+                {'username': 1, 'email': 1}
+            )}
+            characters = {c['_id']: c for c in db.characters.find({}, {'name': 1, 'avatar': 1})}
+            
+            results = []
+            for entry in entries:
+                session = sessions.get(entry['chat_session_id'])
+                if session is None or entry['_id'] not in contents:
+                    # Purged after it was indexed
+                    continue
+                text, highlights = snippet(contents[entry['_id']], terms)
+                user = users.get(entry['user_id'], {})
+                character = characters.get(entry.get('character_id'), {})
+                results.append({
+                    'message_id': str(entry['_id']),
+                    'sender_type': entry['sender_type'],
+                    'snippet': text,
+                    'highlights': highlights,
+                    'match': 'all' if entry['tier'] == 0 else 'any',
+                    'timestamp': entry['timestamp'].isoformat(),
+                    'session': {
+                        'id': str(session['_id']),
+                        'title': session.get('title'),
+                        'is_active': session.get('is_active', True)
+                    },
+                    'user': {
+                        'id': str(entry['user_id']),
+                        'username': user.get('username', 'Unknown'),
+                        'email': user.get('email', '')
+                    },
+                    'character': {
+                        'id': str(entry['character_id']) if entry.get('character_id') else None,
+                        'name': character.get('name'),
+                        'avatar': character.get('avatar')
+                    }
+                })
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'results': results,
+                    'next_cursor': next_cursor
+                }
+            }), 200
+        except Exception as e:
+            print(f"Search transcripts error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error searching messages'
+            }), 500
+    
     @admin_bp.route('/users/<user_id>/toggle-admin', methods=['PUT'])
     @admin_required
     def toggle_admin_role(user_id):
@@ -408,16 +919,9 @@ def init_admin_routes(db):
     @admin_bp.route('/stats', methods=['GET'])
     @admin_required
     def get_stats():
-        """Get overall statistics"""
+        """Get overall statistics from the incrementally maintained rollups"""
         try:
-            stats = {
-                'total_users': db.users.count_documents({}),
-                'total_sessions': db.chat_sessions.count_documents({'is_active': True}),
-                'total_messages': db.messages.count_documents({}),
-                'active_users_today': db.users.count_documents({
-                    'last_login': {'$gte': datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)}
-                })
-            }
+            stats = db.rollups.snapshot()
             
             return jsonify({
                 'success': True,
@@ -430,4 +934,190 @@ def init_admin_routes(db):
                 'message': 'Error fetching stats'
             }), 500
     
+    @admin_bp.route('/stats/daily', methods=['GET'])
+    @admin_required
+    def get_daily_stats():
+        """Get per-day statistics for charts (?from=YYYY-MM-DD&to=YYYY-MM-DD)"""
+        try:
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            try:
+                end = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else today
+                start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else end - timedelta(days=29)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Format tanggal harus YYYY-MM-DD'
+                }), 400
+            
+            if start > end or (end - start).days > 366:
+                return jsonify({
+                    'success': False,
+                    'message': 'Rentang tanggal tidak valid (maksimal 366 hari)'
+                }), 400
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'from': start.strftime('%Y-%m-%d'),
+                    'to': end.strftime('%Y-%m-%d'),
+                    'days': db.rollups.get_daily(start, end)
+                }
+            }), 200
+        except Exception as e:
+            print(f"Get daily stats error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching stats'
+            }), 500
+    
+    @admin_bp.route('/usage', methods=['GET'])
+    @admin_required
+    def get_token_usage():
+        """LLM token usage per day, user, character and endpoint (?from=&to=&user_id=&limit=)"""
+        try:
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            try:
+                end = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else today
+                start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else end - timedelta(days=29)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Format tanggal harus YYYY-MM-DD'
+                }), 400
+            
+            if start > end or (end - start).days > 366:
+                return jsonify({
+                    'success': False,
+                    'message': 'Rentang tanggal tidak valid (maksimal 366 hari)'
+                }), 400
+            
+            user_id = request.args.get('user_id')
+            if user_id and not ObjectId.is_valid(user_id):
+                return jsonify({
+                    'success': False,
+                    'message': 'user_id tidak valid'
+                }), 400
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+            
+            # Include what this worker has not flushed yet
+            db.usage.flush()
+            report = db.usage.report(start, end + timedelta(days=1), user_id=user_id, limit=limit)
+            return jsonify({
+                'success': True,
+                'data': dict(
+                    report,
+                    **{
+                        'from': start.strftime('%Y-%m-%d'),
+                        'to': end.strftime('%Y-%m-%d'),
+                        'quota': {
+                            'soft_daily_tokens': db.usage.soft_daily_tokens,
+                            'hard_daily_tokens': db.usage.hard_daily_tokens
+                        }
+                    }
+                )
+            }), 200
+        except Exception as e:
+            print(f"Get token usage error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching usage'
+            }), 500
+    
+    @admin_bp.route('/slow-ops', methods=['GET'])
+    @admin_required
+    def get_slow_ops():
+        """Recent slow Mongo operations, newest first (?route=&collection=&since=&limit=).
+        
+        Records are written by the slow-ops worker, so the newest ones show
+        up after at most SLOW_OP_FLUSH_SECONDS.
+        """
+        try:
+            try:
+                since = datetime.strptime(request.args['since'], '%Y-%m-%d') if request.args.get('since') else None
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Format tanggal harus YYYY-MM-DD'
+                }), 400
+            limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+
+            ops = []
+            if db.slow_log.sink == 'collection':
+                ops = db.slow_log.recent(
+                    limit=limit,
+                    route=request.args.get('route'),
+                    collection=request.args.get('collection'),
+                    since=since
+                )
+            for op in ops:
+                op['_id'] = str(op['_id'])
+                op['at'] = op['at'].isoformat()
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'ops': ops,
+                    'by_route': db.slow_log.summarize(ops),
+                    'threshold_ms': db.slow_log.threshold_ms,
+                    'sink': db.slow_log.sink
+                }
+            }), 200
+        except Exception as e:
+            print(f"Get slow ops error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching slow operations'
+            }), 500
+
+    @admin_bp.route('/export', methods=['GET'])
+    @admin_required
+    def export_conversations():
+        """Download all messages sent in a date range as NDJSON (?from=&to=&gzip=1).
+
+        Only sessions with at least one message in the range are included.
+        """
+        try:
+            try:
+                start = datetime.strptime(request.args['from'], '%Y-%m-%d')
+                # ``to`` is inclusive: up to the end of that day
+                end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1)
+            except (KeyError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'Parameter from dan to wajib, format YYYY-MM-DD'
+                }), 400
+            if start >= end:
+                return jsonify({
+                    'success': False,
+                    'message': 'Rentang tanggal tidak valid'
+                }), 400
+            
+            batch_size = min(max(request.args.get('batch_size', exporter.batch_size, type=int), 10), 5000)
+            compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+            records = exporter.range_records(start, end, batch_size)
+            filename = f"export-{start:%Y%m%d}-{end - timedelta(days=1):%Y%m%d}.ndjson"
+            return ndjson_response(records, filename, compress)
+        except Exception as e:
+            print(f"Export error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error exporting conversations'
+            }), 500
+    
+    @admin_bp.route('/metrics', methods=['GET'])
+    @admin_required
+    def get_metrics():
+        """Get runtime metrics of the worker that serves this request"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': collect_metrics()
+            }), 200
+        except Exception as e:
+            print(f"Get metrics error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Error fetching metrics'
+            }), 500
+    
     return admin_bp
@@ -157,8 +157,8 @@ def init_auth_routes(db):
             )
             
             # Update last login
-            from datetime import datetime
-            user_model.update_user(user['_id'], {'last_login': datetime.utcnow()})
+            user_model.record_login(user['_id'])
+            db.rollups.record_activity(user['_id'])
             
             return jsonify({
                 'success': True,
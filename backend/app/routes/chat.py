@@ -1,20 +1,85 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.database import CharacterModel, ChatModel
-from ..utils.openai_service import OpenAIService
+from ..models.export import ConversationExporter
+from ..models.idempotency import IdempotencyConflict, IdempotencyLost
+from ..utils.generators import create_generator
+from ..utils.event_broker import session_channel
+from ..utils.text_search import tokenize, snippet
+from ..utils.ndjson import ndjson_response
+from ..utils.metrics import register_metrics
+from ..utils.http_cache import make_etag, not_modified, with_validators
+from ..utils.streams import stream_slots
 from bson import ObjectId
+from datetime import datetime, timedelta
+import json
+import time
+import os
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
 def init_chat_routes(db):
     character_model = CharacterModel(db)
     chat_model = ChatModel(db)
-    openai_service = OpenAIService()
+    exporter = ConversationExporter(db)
+    generator = create_generator()
+    register_metrics('llm', generator.stats)
+    
+    def export_batch_size():
+        return min(max(request.args.get('batch_size', exporter.batch_size, type=int), 10), 5000)
+    
+    def export_compressed():
+        return request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    def format_session(session):
+        character = character_model.get_character(session['character_id'])
+        return {
+            'id': str(session['_id']),
+            'title': session['title'],
+            'character': {
+                'id': str(character['_id']) if character else None,
+                'name': character['name'] if character else 'Unknown',
+                'avatar': character['avatar'] if character else '🤖'
+            },
+            'created_at': session['created_at'].isoformat(),
+            'updated_at': session['updated_at'].isoformat()
+        }
+    
+    def format_message(message):
+        return {
+            'id': str(message['_id']),
+            'sender_type': message['sender_type'],
+            'content': message['content'],
+            'timestamp': message['timestamp'].isoformat()
+        }
+    
+    # Delta sync: pages of changed sessions, and messages re-sent from a
+    # little before the watermark so a write still landing is never missed
+    sync_max_sessions = int(os.getenv('SYNC_MAX_SESSIONS', 100))
+    sync_max_messages = int(os.getenv('SYNC_MAX_MESSAGES', 200))
+    sync_overlap = timedelta(seconds=int(os.getenv('SYNC_OVERLAP_SECONDS', 30)))
+    
+    def encode_sync_token(moment, session_id=None):
+        return f"{moment.isoformat()}_{session_id or ''}"
+    
+    def decode_sync_token(token):
+        moment, _, session_id = token.rpartition('_')
+        if session_id and not ObjectId.is_valid(session_id):
+            raise ValueError(f"Invalid sync token: {token}")
+        return datetime.fromisoformat(moment), ObjectId(session_id) if session_id else None
+    
+    # The catalog is static between deploys; let browsers reuse it for a while
+    characters_cache_control = f"private, max-age={int(os.getenv('CHARACTERS_MAX_AGE_SECONDS', 300))}"
     
     @chat_bp.route('/characters', methods=['GET'])
     @jwt_required()
     def get_characters():
         try:
+            etag = make_etag('characters', character_model.catalog_version())
+            cached = not_modified(etag, cache_control=characters_cache_control)
+            if cached:
+                return cached
+            
             characters = character_model.get_all_characters()
             
             # Format characters for response
@@ -29,12 +94,13 @@ def init_chat_routes(db):
                     'sample_responses': char.get('sample_responses', [])
                 })
             
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'data': {
                     'characters': formatted_characters
                 }
-            }), 200
+            })
+            return with_validators(response, etag, cache_control=characters_cache_control), 200
         
         except Exception as e:
             print(f"Get characters error: {e}")
@@ -48,31 +114,24 @@ def init_chat_routes(db):
     def get_chat_sessions():
         try:
             current_user_id = get_jwt_identity()
+            count, updated_at = chat_model.sessions_version(current_user_id)
+            etag = make_etag('sessions', current_user_id, count, updated_at, character_model.catalog_version())
+            cached = not_modified(etag, updated_at)
+            if cached:
+                return cached
+            
             sessions = chat_model.get_user_chat_sessions(current_user_id)
             
             # Format sessions with character info
-            formatted_sessions = []
-            for session in sessions:
-                character = character_model.get_character(session['character_id'])
-                
-                formatted_sessions.append({
-                    'id': str(session['_id']),
-                    'title': session['title'],
-                    'character': {
-                        'id': str(character['_id']) if character else None,
-                        'name': character['name'] if character else 'Unknown',
-                        'avatar': character['avatar'] if character else '🤖'
-                    },
-                    'created_at': session['created_at'].isoformat(),
-                    'updated_at': session['updated_at'].isoformat()
-                })
+            formatted_sessions = [format_session(session) for session in sessions]
             
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'data': {
                     'sessions': formatted_sessions
                 }
-            }), 200
+            })
+            return with_validators(response, etag, updated_at), 200
         
         except Exception as e:
             print(f"Get chat sessions error: {e}")
@@ -81,6 +140,70 @@ def init_chat_routes(db):
                 'message': 'Terjadi kesalahan server'
             }), 500
     
+    @chat_bp.route('/sync', methods=['GET'])
+    @jwt_required()
+    def sync_changes():
+        try:
+            current_user_id = get_jwt_identity()
+            token = request.args.get('since', '')
+            
+            # Without a token, or one older than purged sessions and archived
+            # history, the client reloads in full and continues from now
+            horizon = datetime.utcnow() - timedelta(
+                days=min(db.lifecycle.purge_grace_days, db.lifecycle.archive_after_days)
+            )
+            try:
+                since, after_id = decode_sync_token(token) if token else (None, None)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Token sinkronisasi tidak valid'
+                }), 400
+            if since is None or since < horizon:
+                _, latest = chat_model.sessions_version(current_user_id)
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'reset': True,
+                        'next': encode_sync_token(latest or datetime.utcnow())
+                    }
+                }), 200
+            
+            changed = chat_model.get_changed_sessions(current_user_id, since, after_id, sync_max_sessions)
+            sessions, deleted, messages = [], [], {}
+            for session in changed:
+                if not session.get('is_active', True):
+                    deleted.append(str(session['_id']))
+                    continue
+                sessions.append(format_session(session))
+                new_messages = chat_model.get_messages_since(session, since - sync_overlap, sync_max_messages + 1)
+                if new_messages:
+                    messages[str(session['_id'])] = {
+                        'messages': [format_message(msg) for msg in new_messages[:sync_max_messages]],
+                        # Too much to catch up on here; reload the session
+                        'truncated': len(new_messages) > sync_max_messages
+                    }
+            
+            next_token = encode_sync_token(changed[-1]['updated_at'], changed[-1]['_id']) if changed else token
+            return jsonify({
+                'success': True,
+                'data': {
+                    'reset': False,
+                    'sessions': sessions,
+                    'deleted': deleted,
+                    'messages': messages,
+                    'has_more': len(changed) == sync_max_sessions,
+                    'next': next_token
+                }
+            }), 200
+        
+        except Exception as e:
+            print(f"Sync error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+    
     @chat_bp.route('/sessions', methods=['POST'])
     @jwt_required()
     def create_chat_session():
@@ -139,6 +262,92 @@ def init_chat_routes(db):
                 'message': 'Terjadi kesalahan server'
             }), 500
     
+    @chat_bp.route('/search', methods=['GET'])
+    @jwt_required()
+    def search_messages():
+        """Search the caller's own chat history, best matches first"""
+        try:
+            current_user_id = get_jwt_identity()
+            terms = tokenize(request.args.get('q', ''))
+            if not terms:
+                return jsonify({
+                    'success': False,
+                    'message': 'Kata kunci pencarian tidak boleh kosong'
+                }), 400
+            
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+            
+            # Live sessions of the caller; results in deleted ones are dropped
+            sessions = {s['_id']: s for s in db.chat_sessions.find(
+                {'user_id': ObjectId(current_user_id), 'is_active': True},
+                {'title': 1, 'character_id': 1, 'storage': 1, 'archived_count': 1}
+            )}
+            
+            try:
+                entries, next_cursor = db.search.search(
+                    terms, {'user_id': ObjectId(current_user_id)},
+                    limit=limit,
+                    cursor=request.args.get('cursor'),
+                    keep=lambda entry: entry['chat_session_id'] in sessions
+                )
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Cursor tidak valid'
+                }), 400
+            
+            # Fetch the matched messages session by session for their snippets
+            by_session = {}
+            for entry in entries:
+                by_session.setdefault(entry['chat_session_id'], []).append(entry['_id'])
+            contents = {}
+            for session_id, message_ids in by_session.items():
+                for message in chat_model.get_messages_by_ids(sessions[session_id], message_ids):
+                    contents[message['_id']] = message['content']
+            
+            characters = {c['_id']: c for c in db.characters.find({}, {'name': 1, 'avatar': 1})}
+            
+            results = []
+            for entry in entries:
+                if entry['_id'] not in contents:
+                    # Removed after it was indexed
+                    continue
+                text, highlights = snippet(contents[entry['_id']], terms)
+                session = sessions[entry['chat_session_id']]
+                character = characters.get(session.get('character_id'), {})
+                results.append({
+                    'message_id': str(entry['_id']),
+                    'sender_type': entry['sender_type'],
+                    'snippet': text,
+                    'highlights': highlights,
+                    'match': 'all' if entry['tier'] == 0 else 'any',
+                    'timestamp': entry['timestamp'].isoformat(),
+                    'session': {
+                        'id': str(session['_id']),
+                        'title': session.get('title')
+                    },
+                    'character': {
+                        'id': str(character['_id']) if character else None,
+                        'name': character.get('name'),
+                        'avatar': character.get('avatar')
+                    }
+                })
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'results': results,
+                    'next_cursor': next_cursor
+                }
+            }), 200
+        
+        except Exception as e:
+            print(f"Search messages error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+    
     @chat_bp.route('/sessions/<session_id>/messages', methods=['GET'])
     @jwt_required()
     def get_chat_messages(session_id):
@@ -153,23 +362,24 @@ def init_chat_routes(db):
                     'message': 'Sesi chat tidak ditemukan'
                 }), 404
             
-            # Get messages
-            messages = chat_model.get_chat_messages(session_id)
+            etag = make_etag(
+                'messages', session['_id'], session.get('message_count', 0),
+                session.get('last_message_id'), session['updated_at'], character_model.catalog_version()
+            )
+            cached = not_modified(etag, session['updated_at'])
+            if cached:
+                return cached
+            
+            # Get messages (served from the tail cache for active sessions)
+            messages = chat_model.get_chat_messages(session_id, session=session)
             
             # Format messages
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    'id': str(msg['_id']),
-                    'sender_type': msg['sender_type'],
-                    'content': msg['content'],
-                    'timestamp': msg['timestamp'].isoformat()
-                })
+            formatted_messages = [format_message(msg) for msg in messages]
             
             # Get character info
             character = character_model.get_character(session['character_id'])
             
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'data': {
                     'messages': formatted_messages,
@@ -183,7 +393,8 @@ def init_chat_routes(db):
                         }
                     }
                 }
-            }), 200
+            })
+            return with_validators(response, etag, session['updated_at']), 200
         
         except Exception as e:
             print(f"Get chat messages error: {e}")
@@ -192,19 +403,199 @@ def init_chat_routes(db):
                 'message': 'Terjadi kesalahan server'
             }), 500
     
+    def reply_to_message(current_user_id, session_id, message, claim=None):
+        """Store a user message and the character's reply; returns (payload, status).
+        
+        With an idempotency ``claim``, each stored message is recorded as its
+        progress, and a retry reuses what an earlier attempt already stored.
+        """
+        if not message:
+            return {
+                'success': False,
+                'message': 'Pesan tidak boleh kosong'
+            }, 400
+        
+        # Validate session belongs to user
+        session = chat_model.get_chat_session(session_id, current_user_id)
+        if not session:
+            return {
+                'success': False,
+                'message': 'Sesi chat tidak ditemukan'
+            }, 404
+        
+        # Get character
+        character = character_model.get_character(session['character_id'])
+        if not character:
+            return {
+                'success': False,
+                'message': 'Karakter tidak ditemukan'
+            }, 404
+        
+        # Daily token quota, checked against a per-process cache
+        allowed, over_soft_limit, used = db.usage.check_quota(current_user_id)
+        if not allowed:
+            return {
+                'success': False,
+                'message': 'Batas penggunaan harian kamu sudah habis, coba lagi besok ya'
+            }, 429
+        
+        # Get recent chat history for context, read before the new
+        # message is written so the cached tail still matches the session
+        history_size = getattr(generator, 'history_messages', 8)
+        recent_messages = chat_model.get_recent_messages(session_id, limit=history_size + 1, session=session)
+        # Messages before the one being answered, for fixed-position history trimming
+        history_total = session.get('message_count', 0)
+        progress = claim.progress if claim else {}
+        
+        # Save user message, unless an earlier attempt of this request did
+        stored_user = progress.get('user_message')
+        if stored_user:
+            user_message_id, user_timestamp = stored_user['id'], stored_user['timestamp']
+            recent_messages = [m for m in recent_messages if m.get('_id') != user_message_id]
+            history_total -= 1
+        else:
+            db.rollups.record_activity(current_user_id)
+            user_timestamp = datetime.utcnow()
+            user_message_id = chat_model.add_message(session_id, 'user', message, timestamp=user_timestamp, session=session)
+            if claim:
+                db.idempotency.record_progress(claim, user_message={'id': user_message_id, 'timestamp': user_timestamp})
+        recent_messages.append({
+            '_id': user_message_id,
+            'sender_type': 'user',
+            'content': message,
+            'timestamp': user_timestamp
+        })
+        
+        stored_ai = progress.get('ai_message')
+        if stored_ai:
+            ai_message_id, ai_response, ai_timestamp = stored_ai['id'], stored_ai['content'], stored_ai['timestamp']
+            recent_messages = [m for m in recent_messages if m.get('_id') != ai_message_id]
+        else:
+            # Generate AI response
+            usage = {}
+            ai_response = generator.generate_response(
+                message, 
+                character['personality'],
+                recent_messages,
+                character['name'],
+                usage=usage,
+                history_total=history_total
+            )
+            db.usage.record(current_user_id, character['_id'], 'reply', usage)
+            
+            if not ai_response:
+                ai_response = "Maaf, aku lagi ada gangguan nih. Coba chat lagi ya! 😅"
+            
+            if claim:
+                # A request that lost its claim must not store a second reply
+                db.idempotency.record_progress(claim)
+            
+            # Save AI response
+            ai_timestamp = datetime.utcnow()
+            ai_message_id = chat_model.add_message(
+                session_id, 
+                'ai', 
+                ai_response, 
+                character['_id'],
+                timestamp=ai_timestamp,
+                session=session
+            )
+            if claim:
+                db.idempotency.record_progress(
+                    claim, ai_message={'id': ai_message_id, 'content': ai_response, 'timestamp': ai_timestamp}
+                )
+        
+        # Update chat title if this is the first user message
+        if len(recent_messages) <= 2:  # Greeting + first user message
+            usage = {}
+            new_title = generator.generate_chat_title(message, character['name'], usage=usage)
+            db.usage.record(current_user_id, character['_id'], 'title', usage)
+            chat_model.update_session_title(session_id, new_title)
+        
+        return {
+            'success': True,
+            'data': {
+                'usage_warning': over_soft_limit,
+                'user_message': {
+                    'id': str(user_message_id),
+                    'sender_type': 'user',
+                    'content': message,
+                    'timestamp': user_timestamp.isoformat()
+                },
+                'ai_message': {
+                    'id': str(ai_message_id),
+                    'sender_type': 'ai',
+                    'content': ai_response,
+                    'timestamp': ai_timestamp.isoformat()
+                }
+            }
+        }, 201
+    
     @chat_bp.route('/sessions/<session_id>/messages', methods=['POST'])
     @jwt_required()
     def send_message(session_id):
+        claim = None
         try:
             current_user_id = get_jwt_identity()
             data = request.get_json()
-            
             message = data.get('message', '').strip()
-            if not message:
-                return jsonify({
-                    'success': False,
-                    'message': 'Pesan tidak boleh kosong'
-                }), 400
+            
+            # A retried send with the same key replays the first outcome
+            # instead of storing the message and paying for a reply twice
+            key = request.headers.get('Idempotency-Key', '').strip()
+            if key:
+                if len(key) > 255:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Idempotency-Key terlalu panjang'
+                    }), 400
+                record_id = f"send_message:{current_user_id}:{key}"
+                try:
+                    claim, stored = db.idempotency.begin(
+                        record_id, db.idempotency.fingerprint(session_id, message)
+                    )
+                except IdempotencyConflict:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Idempotency-Key sudah dipakai untuk pesan lain'
+                    }), 422
+                except TimeoutError:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Pesan yang sama masih diproses, coba lagi sebentar'
+                    }), 409
+                if stored:
+                    status, payload = stored
+                    response = jsonify(payload)
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response, status
+            
+            payload, status = reply_to_message(current_user_id, session_id, message, claim)
+            if claim:
+                db.idempotency.complete(claim, status, payload)
+            return jsonify(payload), status
+        
+        except IdempotencyLost:
+            # Taken over by a retry after our lease ran out; that one answers
+            return jsonify({
+                'success': False,
+                'message': 'Pesan yang sama masih diproses, coba lagi sebentar'
+            }), 409
+        except Exception as e:
+            print(f"Send message error: {e}")
+            if claim:
+                db.idempotency.abandon(claim)
+            return jsonify({
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+    
+    @chat_bp.route('/sessions/<session_id>/events', methods=['GET'])
+    @jwt_required()
+    def stream_session_events(session_id):
+        """Server-Sent Events of new messages and title changes in a session"""
+        try:
+            current_user_id = get_jwt_identity()
             
             # Validate session belongs to user
             session = chat_model.get_chat_session(session_id, current_user_id)
@@ -213,68 +604,84 @@ def init_chat_routes(db):
                     'success': False,
                     'message': 'Sesi chat tidak ditemukan'
                 }), 404
+        except Exception as e:
+            print(f"Stream session events error: {e}")
+            return jsonify({
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+        
+        # Each stream holds a worker thread; past the per-worker cap clients
+        # poll GET /api/chat/sync instead
+        if not stream_slots.acquire():
+            response = jsonify({
+                'success': False,
+                'message': 'Terlalu banyak koneksi live, gunakan sinkronisasi biasa'
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        subscription = db.events.subscribe(session_channel(session_id))
+        # Bound each stream so the thread is handed back regularly;
+        # EventSource reconnects on its own
+        lifetime = int(os.getenv('SESSION_EVENTS_STREAM_SECONDS', 300))
+        
+        def generate():
+            deadline = time.monotonic() + lifetime
+            try:
+                yield 'retry: 2000\n\n'
+                while time.monotonic() < deadline:
+                    events = subscription.get(timeout=15)
+                    for event in events:
+                        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                    if not events:
+                        yield ': keep-alive\n\n'
+            finally:
+                subscription.close()
+        
+        response = Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # Runs even when the client leaves before the first event
+        response.call_on_close(stream_slots.release)
+        return response
+    
+    @chat_bp.route('/sessions/<session_id>/export', methods=['GET'])
+    @jwt_required()
+    def export_session(session_id):
+        """Download one session as NDJSON (?gzip=1 for a .gz file)"""
+        try:
+            current_user_id = get_jwt_identity()
             
-            # Get character
-            character = character_model.get_character(session['character_id'])
-            if not character:
+            session = chat_model.get_chat_session(session_id, current_user_id)
+            if not session:
                 return jsonify({
                     'success': False,
-                    'message': 'Karakter tidak ditemukan'
+                    'message': 'Sesi chat tidak ditemukan'
                 }), 404
             
-            # Save user message
-            user_message_id = chat_model.add_message(session_id, 'user', message)
-            
-            # Get recent chat history for context
-            recent_messages = chat_model.get_chat_messages(session_id, limit=10)
-            
-            # Generate AI response
-            ai_response = openai_service.generate_response(
-                message, 
-                character['personality'],
-                recent_messages,
-                character['name']
-            )
-            
-            if not ai_response:
-                ai_response = "Maaf, aku lagi ada gangguan nih. Coba chat lagi ya! 😅"
-            
-            # Save AI response
-            ai_message_id = chat_model.add_message(
-                session_id, 
-                'ai', 
-                ai_response, 
-                character['_id']
-            )
-            
-            # Update chat title if this is the first user message
-            if len(recent_messages) <= 2:  # Greeting + first user message
-                new_title = openai_service.generate_chat_title(message, character['name'])
-                db.chat_sessions.update_one(
-                    {"_id": ObjectId(session_id)},
-                    {"$set": {"title": new_title}}
-                )
-            
+            records = exporter.session_records(session, export_batch_size())
+            return ndjson_response(records, f"chat-{session_id}.ndjson", export_compressed())
+        
+        except Exception as e:
+            print(f"Export session error: {e}")
             return jsonify({
-                'success': True,
-                'data': {
-                    'user_message': {
-                        'id': str(user_message_id),
-                        'sender_type': 'user',
-                        'content': message,
-                        'timestamp': chat_model.db.messages.find_one({'_id': user_message_id})['timestamp'].isoformat()
-                    },
-                    'ai_message': {
-                        'id': str(ai_message_id),
-                        'sender_type': 'ai',
-                        'content': ai_response,
-                        'timestamp': chat_model.db.messages.find_one({'_id': ai_message_id})['timestamp'].isoformat()
-                    }
-                }
-            }), 201
+                'success': False,
+                'message': 'Terjadi kesalahan server'
+            }), 500
+    
+    @chat_bp.route('/export', methods=['GET'])
+    @jwt_required()
+    def export_all_sessions():
+        """Download all of the caller's sessions as NDJSON (?gzip=1 for a .gz file)"""
+        try:
+            current_user_id = get_jwt_identity()
+            records = exporter.user_records(current_user_id, export_batch_size())
+            return ndjson_response(records, f"chats-{datetime.utcnow():%Y%m%d}.ndjson", export_compressed())
         
         except Exception as e:
-            print(f"Send message error: {e}")
+            print(f"Export sessions error: {e}")
             return jsonify({
                 'success': False,
                 'message': 'Terjadi kesalahan server'
@@ -294,11 +701,16 @@ def init_chat_routes(db):
                     'message': 'Sesi chat tidak ditemukan'
                 }), 404
             
-            # Soft delete session
+            # Soft delete session; the lifecycle job purges it after the grace period
+            now = datetime.utcnow()
             db.chat_sessions.update_one(
                 {"_id": ObjectId(session_id)},
-                {"$set": {"is_active": False}}
+                {"$set": {"is_active": False, "deleted_at": now, "updated_at": now}}
             )
+            chat_model.invalidate_session(session_id)
+            if session.get('is_active', True):
+                db.rollups.record_session_closed(session['character_id'])
+            db.events.publish(session_channel(session_id), {'type': 'deleted'})
             
             return jsonify({
                 'success': True,
@@ -0,0 +1,68 @@
+import threading
+import os
+
+
+class PeriodicWorker:
+    """Runs ``task`` every ``interval`` seconds on a daemon thread.
+
+    Threads do not survive fork, so ``start`` is idempotent per process: the
+    gunicorn hooks and the first request of each worker both call it, and only
+    the first call in a given process spawns the thread.
+    """
+
+    def __init__(self, name, interval, task, run_on_stop=False, autostart=True):
+        self.name = name
+        self.interval = interval
+        self.task = task
+        # Run the task once more on shutdown, e.g. to flush buffered writes
+        self.run_on_stop = run_on_stop
+        # Workers that only matter on demand are started by their owner
+        self.autostart = autostart
+
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def trigger(self):
+        """Run the task as soon as possible instead of waiting for the interval"""
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        if self.running:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=timeout)
+        if self.run_on_stop:
+            self._run_task()
+
+    def _run_task(self):
+        try:
+            self.task()
+        except Exception as e:
+            print(f"⚠️ Background task '{self.name}' failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self._run_task()
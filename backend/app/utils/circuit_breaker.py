@@ -0,0 +1,108 @@
+from collections import deque
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The call was not attempted because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while.
+
+    Closed: calls go through and their outcomes fill a rolling window.
+    Once at least ``min_calls`` are recorded and the failure rate reaches
+    ``failure_rate`` the circuit opens, and every call fails at once with
+    ``CircuitOpen`` for ``open_seconds``. Then it is half-open: up to
+    ``half_open_calls`` probes go through; if they all succeed it closes,
+    and the first failure opens it again.
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window=20, open_seconds=30, half_open_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+        self._counts = {"calls": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    def _transition(self, state):
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counts["opened"] += 1
+            print(f"⚠️ Circuit '{self.name}' opened")
+        elif state == CLOSED:
+            self._outcomes.clear()
+            print(f"✅ Circuit '{self.name}' closed")
+        self._probes = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            return self._state
+
+    def allow(self):
+        """Whether a call may go ahead now; counts it as a probe when half-open"""
+        state = self.state
+        with self._lock:
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self._counts["short_circuited"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counts["calls"] += 1
+            if self._state == HALF_OPEN:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._transition(CLOSED)
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._counts["calls"] += 1
+            self._counts["failures"] += 1
+            if self._state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self._outcomes.append(False)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if self._outcomes.count(False) / len(self._outcomes) >= self.failure_rate:
+                    self._transition(OPEN)
+
+    def call(self, function, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen(self.name)
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            outcomes = list(self._outcomes)
+            snapshot = dict(self._counts)
+        snapshot["state"] = state
+        snapshot["failure_rate"] = round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0
+        return snapshot
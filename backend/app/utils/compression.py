@@ -0,0 +1,74 @@
+"""Negotiated gzip/brotli compression of buffered responses"""
+from flask import request
+import gzip
+import threading
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text formats shrink; images and archives are already compressed
+COMPRESSIBLE = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+class ResponseCompressor:
+    def __init__(self):
+        self.min_bytes = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+        self.gzip_level = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+        self.brotli_quality = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+        self.encodings = (['br'] if brotli else []) + ['gzip']
+        self._lock = threading.Lock()
+        self._stats = {
+            "compressed": {encoding: 0 for encoding in self.encodings},
+            "skipped": 0,
+            "bytes_in": 0,
+            "bytes_out": 0
+        }
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def _eligible(self, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        # Streams (SSE, NDJSON exports) flush as they go and are never buffered
+        if response.is_streamed or response.direct_passthrough:
+            return False
+        if 'Content-Encoding' in response.headers:
+            return False
+        return (response.mimetype or '').startswith(COMPRESSIBLE)
+
+    def _encode(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def compress(self, response):
+        if not self._eligible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(self.encodings)
+        data = response.get_data()
+        if not encoding or len(data) < self.min_bytes:
+            with self._lock:
+                self._stats["skipped"] += 1
+            return response
+
+        compressed = self._encode(data, encoding)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        with self._lock:
+            self._stats["compressed"][encoding] += 1
+            self._stats["bytes_in"] += len(data)
+            self._stats["bytes_out"] += len(compressed)
+        return response
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats, compressed=dict(self._stats["compressed"]))
+        snapshot["bytes_saved"] = snapshot["bytes_in"] - snapshot["bytes_out"]
+        snapshot["ratio"] = round(snapshot["bytes_out"] / snapshot["bytes_in"], 3) if snapshot["bytes_in"] else None
+        return snapshot
@@ -0,0 +1,170 @@
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from collections import deque
+from datetime import datetime
+import threading
+import time
+import os
+from .background import PeriodicWorker
+
+
+def session_channel(session_id):
+    return f"session:{session_id}"
+
+
+class Subscription:
+    """One connected client; buffers at most ``buffer_size`` undelivered events"""
+
+    def __init__(self, broker, channel, buffer_size):
+        self.broker = broker
+        self.channel = channel
+        self._events = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def deliver(self, event):
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                # Slow consumer: drop the oldest event and ask it to resync
+                self.overflowed = True
+            self._events.append(event)
+            self._condition.notify_all()
+
+    def get(self, timeout):
+        """Pending events, waiting up to ``timeout`` seconds for the first one"""
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            if self.overflowed:
+                self.overflowed = False
+                events.insert(0, {'type': 'resync'})
+            return events
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process broker; enough for a single worker or the development server"""
+
+    def __init__(self):
+        self.buffer_size = int(os.getenv('SESSION_EVENTS_BUFFER', 100))
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._published = 0
+
+    def create_indexes(self):
+        pass
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.buffer_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def dispatch(self, channel, event):
+        """Hand an event to the subscriptions of this process"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def publish(self, channel, event):
+        self._published += 1
+        self.dispatch(channel, event)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'broker': type(self).__name__,
+                'channels': len(self._channels),
+                'subscriptions': sum(len(s) for s in self._channels.values()),
+                'published': self._published
+            }
+
+
+class MongoBroker(LocalBroker):
+    """Fans events out across gunicorn workers through a capped collection.
+
+    ``publish`` only inserts into ``session_events``; every worker tails that
+    collection with an awaitData cursor and dispatches to its own subscribers,
+    so a message written by one worker reaches clients connected to any other.
+    """
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self.capped_bytes = int(os.getenv('SESSION_EVENTS_CAPPED_BYTES', 16 * 1024 * 1024))
+        self.worker = PeriodicWorker('session-events', 0, self._tail_once, autostart=False)
+        self._cursor = None
+        self._last_id = None
+
+    def create_indexes(self):
+        try:
+            self.db.db.create_collection('session_events', capped=True, size=self.capped_bytes)
+        except CollectionInvalid:
+            # Already exists
+            pass
+
+    def subscribe(self, channel):
+        # Workers without subscribers never need to tail
+        self.worker.start()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        self._published += 1
+        self.db.session_events.insert_one({
+            'channel': channel,
+            'event': event,
+            'created_at': datetime.utcnow()
+        })
+
+    def _tail_once(self):
+        try:
+            if self._cursor is None or not self._cursor.alive:
+                if self._last_id is None:
+                    # Start at the end of the collection; older events are history
+                    newest = self.db.session_events.find_one(sort=[('$natural', -1)])
+                    self._last_id = newest['_id'] if newest else None
+                query = {'_id': {'$gt': self._last_id}} if self._last_id else {}
+                self._cursor = self.db.session_events.find(
+                    query, cursor_type=CursorType.TAILABLE_AWAIT
+                ).max_await_time_ms(1000)
+
+            # Iteration stops when the await times out; the cursor stays open
+            for document in self._cursor:
+                self._last_id = document['_id']
+                self.dispatch(document['channel'], document['event'])
+
+            if not self._cursor.alive:
+                time.sleep(0.5)
+        except Exception as e:
+            # Also malformed events: ``_last_id`` already points past the
+            # document, so the reopened cursor skips it instead of spinning
+            print(f"⚠️ Session event tail error: {e}")
+            self._cursor = None
+            time.sleep(1)
+
+
+def create_broker(db):
+    """Broker selected by SESSION_EVENTS_BROKER (mongo or local)"""
+    kind = os.getenv('SESSION_EVENTS_BROKER', 'mongo')
+    if kind == 'local':
+        return LocalBroker()
+    if kind == 'mongo':
+        return MongoBroker(db)
+    raise ValueError(f"Unknown SESSION_EVENTS_BROKER: {kind}")
@@ -0,0 +1,197 @@
+"""Reply generators behind one interface, chosen by configuration.
+
+``RESPONSE_GENERATOR`` picks the implementation:
+
+- ``openai``: the LLM backends of ``llm_router`` (the default); falls back
+  to the rule-based replies when no backend is configured or a call fails
+- ``fallback``: rule-based replies only, no network
+- ``fake``: deterministic replies after ``FAKE_GENERATOR_LATENCY_MS``
+  (0 by default), for benchmarks and tests
+
+Further implementations can be added with ``register_generator``.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+import hashlib
+import time
+import os
+
+
+class ResponseGenerator(ABC):
+    """Produces character replies and chat titles.
+
+    ``usage``, when given, is a dict filled with the ``prompt_tokens`` and
+    ``completion_tokens`` the call consumed; it stays empty for replies that
+    cost no tokens. ``history_total`` is the number of messages in the
+    conversation before the one being answered, of which ``chat_history``
+    holds the newest; it lets a generator trim history at fixed positions.
+
+    Implementations must define ``generate_response`` and
+    ``generate_chat_title``; a class missing either cannot be instantiated.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def generate_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None, usage: Optional[Dict] = None, history_total: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def generate_chat_title(self, first_message: str, character_name: str, usage: Optional[Dict] = None) -> str:
+        raise NotImplementedError
+
+    def stream_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None) -> Iterator[str]:
+        """Reply in pieces as they become available; one piece unless overridden"""
+        yield self.generate_response(user_message, character_personality, chat_history, character_name)
+
+    def generate_batch(self, requests: List[Dict]) -> List[str]:
+        """Replies for several ``generate_response`` keyword sets, in order"""
+        return [self.generate_response(**request) for request in requests]
+
+    def stats(self) -> Dict:
+        return {"generator": self.name}
+
+
+class FallbackGenerator(ResponseGenerator):
+    """Rule-based replies; also the safety net of the network generators"""
+
+    name = 'fallback'
+
+    def generate_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None, usage: Optional[Dict] = None, history_total: Optional[int] = None) -> str:
+        return self.get_intelligent_fallback(user_message, character_personality, character_name)
+
+    def get_intelligent_fallback(self, user_message: str, character_personality: str, character_name: Optional[str] = None) -> str:
+        """Keyword-matched reply in the character's voice"""
+        
+        user_msg_lower = user_message.lower()
+        character_name = character_name or "Sahabat Setia"
+        
+        # Math and academic subjects
+        if any(word in user_msg_lower for word in ['matematika', 'math', 'aljabar', 'geometry', 'kalkulus', 'trigonometri', 'statistik']):
+            if character_name == "Guru Motivator":
+                return f"Wah {user_message} ya! 📚 Oke deh, guru jelasin dari dasar. Sebenernya ini gampang kok kalau udah ngerti konsepnya. Mana nih yang bikin bingung?"
+            else:
+                return f"Math ya? {user_message} emang tricky sih 🤔 Tapi tenang, gue bantuin. Mulai dari mana nih?"
+        
+        # Science subjects
+        elif any(word in user_msg_lower for word in ['fisika', 'physics', 'kimia', 'chemistry', 'biologi', 'biology']):
+            if character_name == "Guru Motivator":
+                return f"{user_message}? Seru tuh! 🔬 Science emang keren banget. Oke guru jelasin ya, yang mana dulu nih yang pengen tau?"
+            else:
+                return f"Science! {user_message} nih ya? Cool topic 🧪 Ada yang spesifik yang mau dibahas?"
+        
+        # Questions and curiosity
+        elif any(word in user_msg_lower for word in ['apa', 'what', 'bagaimana', 'how', 'kenapa', 'why']):
+            if character_name == "Guru Motivator":
+                return f"Good question! Tentang {user_message}, coba kita bahas bareng ya 🤔 Kamu udah tau dasarnya belum?"
+            elif character_name == "Papa Pelindung":
+                return f"Anak papa nanya bagus nih 💪 Soal {user_message}, papa jelasin ya. Dengerin baik-baik"
+            elif character_name == "Pacar Romantis":
+                return f"Sayang nanya {user_message}? 💕 Oke deh baby, aku jelasin. Dengerin ya~"
+            else:
+                return f"Oh {user_message} ya? Interesting nih 🤔 Gue coba jelasin deh"
+        
+        # Learning and study  
+        elif any(word in user_msg_lower for word in ['belajar', 'study', 'tugas', 'pr', 'homework', 'ujian', 'exam']):
+            if character_name == "Guru Motivator":
+                return f"Belajar {user_message} ya? 📚 Oke, guru punya tips nih biar lebih gampang. Udah sampai mana?"
+            else:
+                return f"Lagi {user_message}? Semangat! 💪 Butuh bantuan apa nih?"
+        
+        # Emotional support
+        elif any(word in user_msg_lower for word in ['sedih', 'sad', 'stress', 'capek', 'tired', 'bosan', 'galau']):
+            if character_name == "Mama Penyayang":
+                return f"Sayang kok {user_message}? 🤱 Cerita sama mama apa yang bikin gitu. Mama dengerin kok 💕"
+            elif character_name == "Papa Pelindung":
+                return f"{user_message} ya nak? 💪 Gapapa, papa ngerti kok. Coba cerita kenapa?"
+            elif character_name == "Pacar Romantis":
+                return f"Baby kok {user_message}? 💕 Sini cerita sama aku. I'm here for you sayang ❤️"
+            else:
+                return f"Eh {user_message} kenapa? 🤗 Yuk cerita, mungkin bisa bantuin"
+        
+        # Default responses
+        else:
+            if character_name == "Guru Motivator":
+                return f"Oh {user_message} ya? 📚 Menarik nih! Guru suka bahas hal-hal gini. Kamu pengen tau apa spesifiknya?"
+            elif character_name == "Pacar Romantis":
+                return f"Sayang ngomong {user_message}? 💕 Cute banget sih. Cerita lebih dong baby~"
+            elif character_name == "Mama Penyayang":
+                return f"Anak mama cerita soal {user_message} ya? 🤱 Mama seneng dengerin. Lanjut dong ceritanya"
+            elif character_name == "Papa Pelindung":
+                return f"Hmm {user_message} ya nak? 💪 Papa dengerin. Gimana cerita lengkapnya?"
+            elif character_name == "Sahabat Setia":
+                return f"Loh {user_message}? 😎 Seru tuh! Spill dong detailnya bro"
+            else:  # Kakak Kece
+                return f"Dek! {user_message} ya? 🌈 Kakak interested nih. Cerita lebih lanjut dong!"
+
+    def generate_chat_title(self, first_message: str, character_name: str, usage: Optional[Dict] = None) -> str:
+        words = first_message.split()[:4]
+        if len(words) > 0:
+            return ' '.join(words) + "..."
+        else:
+            return f"Chat dengan {character_name}"
+
+
+class FakeGenerator(ResponseGenerator):
+    """Deterministic replies with a fixed latency"""
+
+    name = 'fake'
+
+    def __init__(self, latency_ms=None):
+        latency_ms = latency_ms if latency_ms is not None else float(os.getenv('FAKE_GENERATOR_LATENCY_MS', 0))
+        self.latency = latency_ms / 1000
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _count(usage, prompt, completion):
+        # Token-like counts so usage accounting can be exercised offline
+        if usage is not None:
+            usage.update(prompt_tokens=len(prompt) // 4 + 1, completion_tokens=len(completion) // 4 + 1)
+
+    def generate_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None, usage: Optional[Dict] = None, history_total: Optional[int] = None) -> str:
+        self._wait()
+        digest = hashlib.sha1(f"{character_name}|{len(chat_history or [])}|{user_message}".encode('utf-8')).hexdigest()[:8]
+        reply = f"[{character_name or 'Fake'} #{digest}] {user_message}"
+        self._count(usage, user_message, reply)
+        return reply
+
+    def stream_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None) -> Iterator[str]:
+        words = self.generate_response(user_message, character_personality, chat_history, character_name).split(' ')
+        for index, word in enumerate(words):
+            yield word if index == len(words) - 1 else word + ' '
+
+    def generate_chat_title(self, first_message: str, character_name: str, usage: Optional[Dict] = None) -> str:
+        self._wait()
+        title = f"Chat dengan {character_name}"
+        self._count(usage, first_message, title)
+        return title
+
+
+def _openai_generator():
+    # Imported on demand: the OpenAI client is only needed when selected
+    from .openai_service import OpenAIGenerator
+    return OpenAIGenerator()
+
+
+_registry = {
+    'openai': _openai_generator,
+    'fallback': FallbackGenerator,
+    'fake': FakeGenerator
+}
+
+
+def register_generator(name, factory):
+    """Make ``factory`` (a zero-argument callable) selectable as ``name``"""
+    _registry[name] = factory
+
+
+def create_generator(name=None) -> ResponseGenerator:
+    name = name or os.getenv('RESPONSE_GENERATOR', 'openai')
+    if name not in _registry:
+        raise ValueError(f"Unknown response generator '{name}' (choose from {', '.join(sorted(_registry))})")
+    generator = _registry[name]()
+    print(f"💬 Response generator: {generator.name}")
+    return generator
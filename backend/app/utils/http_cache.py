@@ -0,0 +1,62 @@
+from flask import request, make_response
+from datetime import timezone
+import hashlib
+import threading
+
+# Authenticated data: browsers may keep it, shared caches may not
+REVALIDATE = 'private, no-cache'
+
+_lock = threading.Lock()
+_counts = {"not_modified": 0, "full": 0}
+
+
+def make_etag(*parts):
+    """Weak ETag over the version parts of a resource"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _http_time(moment):
+    # Stored timestamps are naive UTC; HTTP dates have whole seconds
+    return moment.replace(tzinfo=timezone.utc, microsecond=0) if moment else None
+
+
+def _count(outcome):
+    with _lock:
+        _counts[outcome] += 1
+
+
+def not_modified(etag, last_modified=None, cache_control=REVALIDATE):
+    """A 304 response if the client's copy is current, else None.
+
+    Checked before any formatting work. ``If-None-Match`` wins over
+    ``If-Modified-Since`` when both are sent.
+    """
+    last_modified = _http_time(last_modified)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag.removeprefix('W/').strip('"'))
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    _count("not_modified")
+    response = make_response('', 304)
+    return with_validators(response, etag, last_modified, cache_control, counted=True)
+
+
+def with_validators(response, etag, last_modified=None, cache_control=REVALIDATE, counted=False):
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control
+    if last_modified:
+        response.last_modified = _http_time(last_modified)
+    if not counted:
+        _count("full")
+    return response
+
+
+def stats():
+    with _lock:
+        return dict(_counts)
@@ -0,0 +1,460 @@
+"""Latency-aware routing over several OpenAI-compatible chat endpoints.
+
+Backends come from ``LLM_BACKENDS``, a JSON list such as::
+
+    [{"name": "primary", "api_key_env": "OPENAI_API_KEY", "model": "gpt-3.5-turbo",
+      "fast_model": "gpt-4o-mini"},
+     {"name": "secondary", "base_url": "https://llm.example.com/v1",
+      "api_key_env": "SECONDARY_API_KEY", "model": "llama-3-8b-instruct"}]
+
+Without it, the single OpenAI backend of ``OPENAI_API_KEY`` is used.
+
+Each request goes to the healthiest backend first. If it has not answered
+within the ``LLM_HEDGE_PERCENTILE`` of that backend's recent latencies,
+the same request is sent to the next backend and the first answer wins;
+the other one is closed mid-stream. Failures fail over to the next backend
+right away. ``light`` requests (titles, short messages) use a backend's
+``fast_model`` when one is configured.
+
+Completions report token usage from the final stream chunk; set
+``"stream_usage": false`` on backends that reject ``stream_options``, and
+usage is then estimated from the text length.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque, namedtuple
+from openai import OpenAI
+import httpx
+import threading
+import json
+import time
+import os
+
+
+# One finished completion; usage holds prompt_tokens and completion_tokens
+Completion = namedtuple('Completion', ['text', 'usage', 'backend', 'model'])
+
+
+def estimate_usage(messages, text):
+    """Rough token counts (about 4 characters per token) for endpoints that report none"""
+    prompt = sum(len(message.get('content') or '') for message in messages)
+    return {"prompt_tokens": prompt // 4 + 1, "completion_tokens": len(text) // 4 + 1, "estimated": True}
+
+
+class Cancelled(Exception):
+    """Another backend answered first"""
+
+
+def add_usage(*usages):
+    """Token counts of several attempts added up; estimated if any part was"""
+    total = {"prompt_tokens": 0, "completion_tokens": 0}
+    for usage in usages:
+        total["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        total["completion_tokens"] += usage.get("completion_tokens", 0)
+        if usage.get("estimated"):
+            total["estimated"] = True
+    return total
+
+
+class CancelToken:
+    """Shared by the racing attempts of one request; cancelling closes their
+    streams. Attempts that do not win charge the tokens they used to it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._closers = []
+        self._spent = []
+
+    def charge(self, usage):
+        with self._lock:
+            self._spent.append(usage)
+
+    def spent(self):
+        with self._lock:
+            return list(self._spent)
+
+    def is_set(self):
+        return self._cancelled
+
+    def on_cancel(self, closer):
+        with self._lock:
+            if not self._cancelled:
+                self._closers.append(closer)
+                return
+        closer()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except Exception:
+                pass
+
+
+class BackendStats:
+    """Rolling latency and error rate of one backend"""
+
+    def __init__(self, window):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    def record(self, latency=None, ok=True):
+        with self._lock:
+            self.requests += 1
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def record_cancel(self):
+        with self._lock:
+            self.cancelled += 1
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def percentile(self, p):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+    def error_rate(self):
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def snapshot(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        with self._lock:
+            counts = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "wins": self.wins,
+                "cancelled": self.cancelled
+            }
+        return dict(
+            counts,
+            error_rate=round(self.error_rate(), 3),
+            p50_ms=round(p50 * 1000) if p50 is not None else None,
+            p95_ms=round(p95 * 1000) if p95 is not None else None
+        )
+
+
+class LLMBackend:
+    def __init__(self, name, model, api_key, base_url=None, fast_model=None, timeout=30, window=200, stream_usage=True):
+        self.name = name
+        # Ask for token usage in the final stream chunk (not every endpoint supports it)
+        self.stream_usage = stream_usage
+        self.model = model
+        self.fast_model = fast_model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.stats = BackendStats(window)
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # HTTP connection pools do not survive a fork; one client per process
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0,  # The router retries on another backend instead
+                        http_client=httpx.Client(timeout=self.timeout)
+                    )
+                    self._pid = pid
+        return self._client
+
+    def model_for(self, kind):
+        return self.fast_model if kind == 'light' and self.fast_model else self.model
+
+    def stream(self, messages, kind, params):
+        """Yield the pieces of one completion as they arrive"""
+        started = time.monotonic()
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_for(kind),
+                messages=messages,
+                stream=True,
+                **params
+            )
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+        except GeneratorExit:
+            self.stats.record_cancel()
+            raise
+        except Exception:
+            self.stats.record(ok=False)
+            raise
+        self.stats.record(time.monotonic() - started)
+
+    def complete(self, messages, kind, params, cancelled):
+        """Stream one completion, giving up as soon as ``cancelled`` is set"""
+        started = time.monotonic()
+        model = self.model_for(kind)
+        usage = None
+        if self.stream_usage:
+            params = dict(params, stream_options={"include_usage": True})
+        parts = []
+        stream = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **params
+            )
+            # Closing the response from the router thread aborts the upstream request
+            cancelled.on_cancel(stream.close)
+            try:
+                for chunk in stream:
+                    if cancelled.is_set():
+                        raise Cancelled(self.name)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                    if getattr(chunk, 'usage', None):
+                        usage = {
+                            "prompt_tokens": chunk.usage.prompt_tokens,
+                            "completion_tokens": chunk.usage.completion_tokens
+                        }
+            finally:
+                stream.close()
+        except Cancelled:
+            self.stats.record_cancel()
+            cancelled.charge(usage or estimate_usage(messages, ''.join(parts)))
+            raise
+        except Exception:
+            if stream is not None:
+                # The request was accepted, so its prompt (and any output) is billed
+                cancelled.charge(usage or estimate_usage(messages, ''.join(parts)))
+            if cancelled.is_set():
+                self.stats.record_cancel()
+                raise Cancelled(self.name)
+            self.stats.record(ok=False)
+            raise
+        self.stats.record(time.monotonic() - started)
+        text = ''.join(parts)
+        return Completion(text, usage or estimate_usage(messages, text), self.name, model)
+
+
+def backends_from_env():
+    window = int(os.getenv('LLM_STATS_WINDOW', 200))
+    timeout = float(os.getenv('LLM_TIMEOUT_SECONDS', 30))
+    configured = os.getenv('LLM_BACKENDS')
+    if configured:
+        specs = json.loads(configured)
+    else:
+        specs = [{
+            "name": "openai",
+            "api_key_env": "OPENAI_API_KEY",
+            "model": os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            "fast_model": os.getenv('OPENAI_FAST_MODEL')
+        }]
+
+    backends = []
+    for spec in specs:
+        api_key = spec.get('api_key') or os.getenv(spec.get('api_key_env', ''), '')
+        if not api_key or api_key == 'your_openai_api_key_here':
+            continue
+        backends.append(LLMBackend(
+            spec.get('name') or spec['model'],
+            spec['model'],
+            api_key,
+            base_url=spec.get('base_url'),
+            fast_model=spec.get('fast_model'),
+            timeout=spec.get('timeout', timeout),
+            window=window,
+            stream_usage=spec.get('stream_usage', True)
+        ))
+    return backends
+
+
+class LLMRouter:
+    def __init__(self, backends, hedge_percentile=None, hedge_min_ms=None, hedge_default_ms=None,
+                 max_error_rate=None, max_inflight=None):
+        self.backends = list(backends)
+        self.hedge_percentile = float(hedge_percentile or os.getenv('LLM_HEDGE_PERCENTILE', 95))
+        self.hedge_min = float(hedge_min_ms or os.getenv('LLM_HEDGE_MIN_MS', 300)) / 1000
+        # Until a backend has latency samples
+        self.hedge_default = float(hedge_default_ms or os.getenv('LLM_HEDGE_DEFAULT_MS', 4000)) / 1000
+        self.max_error_rate = float(max_error_rate if max_error_rate is not None else os.getenv('LLM_MAX_ERROR_RATE', 0.5))
+        self.max_inflight = int(max_inflight or os.getenv('LLM_MAX_INFLIGHT', 32))
+        # How long a reply waits for cancelled attempts to report their tokens
+        self.cancel_grace = float(os.getenv('LLM_CANCEL_GRACE_MS', 100)) / 1000
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._hedges = 0
+        self._failovers = 0
+        self._deadlines = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(backends_from_env())
+
+    @property
+    def available(self):
+        return bool(self.backends)
+
+    @property
+    def pool(self):
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            with self._lock:
+                if self._pool is None or self._pid != pid:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix='llm')
+                    self._pid = pid
+        return self._pool
+
+    def ranked(self):
+        """Healthy backends first, then by median latency; config order breaks ties"""
+        def rank(indexed):
+            index, backend = indexed
+            p50 = backend.stats.percentile(50)
+            unhealthy = backend.stats.error_rate() > self.max_error_rate
+            return (unhealthy, p50 if p50 is not None else 0.0, index)
+        return [backend for _, backend in sorted(enumerate(self.backends), key=rank)]
+
+    def hedge_delay(self, backend):
+        latency = backend.stats.percentile(self.hedge_percentile)
+        return max(self.hedge_min, latency if latency is not None else self.hedge_default)
+
+    def _spent(self, messages, cancelled, in_flight):
+        """Tokens of every attempt that did not win, once the cancelled ones stopped"""
+        cancelled.cancel()
+        if in_flight:
+            wait(in_flight, timeout=self.cancel_grace)
+        # Attempts still unwinding are charged their prompt
+        unwinding = [estimate_usage(messages, '') for future in in_flight if not future.done()]
+        return cancelled.spent() + unwinding
+
+    def complete(self, messages, kind='chat', deadline=None, **params):
+        """The first successful ``Completion`` across backends.
+
+        Its ``usage`` includes the tokens of hedged and failed attempts, so
+        accounting sees everything the request cost. With ``deadline``
+        (seconds) the whole call, hedges and failovers included, gives up
+        with ``TimeoutError`` once it is spent. An error raised once every
+        attempt failed carries their tokens as ``usage``.
+        """
+        if not self.backends:
+            raise RuntimeError("No LLM backend configured")
+
+        candidates = self.ranked()
+        cancelled = CancelToken()
+        in_flight = {}
+        hedged = False
+        last_error = None
+        expires = time.monotonic() + deadline if deadline else None
+
+        def launch(backend):
+            future = self.pool.submit(backend.complete, messages, kind, params, cancelled)
+            in_flight[future] = backend
+
+        launch(candidates.pop(0))
+        try:
+            while in_flight:
+                timeout = None
+                if candidates and not hedged:
+                    timeout = self.hedge_delay(next(iter(in_flight.values())))
+                if expires is not None:
+                    remaining = expires - time.monotonic()
+                    if remaining <= 0:
+                        with self._lock:
+                            self._deadlines += 1
+                        last_error = TimeoutError(f"LLM call exceeded its {deadline}s deadline")
+                        break
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    if candidates and not hedged and (expires is None or time.monotonic() < expires):
+                        # The first backend is slower than usual: race a second one
+                        hedged = True
+                        with self._lock:
+                            self._hedges += 1
+                        launch(candidates.pop(0))
+                    continue
+
+                for future in done:
+                    backend = in_flight.pop(future)
+                    try:
+                        completion = future.result()
+                    except Exception as e:
+                        print(f"LLM backend '{backend.name}' failed: {e}")
+                        last_error = e
+                        continue
+                    backend.stats.record_win()
+                    spent = self._spent(messages, cancelled, in_flight)
+                    if spent:
+                        completion = completion._replace(usage=add_usage(completion.usage, *spent))
+                    return completion
+
+                if not in_flight and candidates:
+                    with self._lock:
+                        self._failovers += 1
+                    launch(candidates.pop(0))
+        finally:
+            cancelled.cancel()
+        spent = self._spent(messages, cancelled, in_flight)
+        if spent:
+            last_error.usage = add_usage(*spent)
+        raise last_error
+
+    def stream(self, messages, kind='chat', **params):
+        """Pieces of a completion from the best backend, failing over until the first piece.
+
+        Streams are not hedged: once text has reached the caller it cannot
+        be swapped for another backend's.
+        """
+        if not self.backends:
+            raise RuntimeError("No LLM backend configured")
+
+        last_error = None
+        for backend in self.ranked():
+            if last_error is not None:
+                with self._lock:
+                    self._failovers += 1
+            started = False
+            try:
+                for piece in backend.stream(messages, kind, params):
+                    started = True
+                    yield piece
+            except Exception as e:
+                if started:
+                    raise
+                print(f"LLM backend '{backend.name}' failed: {e}")
+                last_error = e
+                continue
+            backend.stats.record_win()
+            return
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            totals = {"hedges": self._hedges, "failovers": self._failovers, "deadlines_exceeded": self._deadlines}
+        totals["backends"] = {backend.name: backend.stats.snapshot() for backend in self.backends}
+        return totals
@@ -0,0 +1,19 @@
+"""Process-local registry of metric collectors exposed through the admin API"""
+
+_collectors = {}
+
+
+def register_metrics(name, collector):
+    """Register a zero-argument callable returning a JSON-serializable snapshot"""
+    _collectors[name] = collector
+
+
+def collect_metrics():
+    snapshot = {}
+    for name, collector in _collectors.items():
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            print(f"Metrics collector '{name}' failed: {e}")
+            snapshot[name] = None
+    return snapshot
@@ -0,0 +1,46 @@
+from flask import Response
+import json
+import zlib
+
+# Send roughly this much per chunk so the client sees steady progress
+CHUNK_BYTES = 64 * 1024
+
+
+def ndjson_chunks(records, compress=False, level=6):
+    """Encode records as NDJSON lines, yielding about ``CHUNK_BYTES`` at a time.
+
+    With ``compress`` the output is one gzip stream, flushed at every chunk
+    so nothing but the current chunk is ever held in memory.
+    """
+    encoder = zlib.compressobj(level, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            data = b''.join(buffer)
+            buffer, size = [], 0
+            yield encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH) if encoder else data
+
+    data = b''.join(buffer)
+    if encoder:
+        yield encoder.compress(data) + encoder.flush()
+    elif data:
+        yield data
+
+
+def ndjson_response(records, filename, compress=False):
+    """Streaming download of ``records``; gzip is the file format, not a transfer encoding"""
+    if compress:
+        filename += '.gz'
+    return Response(
+        ndjson_chunks(records, compress),
+        mimetype='application/gzip' if compress else 'application/x-ndjson',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
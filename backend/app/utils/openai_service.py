@@ -1,43 +1,34 @@
-from openai import OpenAI
+from .generators import FallbackGenerator
+from .llm_router import LLMRouter
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import os
-from typing import Dict, List, Optional
-import json
-
-class OpenAIService:
-    def __init__(self):
-        self.client = None
-        self.api_available = False
-        self.model = "gpt-3.5-turbo"
-        
-        try:
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key or api_key == 'your_openai_api_key_here':
-                print("⚠️ OpenAI API key not configured")
-                print("🔄 Using intelligent fallback responses")
-                return
-            
-            # Simple, clean OpenAI client initialization
-            self.client = OpenAI(api_key=api_key)
-            
-            # Test the API with minimal request
-            test_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Hi"}],
-                max_tokens=5
-            )
-            
-            self.api_available = True
-            print("✅ OpenAI API connected successfully!")
-            
-        except Exception as e:
-            print(f"⚠️ OpenAI API initialization failed: {e}")
-            print("🔄 Using intelligent fallback responses")
-            self.api_available = False
+from typing import Dict, Iterator, List, Optional
 
-    def create_character_prompt(self, character_personality: str, chat_history: Optional[List[Dict]] = None) -> str:
-        """Create a system prompt based on character personality and chat history"""
-        
-        base_prompt = f"""
+# Sampling for character replies: short, lively and not repetitive
+REPLY_PARAMS = {
+    "max_tokens": 500,
+    "temperature": 0.9,
+    "top_p": 0.95,
+    "frequency_penalty": 0.6,
+    "presence_penalty": 0.6
+}
+
+# Served instead of a rule-based reply under LLM_FALLBACK_POLICY=apology
+APOLOGY = "Maaf, aku lagi ada gangguan nih. Coba chat lagi ya! 😅"
+
+TITLE_PROMPT = "Generate a short, descriptive chat title (max 5 words) in Indonesian based on the user's message. Only return the title, nothing else."
+
+
+# Stored sender types as chat roles; admin takeover replies speak as the character
+ROLES = {"user": "user", "ai": "assistant", "admin": "assistant"}
+
+
+@lru_cache(maxsize=64)
+def character_system_prompt(character_personality: str) -> str:
+    """Static instructions for a character; must not vary between turns"""
+    return f"""
 {character_personality}
 
 ATURAN PENTING:
@@ -53,137 +44,197 @@ ATURAN PENTING:
 
 Ingat: Chat ini harus terasa kayak chat WhatsApp dengan orang deket, BUKAN customer service!
 """
+
+
+class OpenAIGenerator(FallbackGenerator):
+    """Replies from the configured LLM backends, rule-based when they are unavailable"""
+
+    name = 'openai'
+
+    def __init__(self, router=None):
+        self.router = router or LLMRouter.from_env()
+        self.api_available = self.router.available
+        # Messages this short are answered by the backends' fast models
+        self.short_message_chars = int(os.getenv('LLM_SHORT_MESSAGE_CHARS', 40))
+        self.batch_concurrency = int(os.getenv('LLM_BATCH_CONCURRENCY', 8))
+        # At most this many earlier messages are sent along with each new one
+        self.history_messages = int(os.getenv('LLM_HISTORY_MESSAGES', 16))
+        # Upper bound on one reply or title, hedges and failovers included
+        self.reply_deadline = float(os.getenv('LLM_DEADLINE_SECONDS', 15))
+        self.title_deadline = float(os.getenv('LLM_TITLE_DEADLINE_SECONDS', 5))
+        # What to answer when the backends are down: rules or apology
+        self.fallback_policy = os.getenv('LLM_FALLBACK_POLICY', 'rules')
+        # An outage is skipped in milliseconds. Titles have their own
+        # breaker: their short deadline must not open the circuit for replies
+        self.breaker = self._breaker('llm')
+        self.title_breaker = self._breaker('llm-title')
         
-        # Add recent conversation context if available
-        if chat_history and len(chat_history) > 0:
-            base_prompt += "\n\nRecent conversation context:\n"
-            for msg in chat_history[-5:]:  # Only use last 5 messages for context
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                base_prompt += f"{role}: {content}\n"
-        
-        return base_prompt
+        if self.api_available:
+            names = ', '.join(backend.name for backend in self.router.backends)
+            print(f"✅ LLM backends configured: {names}")
+        else:
+            print("⚠️ OpenAI API key not configured")
+            print("🔄 Using intelligent fallback responses")
+
+    @staticmethod
+    def _breaker(name):
+        return CircuitBreaker(
+            name,
+            failure_rate=float(os.getenv('LLM_BREAKER_FAILURE_RATE', 0.5)),
+            min_calls=int(os.getenv('LLM_BREAKER_MIN_CALLS', 10)),
+            window=int(os.getenv('LLM_BREAKER_WINDOW', 20)),
+            open_seconds=float(os.getenv('LLM_BREAKER_OPEN_SECONDS', 30)),
+            half_open_calls=int(os.getenv('LLM_BREAKER_HALF_OPEN_CALLS', 1))
+        )
 
-    def generate_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None) -> str:
-        """Generate AI response using OpenAI API or intelligent fallback"""
+    def create_character_prompt(self, character_personality: str) -> str:
+        """The character's system prompt; built once per personality and reused"""
+        return character_system_prompt(character_personality)
+
+    def history_start(self, total):
+        """Position of the oldest message sent when ``total`` earlier messages exist.
+
+        The window does not slide by one message per turn: once it holds
+        more than ``history_messages``, the oldest half is dropped at once.
+        The start only moves every ``history_messages // 2`` messages, so
+        the history part of the prompt prefix stays byte-identical over
+        several turns and remains cacheable along with the system prompt.
+        """
+        if total <= self.history_messages:
+            return 0
+        block = max(self.history_messages // 2, 1)
+        return -(-(total - self.history_messages) // block) * block
+
+    def _history(self, chat_history, user_message, history_total=None):
+        """Earlier turns as chat messages, oldest first"""
+        history = list(chat_history or [])
+        # Callers may include the message being answered; it is sent last anyway
+        if history and history[-1].get('sender_type') == 'user' and history[-1].get('content') == user_message:
+            history.pop()
+        if not self.history_messages:
+            return []
+        # Absolute position of history[0] in the conversation
+        total = max(history_total or 0, len(history))
+        offset = total - len(history)
+        turns = []
+        for msg in history[max(self.history_start(total) - offset, 0):]:
+            content = msg.get('content')
+            if content:
+                turns.append({"role": ROLES.get(msg.get('sender_type'), 'user'), "content": content})
+        return turns
+
+    def _messages(self, user_message, character_personality, chat_history, history_total=None):
+        # The system prompt is byte-identical for every turn with this
+        # character, and the history only changes at its start every few
+        # turns, so the provider can reuse its cached prefix
+        return (
+            [{"role": "system", "content": self.create_character_prompt(character_personality)}]
+            + self._history(chat_history, user_message, history_total)
+            + [{"role": "user", "content": user_message}]
+        )
+
+    def _kind(self, user_message):
+        return 'light' if len(user_message) <= self.short_message_chars else 'chat'
+
+    def _fallback(self, user_message, character_personality, character_name):
+        if self.fallback_policy == 'apology':
+            return APOLOGY
+        return self.get_intelligent_fallback(user_message, character_personality, character_name)
+
+    def generate_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None, usage: Optional[Dict] = None, history_total: Optional[int] = None) -> str:
+        """Generate AI response using the LLM backends or intelligent fallback"""
         
-        if not self.api_available or not self.client:
-            return self.get_intelligent_fallback(user_message, character_personality, character_name)
+        if not self.api_available:
+            return self._fallback(user_message, character_personality, character_name)
         
         try:
-            system_prompt = self.create_character_prompt(character_personality, chat_history)
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,  # Shorter, more natural responses
-                temperature=0.9,  # More creative and natural
-                top_p=0.95,
-                frequency_penalty=0.6,  # Avoid repetitive patterns
-                presence_penalty=0.6    # Encourage varied vocabulary
+            completion = self.breaker.call(
+                self.router.complete,
+                self._messages(user_message, character_personality, chat_history, history_total),
+                kind=self._kind(user_message),
+                deadline=self.reply_deadline,
+                **REPLY_PARAMS
             )
+            if usage is not None:
+                usage.update(completion.usage)
+            content = completion.text.strip()
+            return content or self._fallback(user_message, character_personality, character_name)
             
-            content = response.choices[0].message.content
-            return content.strip() if content else self.get_intelligent_fallback(user_message, character_personality, character_name)
-            
+        except CircuitOpen:
+            return self._fallback(user_message, character_personality, character_name)
         except Exception as e:
             print(f"OpenAI API Error: {e}")
-            return self.get_intelligent_fallback(user_message, character_personality, character_name)
+            if usage is not None and getattr(e, 'usage', None):
+                # Attempts that failed after being accepted still cost tokens
+                usage.update(e.usage)
+            return self._fallback(user_message, character_personality, character_name)
 
-    def get_intelligent_fallback(self, user_message: str, character_personality: str, character_name: Optional[str] = None) -> str:
-        """Intelligent fallback responses when OpenAI API is not available"""
-        
-        user_msg_lower = user_message.lower()
-        character_name = character_name or "Sahabat Setia"
-        
-        # Math and academic subjects
-        if any(word in user_msg_lower for word in ['matematika', 'math', 'aljabar', 'geometry', 'kalkulus', 'trigonometri', 'statistik']):
-            if character_name == "Guru Motivator":
-                return f"Wah {user_message} ya! 📚 Oke deh, guru jelasin dari dasar. Sebenernya ini gampang kok kalau udah ngerti konsepnya. Mana nih yang bikin bingung?"
-            else:
-                return f"Math ya? {user_message} emang tricky sih 🤔 Tapi tenang, gue bantuin. Mulai dari mana nih?"
+    def stream_response(self, user_message: str, character_personality: str, chat_history: Optional[List[Dict]] = None, character_name: Optional[str] = None) -> Iterator[str]:
+        if not self.api_available or not self.breaker.allow():
+            yield self._fallback(user_message, character_personality, character_name)
+            return
         
-        # Science subjects
-        elif any(word in user_msg_lower for word in ['fisika', 'physics', 'kimia', 'chemistry', 'biologi', 'biology']):
-            if character_name == "Guru Motivator":
-                return f"{user_message}? Seru tuh! 🔬 Science emang keren banget. Oke guru jelasin ya, yang mana dulu nih yang pengen tau?"
-            else:
-                return f"Science! {user_message} nih ya? Cool topic 🧪 Ada yang spesifik yang mau dibahas?"
-        
-        # Questions and curiosity
-        elif any(word in user_msg_lower for word in ['apa', 'what', 'bagaimana', 'how', 'kenapa', 'why']):
-            if character_name == "Guru Motivator":
-                return f"Good question! Tentang {user_message}, coba kita bahas bareng ya 🤔 Kamu udah tau dasarnya belum?"
-            elif character_name == "Papa Pelindung":
-                return f"Anak papa nanya bagus nih 💪 Soal {user_message}, papa jelasin ya. Dengerin baik-baik"
-            elif character_name == "Pacar Romantis":
-                return f"Sayang nanya {user_message}? 💕 Oke deh baby, aku jelasin. Dengerin ya~"
-            else:
-                return f"Oh {user_message} ya? Interesting nih 🤔 Gue coba jelasin deh"
-        
-        # Learning and study  
-        elif any(word in user_msg_lower for word in ['belajar', 'study', 'tugas', 'pr', 'homework', 'ujian', 'exam']):
-            if character_name == "Guru Motivator":
-                return f"Belajar {user_message} ya? 📚 Oke, guru punya tips nih biar lebih gampang. Udah sampai mana?"
-            else:
-                return f"Lagi {user_message}? Semangat! 💪 Butuh bantuan apa nih?"
-        
-        # Emotional support
-        elif any(word in user_msg_lower for word in ['sedih', 'sad', 'stress', 'capek', 'tired', 'bosan', 'galau']):
-            if character_name == "Mama Penyayang":
-                return f"Sayang kok {user_message}? 🤱 Cerita sama mama apa yang bikin gitu. Mama dengerin kok 💕"
-            elif character_name == "Papa Pelindung":
-                return f"{user_message} ya nak? 💪 Gapapa, papa ngerti kok. Coba cerita kenapa?"
-            elif character_name == "Pacar Romantis":
-                return f"Baby kok {user_message}? 💕 Sini cerita sama aku. I'm here for you sayang ❤️"
-            else:
-                return f"Eh {user_message} kenapa? 🤗 Yuk cerita, mungkin bisa bantuin"
-        
-        # Default responses
-        else:
-            if character_name == "Guru Motivator":
-                return f"Oh {user_message} ya? 📚 Menarik nih! Guru suka bahas hal-hal gini. Kamu pengen tau apa spesifiknya?"
-            elif character_name == "Pacar Romantis":
-                return f"Sayang ngomong {user_message}? 💕 Cute banget sih. Cerita lebih dong baby~"
-            elif character_name == "Mama Penyayang":
-                return f"Anak mama cerita soal {user_message} ya? 🤱 Mama seneng dengerin. Lanjut dong ceritanya"
-            elif character_name == "Papa Pelindung":
-                return f"Hmm {user_message} ya nak? 💪 Papa dengerin. Gimana cerita lengkapnya?"
-            elif character_name == "Sahabat Setia":
-                return f"Loh {user_message}? 😎 Seru tuh! Spill dong detailnya bro"
-            else:  # Kakak Kece
-                return f"Dek! {user_message} ya? 🌈 Kakak interested nih. Cerita lebih lanjut dong!"
-
-    def generate_chat_title(self, first_message: str, character_name: str) -> str:
+        sent = False
+        try:
+            for piece in self.router.stream(
+                self._messages(user_message, character_personality, chat_history),
+                kind=self._kind(user_message),
+                **REPLY_PARAMS
+            ):
+                sent = True
+                yield piece
+        except GeneratorExit:
+            # The reader went away; the backend itself was fine
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            print(f"OpenAI API Error: {e}")
+            self.breaker.record_failure()
+            if sent:
+                raise
+            yield self._fallback(user_message, character_personality, character_name)
+            return
+        self.breaker.record_success()
+        if not sent:
+            yield self._fallback(user_message, character_personality, character_name)
+
+    def generate_batch(self, requests: List[Dict]) -> List[str]:
+        if not requests:
+            return []
+        # Concurrent calls; each one still hedges on its own
+        with ThreadPoolExecutor(max_workers=min(len(requests), self.batch_concurrency)) as pool:
+            return list(pool.map(lambda request: self.generate_response(**request), requests))
+
+    def generate_chat_title(self, first_message: str, character_name: str, usage: Optional[Dict] = None) -> str:
         """Generate a chat title based on the first message"""
         
-        # Try to use OpenAI to generate title
-        if self.api_available and self.client:
+        if self.api_available:
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "Generate a short, descriptive chat title (max 5 words) in Indonesian based on the user's message. Only return the title, nothing else."},
+                completion = self.title_breaker.call(
+                    self.router.complete,
+                    [
+                        {"role": "system", "content": TITLE_PROMPT},
                         {"role": "user", "content": first_message}
                     ],
+                    kind='light',
+                    deadline=self.title_deadline,
                     max_tokens=20,
                     temperature=0.7
                 )
-                
-                title = response.choices[0].message.content.strip()
+                if usage is not None:
+                    usage.update(completion.usage)
+                title = completion.text.strip()
                 if title:
                     return title
+            except CircuitOpen:
+                pass
             except Exception as e:
                 print(f"Error generating title: {e}")
+                if usage is not None and getattr(e, 'usage', None):
+                    usage.update(e.usage)
         
-        # Fallback: Generate simple title
-        words = first_message.split()[:4]
-        if len(words) > 0:
-            return ' '.join(words) + "..."
-        else:
-            return f"Chat dengan {character_name}"
\ No newline at end of file
+        return super().generate_chat_title(first_message, character_name)
+
+    def stats(self):
+        return dict(super().stats(), breaker=self.breaker.stats(), title_breaker=self.title_breaker.stats(),
+                    **self.router.stats())
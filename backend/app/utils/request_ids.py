@@ -0,0 +1,32 @@
+from flask import g, request, has_request_context
+from uuid import uuid4
+import re
+from ..models.slow_ops import request_context
+
+HEADER = 'X-Request-ID'
+# Ids from a proxy are kept when they look like ids, not arbitrary text
+VALID_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def init_request_ids(app):
+    """Give every request an id, taken from ``X-Request-ID`` or generated, and echo it back"""
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(HEADER, '')
+        g.request_id = incoming if VALID_ID.match(incoming) else uuid4().hex[:16]
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[HEADER] = request_id
+        return response
+
+
+def current_context():
+    """Route pattern and request id of the current request, for slow op records"""
+    if not has_request_context():
+        return request_context()
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return {'route': f"{request.method} {rule}", 'request_id': g.get('request_id')}
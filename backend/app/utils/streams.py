@@ -0,0 +1,44 @@
+import threading
+import os
+
+
+class StreamSlots:
+    """Caps the Server-Sent Events streams one worker process keeps open.
+
+    A stream holds a worker thread for up to its ``*_STREAM_SECONDS``, so
+    streams may only take ``MAX_STREAMS_PER_WORKER`` threads (default: all
+    but ``STREAM_RESERVED_THREADS``) and ordinary requests keep the rest.
+    With one thread per worker (sync workers) no stream is accepted; clients
+    use the long-poll endpoints instead.
+    """
+
+    def __init__(self, threads=None):
+        self._lock = threading.Lock()
+        self._open = 0
+        self._rejected = 0
+        self.configure(threads)
+
+    def configure(self, threads=None):
+        threads = threads or int(os.getenv('GUNICORN_THREADS', 8))
+        reserved = int(os.getenv('STREAM_RESERVED_THREADS', 2))
+        self.limit = int(os.getenv('MAX_STREAMS_PER_WORKER', max(threads - reserved, 0)))
+
+    def acquire(self):
+        """True if a stream may open; the caller must ``release`` it once closed"""
+        with self._lock:
+            if self._open >= self.limit:
+                self._rejected += 1
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._open = max(self._open - 1, 0)
+
+    def stats(self):
+        with self._lock:
+            return {"open": self._open, "limit": self.limit, "rejected": self._rejected}
+
+
+stream_slots = StreamSlots()
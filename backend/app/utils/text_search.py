@@ -0,0 +1,72 @@
+import re
+import unicodedata
+
+# Words too common in casual Indonesian chat to narrow a search down
+STOPWORDS = {
+    'yang', 'dan', 'di', 'ke', 'dari', 'ini', 'itu', 'aku', 'kamu', 'saya', 'dia',
+    'kita', 'kami', 'mereka', 'ada', 'apa', 'ya', 'ga', 'gak', 'nggak', 'tidak',
+    'juga', 'untuk', 'dengan', 'akan', 'sudah', 'udah', 'lagi', 'aja', 'saja',
+    'kok', 'sih', 'deh', 'dong', 'kan', 'nih', 'tuh', 'yg', 'dgn', 'utk', 'jadi',
+    'bisa', 'mau', 'karena', 'kalau', 'kalo', 'atau', 'tapi', 'pada', 'the', 'and'
+}
+
+# Particles and possessives glued onto Indonesian words ("rumahnya", "ayolah")
+SUFFIXES = ('nya', 'lah', 'kah', 'pun', 'ku', 'mu')
+
+WORD = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 64
+
+
+def _fold(text):
+    """Lowercase and strip accents so "Café" and "cafe" meet"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Distinct search terms of ``text``, in order of first appearance"""
+    terms = []
+    for word in WORD.findall(_fold(text or '')):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        term = normalize(word)
+        if term not in terms:
+            terms.append(term)
+            if len(terms) >= MAX_TERMS:
+                break
+    return terms
+
+
+def snippet(text, terms, width=160):
+    """A window of ``text`` around the first matching term, plus match offsets"""
+    text = text or ''
+    folded = _fold(text)
+    matches = []
+    for match in WORD.finditer(folded):
+        if normalize(match.group()) in terms:
+            matches.append((match.start(), match.end()))
+
+    # Folding can change lengths for some scripts; fall back to the start
+    if len(folded) != len(text):
+        matches = []
+
+    start = 0
+    if matches and matches[0][0] > width // 3:
+        start = max(0, matches[0][0] - width // 3)
+        # Do not cut a word in half
+        space = text.rfind(' ', 0, start)
+        start = space + 1 if space != -1 and start - space < 20 else start
+    end = min(len(text), start + width)
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    offset = len(prefix) - start
+    highlights = [[s + offset, e + offset] for s, e in matches if s >= start and e <= end]
+    return prefix + text[start:end] + suffix, highlights
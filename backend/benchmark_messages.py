@@ -0,0 +1,110 @@
+"""Compare the document and bucket message layouts on a scratch database.
+
+    python benchmark_messages.py --sessions 200 --messages 300
+
+For each layout this appends the same synthetic conversations one message
+at a time (insert throughput), then loads the newest 50 messages and the
+full history of every session (history load latency), and reports the
+collection and index sizes. The scratch database is dropped afterwards
+unless --keep is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.models.database import Database
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def conversation(session_id, length):
+    start = datetime.utcnow() - timedelta(days=1)
+    for index in range(length):
+        yield {
+            'chat_session_id': session_id,
+            'sender_type': 'user' if index % 2 == 0 else 'ai',
+            'content': 'x' * random.randint(20, 400),
+            'character_id': None,
+            'timestamp': start + timedelta(seconds=index)
+        }
+
+
+def benchmark(db, store, sessions, length):
+    session_ids = [ObjectId() for _ in range(sessions)]
+
+    started = time.perf_counter()
+    # Interleave sessions the way live traffic does
+    streams = [conversation(session_id, length) for session_id in session_ids]
+    for _ in range(length):
+        for stream in streams:
+            store.insert(next(stream))
+    insert_seconds = time.perf_counter() - started
+
+    recent, history = [], []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        store.newest(session_id, 50)
+        recent.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        store.oldest(session_id)
+        history.append((time.perf_counter() - started) * 1000)
+
+    try:
+        collection_stats = db.db.command('collStats', store.collection.name)
+        sizes = (collection_stats['storageSize'], collection_stats['totalIndexSize'], collection_stats['count'])
+    except Exception:
+        # Not every server (or test double) reports collection statistics
+        sizes = (None, None, store.collection.estimated_document_count())
+
+    return {
+        'inserts_per_second': sessions * length / insert_seconds,
+        'recent_p50_ms': statistics.median(recent),
+        'recent_p95_ms': percentile(recent, 0.95),
+        'history_p50_ms': statistics.median(history),
+        'history_p95_ms': percentile(history, 0.95),
+        'storage_bytes': sizes[0],
+        'index_bytes': sizes[1],
+        'documents': sizes[2]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=300, help='messages per session')
+    parser.add_argument('--database', default='aku_kesepian_benchmark')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database')
+    args = parser.parse_args()
+
+    db = Database(os.getenv('MONGODB_URI'), args.database)
+    results = {}
+    try:
+        for layout, store in db.message_stores.items():
+            print(f"⏱️  {layout}: {args.sessions} sessions x {args.messages} messages")
+            results[layout] = benchmark(db, store, args.sessions, args.messages)
+    finally:
+        if not args.keep:
+            db.client.drop_database(args.database)
+
+    print(f"\n{'':22}" + ''.join(f"{layout:>16}" for layout in results))
+    for metric in next(iter(results.values())):
+        row = ''
+        for values in results.values():
+            value = values[metric]
+            row += f"{'n/a':>16}" if value is None else f"{value:>16,.2f}" if isinstance(value, float) else f"{value:>16,}"
+        print(f"{metric:22}{row}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Gunicorn configuration, loaded automatically from the working directory.
+# Mirrors gunicorn.conf.json; command line flags (Procfile, startup.sh) still win.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+# Threaded workers: a Server-Sent Events stream (session events, admin feed)
+# holds one thread for up to its *_STREAM_SECONDS, not a whole worker.
+# The app caps streams per worker below the thread count (MAX_STREAMS_PER_WORKER)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = 600
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
+
+def _database(worker):
+    app = getattr(worker, 'wsgi', None)
+    extensions = getattr(app, 'extensions', {})
+    return extensions.get('database')
+
+
+def post_worker_init(worker):
+    # The app was imported in the master; open this worker's own pool now
+    app = getattr(worker, 'wsgi', None)
+    stream_slots = getattr(app, 'extensions', {}).get('stream_slots')
+    if stream_slots is not None:
+        stream_slots.configure(threads=worker.cfg.threads)
+    database = _database(worker)
+    if database is not None:
+        try:
+            database.on_worker_start(threads=worker.cfg.threads)
+        except Exception as e:
+            worker.log.warning(f"MongoDB warm-up failed: {e}")
+
+
+def worker_exit(server, worker):
+    database = _database(worker)
+    if database is not None:
+        database.on_worker_exit()
@@ -0,0 +1,320 @@
+"""Bulk import users, sessions and messages from NDJSON.
+
+    python import_conversations.py export.ndjson.gz
+    python import_conversations.py data.ndjson --threads 8 --batch-size 2000
+
+Reads the records written by the export endpoints (one JSON object per
+line with a ``type`` of user, session or message; plain or gzip). Records
+are written in unordered ``insert_many`` batches on a pool of threads
+while the file is still being read. Ids are kept, so re-running an import
+skips what is already there. Per-message bookkeeping is deferred: session
+counters are set from one aggregation per batch of sessions at the end,
+and the statistics rollups are reconciled once.
+
+Imported users are marked verified and get an unusable password; they
+sign in through the "forgot password" flow. A user whose email or username
+already belongs to another account is reported and not imported, and
+neither are their sessions and messages: users are written before any of
+their sessions is read further.
+"""
+import argparse
+import gzip
+import json
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import bcrypt
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.models.database import Database, user_name_keys
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+def object_id(value):
+    return ObjectId(value) if value else None
+
+
+class Importer:
+    def __init__(self, db, threads, batch_size, layout, index_search=True):
+        self.db = db
+        self.batch_size = batch_size
+        self.store = db.message_stores[layout]
+        self.layout = layout
+        self.index_search = index_search
+        # Never matches any password; users reset it by email
+        self.password_hash = bcrypt.hashpw(secrets.token_bytes(32), bcrypt.gensalt())
+
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        # Bound the batches in flight so memory stays flat on huge files
+        self.slots = threading.BoundedSemaphore(threads * 2)
+        self.lock = threading.Lock()
+        self.counts = {'users': 0, 'sessions': 0, 'messages': 0, 'skipped': 0, 'rejected': 0}
+        self.errors = []
+        self.conflicts = []
+        # Users whose email or username belongs to another account, and their sessions
+        self.rejected_users = set()
+        self.rejected_sessions = set()
+
+        self.pending = {'user': [], 'session': [], 'message': []}
+        # Owner and character per session, for search entries
+        self.sessions = {}
+
+    # ---- Record conversion ------------------------------------------------
+
+    def user(self, record):
+        user = {
+            '_id': ObjectId(record['id']),
+            'email': record['email'].lower(),
+            'username': record['username'],
+            'password_hash': self.password_hash,
+            'full_name': record.get('full_name') or record['username'],
+            # Verified on the source system; login refuses unverified accounts
+            'is_verified': True,
+            'is_admin': False,
+            'created_at': parse_time(record.get('created_at')),
+            'last_login': None,
+            'is_active': True,
+            'profile': {'bio': '', 'avatar': '', 'favorite_characters': []}
+        }
+        user['name_keys'] = user_name_keys(user)
+        return user
+
+    def session(self, record):
+        session = {
+            '_id': ObjectId(record['id']),
+            'user_id': ObjectId(record['user_id']),
+            'character_id': ObjectId(record['character_id']),
+            'title': record.get('title') or 'New Chat',
+            'created_at': parse_time(record.get('created_at')),
+            'updated_at': parse_time(record.get('updated_at') or record.get('created_at')),
+            'message_count': 0,
+            'storage': self.layout,
+            'is_active': record.get('is_active', True)
+        }
+        self.sessions[session['_id']] = {'user_id': session['user_id'], 'character_id': session['character_id']}
+        return session
+
+    def message(self, record):
+        return {
+            '_id': ObjectId(record['id']) if record.get('id') else ObjectId(),
+            'chat_session_id': ObjectId(record['session_id']),
+            'sender_type': record['sender_type'],
+            'content': record['content'],
+            'character_id': object_id(record.get('character_id')),
+            'timestamp': parse_time(record.get('timestamp'))
+        }
+
+    # ---- Writing --------------------------------------------------------
+
+    def _insert(self, collection, documents, kind):
+        try:
+            collection.insert_many(documents, ordered=False)
+            written = len(documents)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            # Already imported
+            written = e.details.get('nInserted', 0)
+            with self.lock:
+                self.counts['skipped'] += len(errors)
+        with self.lock:
+            self.counts[kind] += written
+
+    def _insert_users(self, users):
+        try:
+            self.db.users.insert_many(users, ordered=False)
+            written = len(users)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            written = e.details.get('nInserted', 0)
+            for error in errors:
+                user = users[error['index']]
+                if self.db.users.find_one({'_id': user['_id']}, {'_id': 1}):
+                    # Already imported
+                    self.counts['skipped'] += 1
+                else:
+                    self.rejected_users.add(user['_id'])
+                    self.conflicts.append(
+                        f"user {user['_id']}: email {user['email']} or username {user['username']} "
+                        f"belongs to another account"
+                    )
+        self.counts['users'] += written
+
+    def _flush_users(self):
+        """Write pending users on this thread, so their sessions know whether they were rejected"""
+        batch, self.pending['user'] = self.pending['user'], []
+        if not batch:
+            return
+        try:
+            self._insert_users(batch)
+        except Exception as e:
+            self.errors.append(str(e))
+
+    def _write_messages(self, messages):
+        if self.layout == 'documents':
+            self._insert(self.db.messages, messages, 'messages')
+        else:
+            by_session = {}
+            for message in messages:
+                by_session.setdefault(message['chat_session_id'], []).append(message)
+            written = 0
+            for session_id, group in by_session.items():
+                # Buckets have no unique key per message, so skip re-runs explicitly
+                existing = {m['_id'] for m in self.store.find(session_id, [m['_id'] for m in group])}
+                group = [m for m in group if m['_id'] not in existing]
+                self.store.load(session_id, group)
+                written += len(group)
+            with self.lock:
+                self.counts['messages'] += written
+                self.counts['skipped'] += len(messages) - written
+
+        if self.index_search:
+            entries = []
+            for message in messages:
+                session = self._session_context(message['chat_session_id'])
+                if session:
+                    entry = self.db.search.entry(message, session)
+                    if entry['terms']:
+                        entries.append(entry)
+            self.db.search.write(entries)
+
+    def _session_context(self, session_id):
+        if session_id not in self.sessions:
+            session = self.db.chat_sessions.find_one({'_id': session_id}, {'user_id': 1, 'character_id': 1})
+            with self.lock:
+                self.sessions[session_id] = session
+        return self.sessions[session_id]
+
+    def _run(self, task, *args):
+        try:
+            task(*args)
+        except Exception as e:
+            with self.lock:
+                self.errors.append(str(e))
+        finally:
+            self.slots.release()
+
+    def _submit(self, kind):
+        if kind == 'user':
+            self._flush_users()
+            return
+        batch, self.pending[kind] = self.pending[kind], []
+        if not batch:
+            return
+        self.slots.acquire()
+        if kind == 'session':
+            self.pool.submit(self._run, self._insert, self.db.chat_sessions, batch, 'sessions')
+        else:
+            self.pool.submit(self._run, self._write_messages, batch)
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in self.pending:
+            raise ValueError(f"Unknown record type: {kind}")
+        if kind == 'session':
+            self._flush_users()
+            if ObjectId(record['user_id']) in self.rejected_users:
+                self.rejected_sessions.add(ObjectId(record['id']))
+                self.counts['rejected'] += 1
+                return
+        elif kind == 'message' and ObjectId(record['session_id']) in self.rejected_sessions:
+            self.counts['rejected'] += 1
+            return
+        self.pending[kind].append(getattr(self, kind)(record))
+        if len(self.pending[kind]) >= self.batch_size:
+            self._submit(kind)
+
+    def finish(self):
+        for kind in self.pending:
+            self._submit(kind)
+        self.pool.shutdown(wait=True)
+
+    # ---- Deferred bookkeeping -----------------------------------------
+
+    def update_session_counters(self):
+        """Set message_count and updated_at of imported sessions in bulk"""
+        session_ids = list(self.sessions)
+        for start in range(0, len(session_ids), 1000):
+            chunk = session_ids[start:start + 1000]
+            operations = []
+            for name, store in self.db.message_stores.items():
+                for session_id, totals in store.session_totals(chunk).items():
+                    operations.append(UpdateOne(
+                        {'_id': session_id, 'storage': name},
+                        {'$set': {'message_count': totals['count']}, '$max': {'updated_at': totals['last']}}
+                    ))
+            if operations:
+                self.db.chat_sessions.bulk_write(operations, ordered=False)
+
+
+def read_records(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='NDJSON file (.gz allowed)')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--layout', choices=['documents', 'buckets'], default=None,
+                        help='storage layout for imported sessions (default: MESSAGE_STORAGE)')
+    parser.add_argument('--no-search', action='store_true', help='skip search indexing (run reindex_search.py later)')
+    args = parser.parse_args()
+
+    db = Database(os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'aku_kesepian'))
+    importer = Importer(db, args.threads, args.batch_size, args.layout or db.message_storage,
+                        index_search=not args.no_search)
+
+    started = time.time()
+    records = 0
+    for record in read_records(args.path):
+        importer.add(record)
+        records += 1
+        if records % 100000 == 0:
+            rate = records / (time.time() - started)
+            print(f"   {records} records read ({rate:,.0f}/s)")
+    importer.finish()
+    write_seconds = time.time() - started
+
+    importer.update_session_counters()
+    db.rollups.reconcile()
+    total_seconds = time.time() - started
+
+    counts = importer.counts
+    print(f"✅ Imported {counts['users']} users, {counts['sessions']} sessions, "
+          f"{counts['messages']} messages ({counts['skipped']} already present)")
+    print(f"   Writes: {write_seconds:.1f}s, {records / max(write_seconds, 1e-9):,.0f} records/s, "
+          f"{counts['messages'] / max(write_seconds, 1e-9):,.0f} messages/s")
+    print(f"   Total with counters and stats: {total_seconds:.1f}s")
+    if importer.conflicts:
+        print(f"❌ {len(importer.conflicts)} users not imported ({counts['rejected']} of their sessions and "
+              f"messages skipped), first: {importer.conflicts[0]}")
+    if importer.errors:
+        print(f"❌ {len(importer.errors)} batches failed, first error: {importer.errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
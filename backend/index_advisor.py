@@ -0,0 +1,186 @@
+"""Explain every registered query shape and point out missing or unused indexes.
+
+    python index_advisor.py
+    python index_advisor.py --collection chat_sessions
+    python index_advisor.py --json > advice.json
+
+Each shape of ``app/models/query_shapes.py`` is explained against the
+target database (``MONGODB_URI`` / ``DATABASE_NAME``, read-only: nothing
+is created). A shape is flagged when its winning plan scans the whole
+collection (COLLSCAN) or sorts in memory (SORT), and gets a proposed index:
+equality fields first, then the sort, then range fields. An equality on
+``is_active`` becomes a partial index instead of a key. Indexes that no
+shape's plan uses are listed too, with their ``$indexStats`` operation
+count since the server started; unique and TTL indexes are skipped since
+they are kept for their constraint. Plans depend on the data, so run it
+against a database of realistic size. Exits with 1 when a shape is
+flagged or an index is unused.
+"""
+import argparse
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.models.connection import ConnectionManager
+from app.models.query_shapes import query_shapes, plan_stages
+
+# Only an equality on these becomes a partial filter instead of a key
+PARTIAL_FIELDS = ('is_active',)
+
+
+def explain(db, shape):
+    if shape.kind == 'count':
+        command = {'count': shape.collection, 'query': shape.filter}
+    else:
+        command = {'find': shape.collection, 'filter': shape.filter}
+        if shape.sort:
+            command['sort'] = dict(shape.sort)
+        if shape.limit:
+            command['limit'] = shape.limit
+    return db.command('explain', command, verbosity='executionStats')
+
+
+def is_equality(condition):
+    if not isinstance(condition, dict):
+        return True
+    return set(condition) <= {'$eq', '$in'}
+
+
+def propose_index(shape):
+    """Index spec (keys, options) serving ``shape``: equality, sort, range"""
+    equality, ranges, partial = [], [], {}
+    for field, condition in shape.filter.items():
+        if field.startswith('$'):
+            continue
+        if field in PARTIAL_FIELDS and isinstance(condition, bool):
+            partial[field] = condition
+        elif is_equality(condition):
+            equality.append(field)
+        else:
+            ranges.append(field)
+
+    keys = [(field, 1) for field in equality]
+    keys += [(field, direction) for field, direction in shape.sort if field not in equality]
+    keys += [(field, 1) for field in ranges if field not in dict(keys)]
+    if not keys:
+        # Nothing left to index on besides the partial filter
+        keys = [('_id', 1)]
+    options = {'partialFilterExpression': partial} if partial else {}
+    return keys, options
+
+
+def format_index(collection, keys, options):
+    spec = ', '.join(f'"{field}": {direction}' for field, direction in keys)
+    extra = f', {json.dumps(options, default=str)}' if options else ''
+    return f'db.{collection}.createIndex({{{spec}}}{extra})'
+
+
+def analyze(db, shapes):
+    results, used = [], {}
+    for shape in shapes:
+        try:
+            explained = explain(db, shape)
+        except Exception as e:
+            results.append({'shape': shape.name, 'collection': shape.collection, 'error': str(e)})
+            continue
+
+        stages = list(plan_stages(explained.get('queryPlanner', {}).get('winningPlan', {})))
+        names = [stage['stage'] for stage in stages]
+        indexes = sorted({stage['indexName'] for stage in stages if stage.get('indexName')})
+        used.setdefault(shape.collection, set()).update(indexes)
+
+        stats = explained.get('executionStats', {})
+        problems = []
+        if 'COLLSCAN' in names:
+            problems.append('COLLSCAN')
+        if 'SORT' in names:
+            problems.append('in-memory SORT')
+
+        result = {
+            'shape': shape.name,
+            'collection': shape.collection,
+            'source': shape.source,
+            'stages': names,
+            'indexes': indexes,
+            'docs_examined': stats.get('totalDocsExamined'),
+            'keys_examined': stats.get('totalKeysExamined'),
+            'returned': stats.get('nReturned'),
+            'problems': problems
+        }
+        if problems:
+            keys, options = propose_index(shape)
+            result['proposal'] = format_index(shape.collection, keys, options)
+        results.append(result)
+    return results, used
+
+
+def unused_indexes(db, collections, used):
+    unused = []
+    for collection in sorted(collections):
+        try:
+            ops = {row['name']: row['accesses']['ops'] for row in db[collection].aggregate([{'$indexStats': {}}])}
+        except Exception:
+            ops = {}
+        for index in db[collection].list_indexes():
+            name = index['name']
+            if name == '_id_' or index.get('unique') or 'expireAfterSeconds' in index:
+                continue
+            if name not in used.get(collection, set()):
+                unused.append({
+                    'collection': collection,
+                    'index': name,
+                    'keys': dict(index['key']),
+                    'ops_since_restart': ops.get(name)
+                })
+    return unused
+
+
+def print_report(results, unused):
+    flagged = [result for result in results if result.get('problems') or result.get('error')]
+    for result in results:
+        if result.get('error'):
+            print(f"❌ {result['shape']}: {result['error']}")
+            continue
+        mark = '⚠️ ' if result['problems'] else '✅'
+        indexes = ', '.join(result['indexes']) or '-'
+        print(f"{mark} {result['shape']:<28} {' > '.join(result['stages']):<32} index: {indexes}"
+              f"  (docs {result['docs_examined']}, keys {result['keys_examined']}, returned {result['returned']})")
+        if result['problems']:
+            print(f"      {', '.join(result['problems'])} — {result['source']}")
+            print(f"      proposed: {result['proposal']}")
+
+    if unused:
+        print("\n🗑️ Indexes no registered query uses:")
+        for index in unused:
+            ops = index['ops_since_restart']
+            print(f"   {index['collection']}.{index['index']} {index['keys']}"
+                  f" ({'unknown' if ops is None else ops} ops since restart)")
+
+    print(f"\n{len(results)} query shapes, {len(flagged)} flagged, {len(unused)} unused indexes")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--collection', help='only shapes of this collection')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    db = ConnectionManager(os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'aku_kesepian')).db
+    shapes = query_shapes(args.collection)
+    results, used = analyze(db, shapes)
+    unused = unused_indexes(db, {shape.collection for shape in shapes}, used)
+
+    if args.json:
+        print(json.dumps({'shapes': results, 'unused_indexes': unused}, indent=2, default=str))
+        flagged = [result for result in results if result.get('problems') or result.get('error')]
+    else:
+        flagged = print_report(results, unused)
+    sys.exit(1 if flagged or unused else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Move chat sessions between message storage layouts while the app is running.
+
+    python migrate_messages.py --to buckets
+    python migrate_messages.py --to documents --limit 1000
+
+Sessions are migrated one at a time. Each session's messages are copied to
+the target layout, then the session's ``storage`` field is switched with a
+compare-and-set on ``message_count``; if a message arrived during the copy,
+the new messages are copied and the switch is retried. A message written
+by a request that raced the switch follows the session on its own (see
+``ChatModel.add_message``). Only after the switch are the source copies
+removed, so readers always see the complete history in one layout.
+
+Copies left in the target layout by an interrupted run (or by a session
+that kept changing) are cleared before a session is copied, so the
+migration can simply be run again.
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.models.database import Database
+
+
+def clear_copies(store, session_id, batch_size=1000):
+    """Remove a session's messages from a layout it is not stored in"""
+    while store.delete_batch(session_id, batch_size):
+        pass
+
+
+def migrate_session(db, session, source, target, attempts=5):
+    session_id = session['_id']
+    # Readers follow ``storage``, so anything in the target is a stale copy
+    clear_copies(target, session_id)
+    copied = {}
+    for _ in range(attempts):
+        count = session.get('message_count')
+        messages = [m for m in source.oldest(session_id) if m['_id'] not in copied]
+        target.load(session_id, messages)
+        copied.update((m['_id'], m) for m in messages)
+
+        switched = db.chat_sessions.update_one(
+            {'_id': session_id, 'message_count': count, 'storage': session.get('storage')},
+            {'$set': {'storage': target.layout}}
+        )
+        if switched.modified_count:
+            source.remove(session_id, list(copied.values()))
+            return len(copied)
+
+        # Someone appended meanwhile; pick up the new messages and try again
+        session = db.chat_sessions.find_one({'_id': session_id}, {'message_count': 1, 'storage': 1})
+        if session is None or session.get('storage', 'documents') != source.layout:
+            return 0
+    clear_copies(target, session_id)
+    raise RuntimeError(f"Session {session_id} kept changing; retry later")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--to', choices=['buckets', 'documents'], required=True)
+    parser.add_argument('--limit', type=int, default=0, help='migrate at most this many sessions')
+    parser.add_argument('--pause-ms', type=int, default=20, help='pause between sessions')
+    args = parser.parse_args()
+
+    db = Database(os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'aku_kesepian'))
+    target = db.message_stores[args.to]
+    source_layout = 'documents' if args.to == 'buckets' else 'buckets'
+    source = db.message_stores[source_layout]
+
+    # Sessions without the field predate it and use the original layout
+    query = {'storage': source_layout}
+    if source_layout == 'documents':
+        query = {'$or': [{'storage': 'documents'}, {'storage': {'$exists': False}}]}
+
+    started = time.time()
+    sessions = messages = failed = 0
+    cursor = db.chat_sessions.find(query, {'message_count': 1, 'storage': 1}).sort('_id', 1)
+    if args.limit:
+        cursor = cursor.limit(args.limit)
+
+    for session in cursor:
+        try:
+            messages += migrate_session(db, session, source, target)
+            sessions += 1
+        except Exception as e:
+            failed += 1
+            print(f"❌ Session {session['_id']}: {e}")
+        if sessions and sessions % 100 == 0:
+            print(f"   {sessions} sessions, {messages} messages migrated")
+        time.sleep(args.pause_ms / 1000)
+
+    elapsed = time.time() - started
+    print(f"✅ Migrated {sessions} sessions ({messages} messages) to {args.to} in {elapsed:.1f}s, {failed} failed")
+    print(f"   Set MESSAGE_STORAGE={args.to} so new sessions use it too")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Rebuild the message search index from the message stores.
+
+    python reindex_search.py            # index sessions that have no entries yet
+    python reindex_search.py --all      # re-index every session
+
+Safe to run while the app is live: entries are keyed by message id, so
+messages indexed meanwhile by the app are skipped rather than duplicated.
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.models.database import Database, ChatModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--all', action='store_true', help='re-index sessions that already have entries')
+    parser.add_argument('--pause-ms', type=int, default=10, help='pause between sessions')
+    args = parser.parse_args()
+
+    db = Database(os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'aku_kesepian'))
+    chat_model = ChatModel(db)
+
+    started = time.time()
+    sessions = indexed = 0
+    for session in db.chat_sessions.find({}, {'user_id': 1, 'character_id': 1, 'storage': 1, 'archived_count': 1}).sort('_id', 1):
+        if not args.all and db.message_search.find_one({'chat_session_id': session['_id']}, {'_id': 1}):
+            continue
+
+        entries = []
+        for message in chat_model.get_chat_messages(session['_id'], limit=None):
+            entry = db.search.entry(message, session)
+            if entry['terms']:
+                entries.append(entry)
+        db.search.write(entries)
+
+        sessions += 1
+        indexed += len(entries)
+        if sessions % 100 == 0:
+            print(f"   {sessions} sessions, {indexed} messages indexed")
+        time.sleep(args.pause_ms / 1000)
+
+    print(f"✅ Indexed {indexed} messages from {sessions} sessions in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
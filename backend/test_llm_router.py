@@ -0,0 +1,311 @@
+"""Checks the LLM router against local fake OpenAI-compatible endpoints.
+
+    python test_llm_router.py      (or: python -m pytest test_llm_router.py)
+
+Each fake endpoint streams a chat completion with a configurable delay
+before the first chunk, or fails with a 500, and records whether the
+client hung up before the stream finished.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import json
+import time
+
+from app.utils.llm_router import LLMBackend, LLMRouter
+from app.utils.openai_service import OpenAIGenerator
+from app.utils.generators import create_generator
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class FakeEndpoint:
+    def __init__(self, reply, delay=0.0, fail=False, chunks=5):
+        self.reply = reply
+        self.delay = delay
+        self.fail = fail
+        self.chunks = chunks
+        self.models = []
+        self.aborted = 0
+        self.finished = 0
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                endpoint.models.append(body['model'])
+                if endpoint.fail:
+                    self.send_response(500)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(b'{"error": {"message": "boom"}}')
+                    return
+
+                time.sleep(endpoint.delay)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                try:
+                    words = endpoint.reply.split(' ')
+                    for index, word in enumerate(words):
+                        chunk = {
+                            "id": "fake", "object": "chat.completion.chunk", "created": 0, "model": body['model'],
+                            "choices": [{"index": 0, "delta": {"content": word + (' ' if index < len(words) - 1 else '')},
+                                         "finish_reason": None}]
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(endpoint.delay / endpoint.chunks)
+                    if body.get('stream_options', {}).get('include_usage'):
+                        usage = {"prompt_tokens": 11, "completion_tokens": len(words), "total_tokens": 11 + len(words)}
+                        chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": body['model'],
+                                 "choices": [], "usage": usage}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                    endpoint.finished += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    endpoint.aborted += 1
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def backend(self, name, **kwargs):
+        return LLMBackend(name, 'big-model', 'test-key', base_url=self.url, timeout=10, **kwargs)
+
+    def close(self):
+        self.server.shutdown()
+
+
+MESSAGES = [{"role": "user", "content": "halo"}]
+
+
+def test_single_backend_streams_reply():
+    fast = FakeEndpoint("halo juga kamu")
+    try:
+        router = LLMRouter([fast.backend('fast')])
+        assert router.complete(MESSAGES).text == "halo juga kamu"
+        assert router.stats()["backends"]["fast"]["requests"] == 1
+    finally:
+        fast.close()
+
+
+def test_slow_backend_is_hedged_and_cancelled():
+    slow = FakeEndpoint("lambat sekali " * 20, delay=3.0, chunks=40)
+    fast = FakeEndpoint("cepat", delay=0.05)
+    try:
+        router = LLMRouter([slow.backend('slow'), fast.backend('fast')],
+                           hedge_min_ms=200, hedge_default_ms=200)
+        started = time.monotonic()
+        completion = router.complete(MESSAGES)
+        assert completion.text == "cepat"
+        # Answered by the hedge, well before the slow backend would have
+        assert time.monotonic() - started < 1.5
+        assert router.stats()["hedges"] == 1
+
+        # The loser's tokens are billed to the request too
+        assert completion.usage["prompt_tokens"] > 11
+
+        # The loser's stream is closed instead of running to the end
+        time.sleep(4)
+        assert slow.finished == 0
+        assert router.stats()["backends"]["slow"]["cancelled"] == 1
+    finally:
+        slow.close()
+        fast.close()
+
+
+def test_failing_backend_fails_over_and_is_demoted():
+    broken = FakeEndpoint("", fail=True)
+    healthy = FakeEndpoint("aman")
+    try:
+        router = LLMRouter([broken.backend('broken'), healthy.backend('healthy')], max_error_rate=0.5)
+        assert router.complete(MESSAGES).text == "aman"
+        assert router.stats()["failovers"] == 1
+        # With a 100% error rate the broken backend drops to the back
+        assert [backend.name for backend in router.ranked()] == ['healthy', 'broken']
+        assert router.complete(MESSAGES).text == "aman"
+        assert len(broken.models) == 1
+    finally:
+        broken.close()
+        healthy.close()
+
+
+def test_faster_backend_ranks_first():
+    slower = FakeEndpoint("a", delay=0.3)
+    faster = FakeEndpoint("b", delay=0.01)
+    try:
+        router = LLMRouter([slower.backend('slower'), faster.backend('faster')], hedge_default_ms=5000)
+        for backend in router.backends:
+            backend.stats.record(0.3 if backend.name == 'slower' else 0.01)
+        assert router.complete(MESSAGES).text == "b"
+    finally:
+        slower.close()
+        faster.close()
+
+
+def test_light_requests_use_fast_model():
+    endpoint = FakeEndpoint("judul")
+    try:
+        router = LLMRouter([endpoint.backend('only', fast_model='small-model')])
+        router.complete(MESSAGES, kind='light')
+        router.complete(MESSAGES)
+        assert endpoint.models == ['small-model', 'big-model']
+    finally:
+        endpoint.close()
+
+
+def test_all_backends_failing_raises():
+    broken = FakeEndpoint("", fail=True)
+    try:
+        router = LLMRouter([broken.backend('broken')])
+        try:
+            router.complete(MESSAGES)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("expected the backend error")
+    finally:
+        broken.close()
+
+
+def test_stream_fails_over_before_first_piece():
+    broken = FakeEndpoint("", fail=True)
+    healthy = FakeEndpoint("satu dua tiga")
+    try:
+        router = LLMRouter([broken.backend('broken'), healthy.backend('healthy')])
+        assert list(router.stream(MESSAGES)) == ["satu ", "dua ", "tiga"]
+        assert router.stats()["failovers"] == 1
+    finally:
+        broken.close()
+        healthy.close()
+
+
+def test_openai_generator_over_fake_endpoint():
+    endpoint = FakeEndpoint("halo sayang")
+    try:
+        generator = OpenAIGenerator(LLMRouter([endpoint.backend('only')]))
+        request = {"user_message": "halo", "character_personality": "ramah", "character_name": "Mama Penyayang"}
+        assert generator.generate_response(**request) == "halo sayang"
+        assert ''.join(generator.stream_response(**request)) == "halo sayang"
+        assert generator.generate_batch([request, request]) == ["halo sayang", "halo sayang"]
+    finally:
+        endpoint.close()
+
+
+def test_completion_reports_token_usage():
+    endpoint = FakeEndpoint("satu dua tiga")
+    try:
+        completion = LLMRouter([endpoint.backend('reporting')]).complete(MESSAGES)
+        assert completion.usage == {"prompt_tokens": 11, "completion_tokens": 3}
+        assert (completion.backend, completion.model) == ('reporting', 'big-model')
+
+        # Without usage in the stream the counts are estimated
+        completion = LLMRouter([endpoint.backend('silent', stream_usage=False)]).complete(MESSAGES)
+        assert completion.usage["estimated"] and completion.usage["completion_tokens"] > 0
+
+        generator = OpenAIGenerator(LLMRouter([endpoint.backend('reporting')]))
+        usage = {}
+        generator.generate_response("halo", "ramah", usage=usage)
+        assert usage == {"prompt_tokens": 11, "completion_tokens": 3}
+    finally:
+        endpoint.close()
+
+
+def test_openai_generator_falls_back_without_backends():
+    generator = OpenAIGenerator(LLMRouter([]))
+    reply = generator.generate_response("aku lagi sedih", "ramah", character_name="Mama Penyayang")
+    assert reply.startswith("Sayang kok")
+    assert generator.generate_chat_title("aku lagi sedih banget hari ini", "Mama Penyayang") == "aku lagi sedih banget..."
+
+
+def test_fake_generator_is_deterministic():
+    generator = create_generator('fake')
+    first = generator.generate_response("halo", "ramah", [], "Mama Penyayang")
+    assert first == generator.generate_response("halo", "ramah", [], "Mama Penyayang")
+    assert ''.join(generator.stream_response("halo", "ramah", [], "Mama Penyayang")) == first
+
+
+def test_deadline_bounds_the_whole_call():
+    slow = FakeEndpoint("lambat", delay=2.0)
+    try:
+        router = LLMRouter([slow.backend('slow')])
+        started = time.monotonic()
+        try:
+            router.complete(MESSAGES, deadline=0.3)
+        except TimeoutError:
+            pass
+        else:
+            raise AssertionError("expected the deadline to expire")
+        assert time.monotonic() - started < 1.0
+        assert router.stats()["deadlines_exceeded"] == 1
+    finally:
+        slow.close()
+
+
+def test_breaker_opens_then_probes_and_closes():
+    breaker = CircuitBreaker('test', failure_rate=0.5, min_calls=4, window=4, open_seconds=0.2)
+
+    def fail():
+        raise RuntimeError("down")
+
+    for _ in range(4):
+        try:
+            breaker.call(fail)
+        except RuntimeError:
+            pass
+    assert breaker.state == 'open'
+    try:
+        breaker.call(lambda: 'never')
+    except CircuitOpen:
+        pass
+    else:
+        raise AssertionError("expected the open circuit to short-circuit")
+
+    time.sleep(0.25)
+    assert breaker.state == 'half_open'
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'closed'
+    assert breaker.stats()["short_circuited"] == 1
+
+
+def test_open_breaker_serves_fallback_in_milliseconds():
+    broken = FakeEndpoint("", fail=True)
+    try:
+        generator = OpenAIGenerator(LLMRouter([broken.backend('broken')]))
+        generator.breaker.min_calls = 2
+        for _ in range(2):
+            generator.generate_response("aku lagi sedih", "ramah", character_name="Mama Penyayang")
+        assert generator.breaker.state == 'open'
+
+        requests_before = len(broken.models)
+        started = time.monotonic()
+        reply = generator.generate_response("aku lagi sedih", "ramah", character_name="Mama Penyayang")
+        assert reply.startswith("Sayang kok")
+        assert time.monotonic() - started < 0.05
+        assert len(broken.models) == requests_before
+    finally:
+        broken.close()
+
+
+def test_title_failures_leave_reply_breaker_closed():
+    broken = FakeEndpoint("", fail=True)
+    try:
+        generator = OpenAIGenerator(LLMRouter([broken.backend('broken')]))
+        generator.title_breaker.min_calls = 2
+        for _ in range(3):
+            generator.generate_chat_title("aku lagi sedih", "Mama Penyayang")
+        assert generator.title_breaker.state == 'open'
+        assert generator.breaker.state == 'closed'
+    finally:
+        broken.close()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
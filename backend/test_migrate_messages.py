@@ -0,0 +1,65 @@
+"""Checks that an interrupted message layout migration can be run again.
+
+    python -m pytest test_migrate_messages.py      (needs mongomock)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip('mongomock')
+
+from app.models.message_store import create_message_stores
+from migrate_messages import migrate_session
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after_load(store):
+    """Let ``load`` write its copies, then die before the storage switch"""
+    load = store.load
+
+    def interrupted(session_id, messages):
+        load(session_id, messages)
+        raise Crash()
+    store.load = interrupted
+
+
+def session_with_messages(db, stores, layout, count=7):
+    session_id = db.chat_sessions.insert_one({'message_count': count, 'storage': layout}).inserted_id
+    started = datetime.utcnow() - timedelta(hours=1)
+    for i in range(count):
+        stores[layout].insert({
+            '_id': ObjectId(),
+            'chat_session_id': session_id,
+            'sender_type': 'user' if i % 2 == 0 else 'ai',
+            'content': f'pesan {i}',
+            'timestamp': started + timedelta(minutes=i)
+        })
+    return session_id
+
+
+@pytest.mark.parametrize('source_layout,target_layout', [('documents', 'buckets'), ('buckets', 'documents')])
+def test_migration_reruns_cleanly_after_a_crash_before_the_switch(source_layout, target_layout):
+    db = mongomock.MongoClient().db
+    _, stores = create_message_stores(db)
+    session_id = session_with_messages(db, stores, source_layout)
+    expected = [m['content'] for m in stores[source_layout].oldest(session_id)]
+
+    _, crashing = create_message_stores(db)
+    crash_after_load(crashing[target_layout])
+    with pytest.raises(Crash):
+        migrate_session(db, db.chat_sessions.find_one({'_id': session_id}), crashing[source_layout], crashing[target_layout])
+    assert db.chat_sessions.find_one({'_id': session_id})['storage'] == source_layout
+    assert len(stores[target_layout].oldest(session_id)) == len(expected)
+
+    moved = migrate_session(db, db.chat_sessions.find_one({'_id': session_id}), stores[source_layout], stores[target_layout])
+
+    assert moved == len(expected)
+    assert db.chat_sessions.find_one({'_id': session_id})['storage'] == target_layout
+    assert [m['content'] for m in stores[target_layout].oldest(session_id)] == expected
+    # Stored once, not once per run
+    assert stores[target_layout].count([session_id]) == len(expected)
+    assert stores[source_layout].oldest(session_id) == []
@@ -0,0 +1,99 @@
+"""Checks that character prompts keep a byte-identical prefix across turns.
+
+    python test_prompt_layout.py      (or: python -m pytest test_prompt_layout.py)
+
+Provider-side prompt caching only pays off when every request of a
+conversation starts with exactly the same bytes, so the system prompt
+must not depend on the history or the new message.
+"""
+import json
+from datetime import datetime
+
+from app.utils.llm_router import LLMRouter
+from app.utils.openai_service import OpenAIGenerator, character_system_prompt
+
+PERSONALITY = "Kamu adalah seorang mama yang penyayang dan perhatian."
+
+
+def message(sender_type, content):
+    return {'sender_type': sender_type, 'content': content, 'timestamp': datetime.utcnow()}
+
+
+def encoded(messages):
+    return [json.dumps(entry, ensure_ascii=False, sort_keys=True).encode('utf-8') for entry in messages]
+
+
+def test_system_prompt_is_byte_identical_across_turns():
+    generator = OpenAIGenerator(LLMRouter([]))
+    history = [message('ai', 'Halo sayang, gimana harimu?')]
+    turns = []
+    for text in ['capek banget hari ini', 'tugas numpuk ma', 'makasih ya ma']:
+        history.append(message('user', text))
+        turns.append(encoded(generator._messages(text, PERSONALITY, history)))
+        history.append(message('ai', f'Balasan untuk {text}'))
+
+    first = turns[0][0]
+    assert all(turn[0] == first for turn in turns)
+    # Later turns extend the earlier conversation instead of rewriting it
+    assert turns[1][:len(turns[0]) - 1] == turns[0][:-1]
+
+
+def test_history_is_role_tagged_and_current_message_last():
+    generator = OpenAIGenerator(LLMRouter([]))
+    history = [
+        message('ai', 'Halo!'),
+        message('user', 'hai ma'),
+        message('admin', 'Mama di sini'),
+        message('user', 'aku pulang telat')
+    ]
+    messages = generator._messages('aku pulang telat', PERSONALITY, history)
+    assert [entry['role'] for entry in messages] == ['system', 'assistant', 'user', 'assistant', 'user']
+    assert messages[-1] == {'role': 'user', 'content': 'aku pulang telat'}
+    assert 'aku pulang telat' not in messages[0]['content']
+
+
+def test_history_window_is_bounded():
+    generator = OpenAIGenerator(LLMRouter([]))
+    generator.history_messages = 2
+    history = [message('user', f'pesan {index}') for index in range(6)]
+    messages = generator._messages('baru', PERSONALITY, history)
+    assert [entry['content'] for entry in messages[1:]] == ['pesan 4', 'pesan 5', 'baru']
+
+
+def test_history_prefix_is_stable_across_turns_once_trimmed():
+    generator = OpenAIGenerator(LLMRouter([]))
+    generator.history_messages = 8
+    history = [message('ai', 'Halo sayang, gimana harimu?')]
+    turns = []
+    for index in range(12):
+        text = f'pesan ke {index}'
+        history.append(message('user', text))
+        # The route sends the newest messages and how many came before
+        total = len(history) - 1
+        sent = generator._messages(text, PERSONALITY, history[-9:], history_total=total)
+        assert len(sent) - 2 <= generator.history_messages
+        turns.append(encoded(sent))
+        history.append(message('ai', f'Balasan untuk {text}'))
+
+    # Block trimming (4 messages = 2 turns): the next turn extends this one
+    # byte for byte unless the window start just moved
+    extended = [later[:len(earlier) - 1] == earlier[:-1] for earlier, later in zip(turns, turns[1:])]
+    assert extended == [True, True, True] + [False, True] * 4
+    # A sliding window would rewrite the first history turn on every request
+    assert len({turn[1] for turn in turns}) == 5
+
+
+def test_system_prompt_is_built_once_per_character():
+    character_system_prompt.cache_clear()
+    generator = OpenAIGenerator(LLMRouter([]))
+    for _ in range(5):
+        generator._messages('halo', PERSONALITY, [])
+    info = character_system_prompt.cache_info()
+    assert (info.misses, info.hits) == (1, 4)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
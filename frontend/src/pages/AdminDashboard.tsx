@@ -19,6 +19,9 @@ const AdminDashboard: React.FC = () => {
   const [sessions, setSessions] = useState<any[]>([]);
   const [selectedSession, setSelectedSession] = useState<any>(null);
   const [sessionMessages, setSessionMessages] = useState<any[]>([]);
+  // Transcripts come a page at a time; cursor of the next older page
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [takeoverMessage, setTakeoverMessage] = useState('');
   
   // Users
@@ -98,11 +101,35 @@ const AdminDashboard: React.FC = () => {
       });
       setSelectedSession(response.data.data);
       setSessionMessages(response.data.data.messages);
+      setOlderCursor(response.data.data.page?.before || null);
     } catch (error) {
       console.error('Load session messages error:', error);
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!selectedSession || !olderCursor) return;
+
+    setLoadingOlder(true);
+    try {
+      const token = localStorage.getItem(STORAGE_KEYS.TOKEN);
+      const response = await axios.get(
+        `${API_URL}/api/admin/sessions/${selectedSession.session.id}/messages`,
+        {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { before: olderCursor }
+        }
+      );
+      // Older pages carry only messages; keep the user and character of the first one
+      setSessionMessages(prev => [...response.data.data.messages, ...prev]);
+      setOlderCursor(response.data.data.page?.before || null);
+    } catch (error) {
+      console.error('Load older messages error:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleTakeover = async () => {
     if (!takeoverMessage.trim() || !selectedSession) return;
 
@@ -278,6 +305,11 @@ const AdminDashboard: React.FC = () => {
                 </DetailHeader>
 
                 <MessagesContainer>
+                  {olderCursor && (
+                    <LoadOlderButton onClick={loadOlderMessages} disabled={loadingOlder}>
+                      {loadingOlder ? 'Memuat...' : 'Muat pesan sebelumnya'}
+                    </LoadOlderButton>
+                  )}
                   {sessionMessages.map(msg => (
                     <Message key={msg.id} senderType={msg.sender_type}>
                       <MessageBadge senderType={msg.sender_type}>
@@ -580,6 +612,27 @@ const MessagesContainer = styled.div`
   margin-bottom: 15px;
 `;
 
+const LoadOlderButton = styled.button`
+  width: 100%;
+  background: white;
+  color: #666;
+  border: 2px dashed #ccc;
+  padding: 8px;
+  border-radius: 8px;
+  margin-bottom: 10px;
+  cursor: pointer;
+
+  &:hover:not(:disabled) {
+    border-color: #999;
+    color: #333;
+  }
+
+  &:disabled {
+    cursor: default;
+    opacity: 0.6;
+  }
+`;
+
 const Message = styled.div<{ senderType: string }>`
   background: ${props => 
     props.senderType === 'user' ? '#AEDEFC' :